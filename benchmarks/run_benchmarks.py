@@ -0,0 +1,215 @@
+# benchmarks/run_benchmarks.py
+#
+# Suíte de benchmarks dos pontos críticos do pipeline, sobre históricos sintéticos.
+# Cada etapa é cronometrada separadamente e o resultado sai em JSON, para comparar commits.
+#
+#   python -m benchmarks.run_benchmarks --sizes 10000,100000 --output bench.json
+#   python -m benchmarks.run_benchmarks --sizes 5000000 --players 8000 --no-memory
+
+import argparse
+import contextlib
+import functools
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import generate_matches, generate_players, generate_schedule_html, generate_upcoming_matches, write_yearly_csvs
+
+CIRCUIT = 'atp'
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+@contextlib.contextmanager
+def local_http_server(directory: str):
+    """Servidor HTTP local que substitui o GitHub durante a ingestão."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=directory))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/tennis_{{circuit}}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+class StageRecorder:
+    """Cronometra cada etapa e, opcionalmente, mede o pico de memória alocada (tracemalloc)."""
+    def __init__(self, trace_memory: bool):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, items: int):
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+        elapsed = time.perf_counter() - start
+        result = {'seconds': round(elapsed, 6), 'items': items, 'items_per_second': round(items / elapsed, 1) if elapsed > 0 else None}
+        if self.trace_memory:
+            result['peak_mb'] = round((tracemalloc.get_traced_memory()[1] - baseline) / 2**20, 3)
+        self.stages[name] = result
+
+def run_pipeline(workdir: str, fixtures_dir: str, years: list, num_rows: int, upcoming, h2h_pairs: list, recorder: StageRecorder):
+    """Executa as etapas do pipeline em `workdir` (banco novo), registrando cada uma no `recorder`."""
+    from src.data_handler import init_db, configure_connection, download_and_insert_data, load_all_data_from_db, load_match_history, DB_PATH
+    from src.draw_simulator import simulate_tournament
+    from src.elo_model import TennisEloModel
+    from src.feature_engineering import create_dataset_for_ml
+    from src.ml_model import MLModel
+    from src.prediction import predict_upcoming_matches
+    from src.scraper import parse_schedule_html
+    from src.utils import PlayerNameResolver, get_h2h_record, get_h2h_records
+
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    init_db()
+
+    with local_http_server(fixtures_dir) as base_url:
+        conn = sqlite3.connect(DB_PATH)
+        configure_connection(conn)
+        with recorder.stage('download_and_insert_data', num_rows):
+            for year in years:
+                download_and_insert_data(year, CIRCUIT, conn, base_url=base_url)
+        conn.close()
+
+    with recorder.stage('load_all_data_from_db (cold)', num_rows):
+        historical_data = load_all_data_from_db(CIRCUIT)
+    del historical_data
+    with recorder.stage('load_all_data_from_db (snapshot)', num_rows):
+        historical_data = load_all_data_from_db(CIRCUIT)
+    del historical_data
+    with recorder.stage('load_match_history (snapshot)', num_rows):
+        historical_data = load_match_history(CIRCUIT)
+
+    elo_model = TennisEloModel()
+    with recorder.stage('TennisEloModel.train_general', len(historical_data)):
+        elo_model.train_general(historical_data)
+
+    with recorder.stage('create_dataset_for_ml', len(historical_data)):
+        X, y = create_dataset_for_ml(CIRCUIT, historical_data, elo_model)
+    with recorder.stage('MLModel.train', len(X)):
+        ml_model = MLModel()
+        ml_model.train(X, y)
+
+    with recorder.stage('get_h2h_record', len(h2h_pairs)):
+        for p1, p2 in h2h_pairs:
+            get_h2h_record(CIRCUIT, p1, p2)
+    with recorder.stage('get_h2h_records (lote)', len(h2h_pairs)):
+        get_h2h_records(CIRCUIT, h2h_pairs)
+
+    schedule_html = generate_schedule_html(upcoming)
+    with recorder.stage('parse_schedule_html', len(upcoming)):
+        parse_schedule_html(schedule_html)
+
+    scraped_names = upcoming['Player 1'].tolist() + upcoming['Player 2'].tolist()
+    with recorder.stage('PlayerNameResolver (construção)', len(elo_model.known_players())):
+        resolver = PlayerNameResolver(elo_model.known_players())
+    with recorder.stage('normalize_player_name', len(scraped_names)):
+        resolver.resolve_many(scraped_names)
+
+    draw = sorted(elo_model.known_players())[:128]
+    with recorder.stage('simulate_tournament (128 vagas x 100k)', 100_000):
+        simulate_tournament(draw, 'Hard', elo_model, iterations=100_000, seed=0)
+
+    fresh_resolver = PlayerNameResolver(elo_model.known_players())
+    with recorder.stage('predict_upcoming_matches', len(upcoming)):
+        predict_upcoming_matches(upcoming, {CIRCUIT: ml_model}, {CIRCUIT: elo_model}, {CIRCUIT: fresh_resolver})
+
+def benchmark_size(num_matches: int, num_players: int, seed: int, trace_memory: bool, num_upcoming: int, num_h2h: int) -> dict:
+    """Gera o histórico sintético de um tamanho e mede todas as etapas (tempo e, à parte, memória)."""
+    root = tempfile.mkdtemp(prefix='777stats-bench-')
+    cwd = os.getcwd()
+    try:
+        matches = generate_matches(num_matches, num_players, seed=seed)
+        players = generate_players(num_players, seed=seed)
+        fixtures_dir = os.path.join(root, 'fixtures')
+        years = write_yearly_csvs(matches, os.path.join(fixtures_dir, f"tennis_{CIRCUIT}"), CIRCUIT)
+        upcoming = generate_upcoming_matches(players, num_upcoming, seed=seed, circuit=CIRCUIT.upper())
+        rng = np.random.default_rng(seed)
+        sample = rng.integers(0, len(matches), num_h2h)
+        h2h_pairs = list(zip(matches['winner_name'].to_numpy()[sample], matches['loser_name'].to_numpy()[sample]))
+        del matches
+
+        timing = StageRecorder(trace_memory=False)
+        run_pipeline(os.path.join(root, 'timing'), fixtures_dir, years, num_matches, upcoming, h2h_pairs, timing)
+        stages = timing.stages
+
+        if trace_memory:
+            # Segunda passada só para memória: o tracemalloc distorce os tempos
+            memory = StageRecorder(trace_memory=True)
+            tracemalloc.start()
+            try:
+                run_pipeline(os.path.join(root, 'memory'), fixtures_dir, years, num_matches, upcoming, h2h_pairs, memory)
+            finally:
+                tracemalloc.stop()
+            for name, result in memory.stages.items():
+                stages[name]['peak_mb'] = result['peak_mb']
+
+        return {'matches': num_matches, 'players': num_players, 'seed': seed, 'stages': stages}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+def environment_info() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import pandas as pd
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline do 777stats com dados sintéticos.")
+    parser.add_argument('--sizes', default='10000,100000', help="Números de partidas, separados por vírgula (ex.: 10000,1000000,5000000).")
+    parser.add_argument('--players', type=int, default=3000, help="Número de jogadores do histórico sintético.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--upcoming', type=int, default=500, help="Partidas na tabela de jogos do dia (predição em lote).")
+    parser.add_argument('--h2h-lookups', type=int, default=1000, help="Consultas de H2H por rodada.")
+    parser.add_argument('--no-memory', action='store_true', help="Não mede o pico de memória (evita a segunda passada).")
+    parser.add_argument('--output', help="Arquivo JSON de saída (padrão: stdout).")
+    args = parser.parse_args(argv)
+
+    report = {'environment': environment_info(), 'runs': []}
+    for size in (int(value) for value in args.sizes.split(',')):
+        print(f"Rodando benchmark com {size} partidas...", file=sys.stderr)
+        report['runs'].append(benchmark_size(size, args.players, args.seed, not args.no_memory, args.upcoming, args.h2h_lookups))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"Resultados salvos em '{args.output}'.", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
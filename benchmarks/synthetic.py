@@ -0,0 +1,124 @@
+# benchmarks/synthetic.py
+#
+# Gerador determinístico de históricos de partidas no formato dos CSVs de Jeff Sackmann,
+# usado pela suíte de benchmarks (não depende de rede nem dos dados reais).
+
+import os
+import numpy as np
+import pandas as pd
+
+SURFACE_MIX = {'Hard': 0.55, 'Clay': 0.32, 'Grass': 0.10, 'Carpet': 0.03}
+COUNTRIES = ['Arg', 'Aus', 'Bra', 'Can', 'Esp', 'Fra', 'Ger', 'Ita', 'Jpn', 'Ned', 'Rus', 'Srb', 'Usa']
+_SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'to', 'vi', 'ne', 'sa', 'do', 'ri', 'an', 'el', 'jo', 'ma', 'ste', 'fa', 'bi', 'gu', 'ze', 'no']
+
+def _make_name(rng) -> str:
+    first = ''.join(rng.choice(_SYLLABLES, rng.integers(2, 4))).capitalize()
+    surname_words = 2 if rng.random() < 0.12 else 1 # ~12% de sobrenomes compostos ("De Minaur", "Carballes Baena")
+    surname = ' '.join(''.join(rng.choice(_SYLLABLES, rng.integers(2, 5))).capitalize() for _ in range(surname_words))
+    return f"{first} {surname}"
+
+def generate_players(num_players: int, seed: int = 0) -> pd.DataFrame:
+    """Gera jogadores com id no estilo Sackmann (1xxxxx), nome completo único, país e força latente."""
+    rng = np.random.default_rng(seed)
+    names, seen = [], set()
+    while len(names) < num_players:
+        name = _make_name(rng)
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return pd.DataFrame({
+        'player_id': np.arange(100001, 100001 + num_players),
+        'name': names,
+        'country': rng.choice(COUNTRIES, num_players),
+        'skill': rng.normal(0, 1, num_players),
+    })
+
+def generate_matches(num_matches: int, num_players: int = 3000, seed: int = 0, start_year: int = 2010, draw_size: int = 32) -> pd.DataFrame:
+    """
+    Gera `num_matches` partidas em torneios semanais de chave eliminatória.
+
+    Os participantes de cada torneio são sorteados em uma faixa que cobre metade do ranking, o que
+    produz confrontos diretos repetidos e, ao mesmo tempo, diferenças de força suficientes para o
+    favorito vencer com frequência (o Elo acerta ~60-65% das partidas, como no circuito real; faixas
+    estreitas de jogadores quase iguais tornariam os resultados sorteios de cara ou coroa). As
+    superfícies seguem `SURFACE_MIX` e o resultado de cada partida depende da diferença de força.
+    """
+    rng = np.random.default_rng(seed)
+    players = generate_players(num_players, seed)
+    skill = players['skill'].to_numpy()
+    ranking = np.argsort(-skill)
+    matches_per_draw = draw_size - 1
+    num_draws = -(-num_matches // matches_per_draw)
+
+    rows = []
+    start = pd.Timestamp(f"{start_year}-01-01")
+    surfaces = list(SURFACE_MIX)
+    draws_per_week = max(1, -(-num_draws // (52 * 15))) # distribui as chaves por ~15 temporadas
+    for draw in range(num_draws):
+        tourney_date = start + pd.Timedelta(weeks=draw // draws_per_week)
+        surface = surfaces[rng.choice(len(surfaces), p=list(SURFACE_MIX.values()))]
+        # Faixa de ranking do torneio: de grandes torneios (metade de cima) a challengers (metade de baixo)
+        band_size = max(draw_size, num_players // 2)
+        band_start = int(rng.integers(0, max(1, num_players - band_size)))
+        band = ranking[band_start:band_start + band_size]
+        entrants = list(rng.permutation(band)[:draw_size])
+        tourney_id = f"{tourney_date.year}-{draw:05d}"
+        while len(entrants) > 1:
+            next_round = []
+            for a, b in zip(entrants[0::2], entrants[1::2]):
+                prob_a = 1 / (1 + np.exp(-(skill[a] - skill[b]) * 2.5))
+                winner, loser = (a, b) if rng.random() < prob_a else (b, a)
+                rows.append((tourney_id, f"Tournament {draw % 400}", surface, int(tourney_date.strftime('%Y%m%d')), winner, loser))
+                next_round.append(winner)
+            entrants = next_round
+
+    rows = rows[:num_matches]
+    df = pd.DataFrame(rows, columns=['tourney_id', 'tourney_name', 'surface', 'tourney_date', 'winner', 'loser'])
+    ids, names = players['player_id'].to_numpy(), players['name'].to_numpy()
+    df['winner_id'], df['winner_name'] = ids[df['winner']], names[df['winner']]
+    df['loser_id'], df['loser_name'] = ids[df['loser']], names[df['loser']]
+    df['score'] = '6-4 6-4'
+    df['best_of'] = 3
+    return df[['tourney_id', 'tourney_name', 'surface', 'tourney_date', 'winner_id', 'winner_name', 'loser_id', 'loser_name', 'score', 'best_of']]
+
+def write_yearly_csvs(matches: pd.DataFrame, directory: str, circuit: str) -> list:
+    """Grava um CSV por ano (`{circuit}_matches_{ano}.csv`), como no repositório de origem. Retorna os anos."""
+    os.makedirs(directory, exist_ok=True)
+    years = matches['tourney_date'] // 10000
+    for year, group in matches.groupby(years):
+        group.to_csv(os.path.join(directory, f"{circuit}_matches_{year}.csv"), index=False)
+    return sorted(years.unique().tolist())
+
+def scraped_name(full_name: str, country: str) -> str:
+    """Converte 'Prenome Sobrenome' para o formato do site de jogos: 'Sobrenome P. (Pai)'."""
+    first, surname = full_name.split(' ', 1)
+    return f"{surname} {first[0]}. ({country})"
+
+def generate_upcoming_matches(players: pd.DataFrame, num_matches: int, seed: int = 0, circuit: str = 'ATP') -> pd.DataFrame:
+    """Gera uma tabela no formato de `upcoming_matches.csv` com nomes no formato raspado."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(players), size=(num_matches, 2))
+    picks = picks[picks[:, 0] != picks[:, 1]]
+    to_scraped = [scraped_name(n, c) for n, c in zip(players['name'], players['country'])]
+    return pd.DataFrame({
+        'Circuit': circuit,
+        'Player 1': [to_scraped[i] for i in picks[:, 0]],
+        'Player 2': [to_scraped[i] for i in picks[:, 1]],
+        'Tournament': 'Tournament',
+        'Surface': rng.choice(['Hard', 'Clay', 'Grass'], len(picks)),
+    })
+
+def generate_schedule_html(upcoming: pd.DataFrame, matches_per_tournament: int = 12) -> str:
+    """
+    Gera uma página no formato da agenda do flashscore.mobi (cabeçalhos <h4> seguidos de
+    "Jogador 1 - Jogador 2" e um link `a.sched`), para testar e medir o parser sem acessar a rede.
+    """
+    tournaments = ['Wimbledon', 'Roland Garros', 'US Open', 'Rome', 'Halle', 'Miami', 'Estoril', 'Basel']
+    parts = ['<html><body><div id="score-data">']
+    for position, (circuit, p1, p2) in enumerate(zip(upcoming['Circuit'], upcoming['Player 1'], upcoming['Player 2'])):
+        if position % matches_per_tournament == 0:
+            tournament = tournaments[(position // matches_per_tournament) % len(tournaments)]
+            parts.append(f"<h4>{circuit.upper()} - SINGLES: {tournament}</h4>")
+        parts.append(f'<span>{10 + position % 12}:00</span>{p1} - {p2}<a href="/match/{position:08d}/" class="sched">-:-</a><br />')
+    parts.append('</div></body></html>')
+    return "\n".join(parts)
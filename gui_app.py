@@ -1,19 +1,140 @@
 # gui_app.py
+#
+# Painel de controle do 777stats. O pipeline (sincronização, Elo, features, treinamento e análise)
+# roda em um processo separado, que envia o progresso por uma fila; a janela apenas lê essa fila
+# periodicamente (`after`), então continua respondendo mesmo durante um retreinamento completo.
+#
+# Mensagens do processo de trabalho (tuplas):
+#   ('stage', etapa, total, descrição)              -> início de uma etapa do pipeline
+#   ('stage_done', etapa, total, descrição, segundos)
+#   ('span', nome, segundos)                          -> etapa instrumentada concluída (src.metrics)
+#   ('log', mensagem)
+#   ('result', circuito, linhas)                      -> previsões de um circuito, assim que ele termina
+#   ('done', segundos) | ('cancelled',) | ('error', mensagem)
 
+import logging
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import webbrowser
 import customtkinter as ctk
 
+# Intervalo (ms) de leitura da fila de mensagens do processo de trabalho
+POLL_INTERVAL_MS = 100
+
+# Tempo (ms) para o processo de trabalho parar sozinho após o cancelamento antes de ser encerrado à força
+CANCEL_GRACE_MS = 5000
+
+class PipelineCancelled(BaseException):
+    """
+    Interrompe o pipeline no início da próxima etapa após um pedido de cancelamento. Herda de
+    BaseException (como KeyboardInterrupt) para não ser tratado como erro de um arquivo pelos
+    blocos `except Exception` da sincronização.
+    """
+
+class _QueueLogHandler(logging.Handler):
+    """Repassa as mensagens de log do processo de trabalho para a janela."""
+    def __init__(self, messages):
+        super().__init__()
+        self.messages = messages
+
+    def emit(self, record):
+        self.messages.put(('log', self.format(record).strip()))
+
+def run_pipeline_worker(messages, cancel_event, retrain=False):
+    """
+    Fluxo completo do `main.py` (sincroniza, carrega/treina os modelos e analisa os jogos do dia),
+    executado no processo de trabalho. Os circuitos são preparados um de cada vez, para que as
+    previsões de cada um sejam enviadas assim que ele termina.
+    """
+    import pandas as pd
+    import main
+    from src import metrics
+    from src.prediction import predict_upcoming_matches
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueLogHandler(messages))
+    root.setLevel(logging.INFO)
+
+    def on_span(name, elapsed):
+        if elapsed is not None:
+            messages.put(('span', name, elapsed))
+        # O cancelamento é verificado no início de cada etapa instrumentada (só na thread principal:
+        # as threads de download da sincronização terminam normalmente)
+        elif cancel_event.is_set() and threading.current_thread() is threading.main_thread():
+            raise PipelineCancelled()
+
+    metrics.registry.configure(enabled=True)
+    metrics.registry.add_listener(on_span)
+
+    start = time.perf_counter()
+    try:
+        config = main.load_config()
+        circuits = main.get_circuits(config)
+        stages = [('sync', None, "Sincronizando o banco de dados")]
+        for circuit in circuits:
+            stages += [('prepare', circuit, f"{circuit.upper()}: carregando/treinando modelos"),
+                       ('analyze', circuit, f"{circuit.upper()}: analisando os próximos jogos")]
+
+        if retrain:
+            logging.getLogger("main").info("Retreinamento solicitado. Todos os modelos serão treinados do zero.")
+            main.remove_model_files(config, circuits)
+        try:
+            upcoming_matches = pd.read_csv("upcoming_matches.csv")
+        except FileNotFoundError:
+            upcoming_matches = None
+            logging.getLogger("main").warning("Arquivo 'upcoming_matches.csv' não encontrado; os modelos serão preparados sem análise.")
+
+        prepared = {}
+        for number, (kind, circuit, description) in enumerate(stages, start=1):
+            if cancel_event.is_set():
+                raise PipelineCancelled()
+            messages.put(('stage', number, len(stages), description))
+            stage_start = time.perf_counter()
+            if kind == 'sync':
+                main.sync_data(config)
+            elif kind == 'prepare':
+                prepared[circuit] = main.prepare_circuit(circuit, update=True)
+            else:
+                predictor, elo_model, resolver = prepared.pop(circuit)
+                rows = []
+                if upcoming_matches is not None and predictor is not None and elo_model is not None:
+                    predictions = predict_upcoming_matches(upcoming_matches, {circuit: predictor}, {circuit: elo_model}, {circuit: resolver})
+                    rows = main.prediction_rows(predictions)
+                messages.put(('result', circuit, rows))
+            messages.put(('stage_done', number, len(stages), description, time.perf_counter() - stage_start))
+        messages.put(('done', time.perf_counter() - start))
+    except PipelineCancelled:
+        messages.put(('cancelled',))
+    except Exception as e:
+        logging.getLogger(__name__).exception("Erro no pipeline.")
+        messages.put(('error', f"{type(e).__name__}: {e}"))
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
 
         # --- Configuração da Janela Principal ---
         self.title("777stats - Painel de Controle")
-        self.geometry("500x350")
+        self.geometry("900x650")
         self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(1, weight=1)
+        self.grid_rowconfigure(2, weight=1)
 
         ctk.set_appearance_mode("dark") # Define o tema escuro
 
+        # Estado do pipeline em segundo plano e do servidor do dashboard
+        self.worker = None
+        self.messages = None
+        self.cancel_event = None
+        self.stage_timings = []
+        self.server_process = None
+
         # --- Frame Superior: Título ---
         self.title_frame = ctk.CTkFrame(self, corner_radius=0)
         self.title_frame.grid(row=0, column=0, sticky="ew")
@@ -22,7 +143,7 @@ class App(ctk.CTk):
 
         # --- Frame Central: Botões de Ação ---
         self.button_frame = ctk.CTkFrame(self)
-        self.button_frame.grid(row=1, column=0, padx=20, pady=20, sticky="nsew")
+        self.button_frame.grid(row=1, column=0, padx=20, pady=(20, 10), sticky="ew")
         self.button_frame.grid_columnconfigure(0, weight=1)
         self.button_frame.grid_columnconfigure(1, weight=1)
 
@@ -34,45 +155,194 @@ class App(ctk.CTk):
         self.retrain_button = ctk.CTkButton(self.button_frame, text="Iniciar com Retreinamento", command=self.start_retrain_analysis)
         self.retrain_button.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
 
+        # Botão de Cancelar (ativo apenas com o pipeline em execução)
+        self.cancel_button = ctk.CTkButton(self.button_frame, text="Cancelar", state="disabled", command=self.cancel_pipeline)
+        self.cancel_button.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
+
         # Botão para ver a Dashboard
         self.dashboard_button = ctk.CTkButton(self.button_frame, text="Ver Dashboard", state="disabled", command=self.open_dashboard)
-        self.dashboard_button.grid(row=1, column=0, columnspan=2, padx=10, pady=10, sticky="ew")
-        
-        # --- Frame Inferior: Status e Animação ---
+        self.dashboard_button.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
+        if self._models_ready():
+            self.dashboard_button.configure(state="normal")
+
+        # --- Resultados: tabelas de cada circuito, exibidas assim que ele termina ---
+        self.results_box = ctk.CTkTextbox(self, font=ctk.CTkFont(family="Courier", size=12), wrap="none")
+        self.results_box.grid(row=2, column=0, padx=20, pady=10, sticky="nsew")
+        self.results_box.configure(state="disabled")
+
+        # --- Frame Inferior: Status e Progresso ---
         self.status_frame = ctk.CTkFrame(self, corner_radius=0)
-        self.status_frame.grid(row=2, column=0, sticky="ew", padx=20, pady=10)
+        self.status_frame.grid(row=3, column=0, sticky="ew", padx=20, pady=10)
         self.status_frame.grid_columnconfigure(0, weight=1)
-        
+
         self.status_label = ctk.CTkLabel(self.status_frame, text="Status: Aguardando Comando")
         self.status_label.grid(row=0, column=0, sticky="w", padx=10)
 
-        # Barra de Progresso como "Animação"
-        self.progress_bar = ctk.CTkProgressBar(self.status_frame, mode='indeterminate')
-        
+        # Barra de Progresso: fração das etapas concluídas
+        self.progress_bar = ctk.CTkProgressBar(self.status_frame, mode='determinate')
+        self.progress_bar.set(0)
+
+        # Última etapa instrumentada concluída e última mensagem de log
+        self.detail_label = ctk.CTkLabel(self.status_frame, text="", text_color="gray60", anchor="w")
+        self.detail_label.grid(row=2, column=0, sticky="ew", padx=10, pady=(0, 5))
+
         # Botão de Desligar
         self.quit_button = ctk.CTkButton(self, text="Desligar", command=self.quit_app, fg_color="transparent", border_width=2, text_color=("gray10", "#DCE4EE"))
-        self.quit_button.grid(row=3, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.quit_button.grid(row=4, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.protocol("WM_DELETE_WINDOW", self.quit_app)
 
-    # --- Funções dos Botões (por enquanto, apenas imprimem no console) ---
+    # --- Pipeline em segundo plano ---
     def start_analysis(self):
-        print("Botão 'Iniciar Análise' clicado. Lógica a ser implementada.")
-        self.status_label.configure(text="Status: Análise iniciada...")
-        self.progress_bar.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
-        self.progress_bar.start()
+        self._start_pipeline(retrain=False, status="Status: Análise iniciada...")
 
     def start_retrain_analysis(self):
-        print("Botão 'Iniciar com Retreinamento' clicado. Lógica a ser implementada.")
-        self.status_label.configure(text="Status: Retreinamento iniciado (pode levar vários minutos)...")
+        self._start_pipeline(retrain=True, status="Status: Retreinamento iniciado (pode levar vários minutos)...")
+
+    def _start_pipeline(self, retrain: bool, status: str):
+        if self.worker is not None:
+            return
+        # Processo "spawn": o filho não herda o estado do Tk; um processo (e não uma thread) pode ser
+        # encerrado se não parar sozinho após o cancelamento
+        context = multiprocessing.get_context('spawn')
+        self.messages = context.Queue()
+        self.cancel_event = context.Event()
+        self.worker = context.Process(target=run_pipeline_worker, args=(self.messages, self.cancel_event, retrain), daemon=True)
+        self.worker.start()
+
+        self.stage_timings = []
+        self._clear_results()
+        self._set_running(True)
+        self.status_label.configure(text=status)
+        self.detail_label.configure(text="")
+        self.progress_bar.set(0)
         self.progress_bar.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
-        self.progress_bar.start()
+        self.after(POLL_INTERVAL_MS, self._poll_messages)
+
+    def cancel_pipeline(self):
+        if self.worker is None:
+            return
+        self.cancel_event.set()
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text="Status: Cancelando (ao fim da etapa atual)...")
+        worker = self.worker
+        self.after(CANCEL_GRACE_MS, lambda: self._force_stop(worker))
+
+    def _force_stop(self, worker):
+        """Encerra o processo de trabalho se ele não parou sozinho no prazo do cancelamento."""
+        if worker is self.worker and worker.is_alive():
+            worker.terminate()
+            worker.join()
+            self._finish("Status: Cancelado (processo de trabalho encerrado).")
+
+    def _poll_messages(self):
+        if self.worker is None:
+            return
+        try:
+            while True:
+                self._handle_message(self.messages.get_nowait())
+                if self.worker is None:
+                    return
+        except queue.Empty:
+            pass
+        if not self.worker.is_alive() and self.messages.empty():
+            self._finish(f"Status: Erro - o processo de trabalho terminou inesperadamente (código {self.worker.exitcode}).")
+            return
+        self.after(POLL_INTERVAL_MS, self._poll_messages)
+
+    def _handle_message(self, message):
+        kind = message[0]
+        if kind == 'stage':
+            _, number, total, description = message
+            self.progress_bar.set((number - 1) / total)
+            self.status_label.configure(text=f"Status: Etapa {number}/{total} - {description}...")
+        elif kind == 'stage_done':
+            _, number, total, description, seconds = message
+            self.progress_bar.set(number / total)
+            self.stage_timings.append((description, seconds))
+            self.status_label.configure(text=f"Status: Etapa {number}/{total} concluída - {description} ({seconds:.1f}s)")
+        elif kind == 'span':
+            _, name, seconds = message
+            self.detail_label.configure(text=f"{name}: {seconds:.2f}s")
+        elif kind == 'log':
+            if message[1]:
+                self.detail_label.configure(text=message[1].splitlines()[-1])
+        elif kind == 'result':
+            self._render_result(message[1], message[2])
+        elif kind == 'done':
+            self.progress_bar.set(1)
+            self._append_results("\n--- Tempo por etapa ---\n" + "\n".join(f"{description}: {seconds:.1f}s" for description, seconds in self.stage_timings) + "\n")
+            self._finish(f"Status: Concluído em {message[1]:.1f}s")
+        elif kind == 'cancelled':
+            self._finish("Status: Cancelado.")
+        elif kind == 'error':
+            self._finish(f"Status: Erro - {message[1]}")
+
+    def _finish(self, status: str):
+        if self.worker is not None:
+            self.worker.join(timeout=1)
+        self.worker = None
+        self._set_running(False)
+        self.status_label.configure(text=status)
+        if self._models_ready():
+            self.dashboard_button.configure(state="normal")
+
+    def _set_running(self, running: bool):
+        state = "disabled" if running else "normal"
+        self.start_button.configure(state=state)
+        self.retrain_button.configure(state=state)
+        self.cancel_button.configure(state="normal" if running else "disabled")
+
+    # --- Resultados ---
+    def _render_result(self, circuit: str, rows: list):
+        from tabulate import tabulate
+        from main import PREDICTION_HEADERS
+        header = f"--- {circuit.upper()}: ANÁLISE DOS PRÓXIMOS JOGOS (MODELO MACHINE LEARNING) ---\n"
+        if rows:
+            self._append_results(header + tabulate(rows, headers=PREDICTION_HEADERS, tablefmt="grid") + "\n\n")
+        else:
+            self._append_results(header + "Nenhuma partida com dados completos foi encontrada.\n\n")
+
+    def _append_results(self, text: str):
+        self.results_box.configure(state="normal")
+        self.results_box.insert("end", text)
+        self.results_box.see("end")
+        self.results_box.configure(state="disabled")
+
+    def _clear_results(self):
+        self.results_box.configure(state="normal")
+        self.results_box.delete("1.0", "end")
+        self.results_box.configure(state="disabled")
+
+    # --- Dashboard ---
+    def _models_ready(self) -> bool:
+        from main import circuit_filename, get_circuits, load_config
+        config = load_config()
+        return any(os.path.exists(circuit_filename(config, 'bundle_filename', circuit)) for circuit in get_circuits(config))
 
     def open_dashboard(self):
-        print("Botão 'Ver Dashboard' clicado. Lógica a ser implementada.")
+        """Inicia o servidor local de previsões ("python main.py serve"), se necessário, e abre o dashboard no navegador."""
+        from main import load_config
+        config = load_config()
+        url = f"http://{config.get('Server', 'host', fallback='127.0.0.1')}:{config.getint('Server', 'port', fallback=8777)}/"
+        if self.server_process is None or self.server_process.poll() is not None:
+            main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+            self.server_process = subprocess.Popen([sys.executable, main_script, "serve"])
+            # Tempo para o servidor carregar os bundles antes de abrir a página
+            self.after(1500, lambda: webbrowser.open(url))
+        else:
+            webbrowser.open(url)
 
     def quit_app(self):
         print("Desligando a aplicação.")
+        if self.worker is not None and self.worker.is_alive():
+            self.cancel_event.set()
+            self.worker.join(timeout=CANCEL_GRACE_MS / 1000)
+            if self.worker.is_alive():
+                self.worker.terminate()
+        if self.server_process is not None and self.server_process.poll() is None:
+            self.server_process.terminate()
         self.destroy()
 
 if __name__ == "__main__":
     app = App()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
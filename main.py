@@ -1,18 +1,44 @@
 # main.py
+#
+# Interface de linha de comando do 777stats. Cada subcomando importa apenas o que precisa:
+# `predict` não importa o scikit-learn nem o cliente HTTP quando a base está dentro da janela de frescor.
+#
+#   python main.py sync       -> sincroniza o banco com os CSVs de Jeff Sackmann
+#   python main.py train      -> treina os modelos que faltarem e atualiza os demais com as partidas novas (--force para treinar do zero)
+#   python main.py predict    -> analisa os jogos de upcoming_matches.csv
+#   python main.py status     -> mostra o estado do banco, dos modelos e da sincronização
+#   python main.py serve      -> servidor HTTP local (dashboard + API JSON) com os modelos em memória
+#   python main.py backtest   -> avaliação walk-forward (treina até a temporada N, testa em N+1)
+#   python main.py sweep      -> varredura de k_factor e decaimento da Forma Recente (--write-config grava a melhor)
+#   python main.py simulate   -> simula as chaves dos torneios (Monte Carlo): chance de cada jogador chegar a cada rodada
+#   python main.py rating     -> Elo de um jogador em uma data passada (histórico de ratings, sem reprocessar as partidas)
+#   python main.py [--retrain] -> fluxo completo (sincroniza, treina se necessário e analisa)
+#
+# Opções globais (antes do subcomando): --metrics grava tempos por etapa e contadores ([Metrics]);
+# --profile ETAPAS perfila as etapas indicadas com cProfile.
 
-import pickle
+import argparse
+import configparser
+import functools
+import logging
 import os
+import pickle
 import sqlite3
 import sys
-import configparser
-import pandas as pd
-from datetime import datetime
-from tabulate import tabulate
-from src.data_handler import init_db, get_last_year_in_db, download_and_insert_data, load_all_data_from_db
-from src.elo_model import TennisEloModel
-from src.utils import normalize_player_name, get_h2h_record
-from src.feature_engineering import create_feature_vector, create_dataset_for_ml
-from src.ml_model import MLModel
+import time
+from datetime import datetime, timedelta
+from src import metrics
+
+CIRCUITS = ['atp', 'wta']
+
+# Nomes padrão dos arquivos de cada circuito quando não definidos em [Model] (ex.: circuitos novos)
+MODEL_FILE_DEFAULTS = {'model_filename': '{circuit}_model.pkl', 'bundle_filename': '{circuit}_model.bundle',
+                       'elo_state_filename': '{circuit}_elo.pkl', 'training_state_filename': '{circuit}_training.pkl'}
+
+# Colunas da tabela de análise dos próximos jogos
+PREDICTION_HEADERS = ["Circuito", "Jogador 1", "Jogador 2", "Superfície", "H2H Geral", "Prob. P1 (ML)"]
+
+logger = logging.getLogger("main")
 
 def load_config():
     """Carrega as configurações do arquivo config.ini."""
@@ -20,123 +46,701 @@ def load_config():
     config.read('config.ini')
     return config
 
+def setup_instrumentation(config, args):
+    """Configura o log de progresso e liga a instrumentação conforme [Metrics] e as opções da linha de comando."""
+    level = config.get('Metrics', 'log_level', fallback='INFO').upper()
+    logging.basicConfig(level=getattr(logging, level, logging.INFO), format="%(message)s", stream=sys.stdout)
+    profile_stages = args.profile or config.get('Metrics', 'profile_stages', fallback='')
+    profile_stages = [stage.strip() for stage in profile_stages.split(',') if stage.strip()]
+    enabled = args.metrics or bool(profile_stages) or config.getboolean('Metrics', 'enabled', fallback=False)
+    metrics.registry.configure(enabled=enabled, profile_stages=profile_stages,
+                               profile_dir=config.get('Metrics', 'profile_dir', fallback='profiles'))
+
+def write_metrics(config):
+    """Grava as métricas da execução em JSON (e no formato do Prometheus, se configurado)."""
+    if not metrics.registry.enabled:
+        return
+    json_file = config.get('Metrics', 'json_file', fallback=os.path.join('data', 'metrics.json'))
+    metrics.registry.write_json(json_file)
+    prometheus_file = config.get('Metrics', 'prometheus_file', fallback='')
+    if prometheus_file:
+        metrics.registry.write_prometheus(prometheus_file)
+    logger.info(f"Métricas da execução gravadas em '{json_file}'.")
+
+def get_circuits(config) -> list:
+    """Circuitos processados, definidos em [Pipeline] circuits (padrão: ATP e WTA)."""
+    circuits = config.get('Pipeline', 'circuits', fallback=','.join(CIRCUITS))
+    return [circuit.strip().lower() for circuit in circuits.replace(',', ' ').split()]
+
+def circuit_filename(config, key: str, circuit: str) -> str:
+    """Arquivo `key` do circuito ('model_filename', 'bundle_filename', 'elo_state_filename' ou 'training_state_filename')."""
+    return config.get('Model', f'{key}_{circuit}', fallback=MODEL_FILE_DEFAULTS[key].format(circuit=circuit))
+
+def pipeline_workers(config) -> int:
+    """Processos usados para preparar os circuitos em paralelo (0 = um por circuito, até o número de núcleos)."""
+    return config.getint('Pipeline', 'max_workers', fallback=0)
+
+def elo_params_from_config(config) -> dict:
+    """Parâmetros do Elo definidos em [Model] (base_rating, k_factor e recent_form_months)."""
+    return {
+        'base_rating': config.getfloat('Model', 'base_rating', fallback=1500),
+        'k_factor': config.getfloat('Model', 'k_factor', fallback=32),
+        'recent_form_months': config.getint('Model', 'recent_form_months', fallback=6),
+    }
+
+def incremental_training(config) -> bool:
+    """Indica se o modelo de ML é atualizado incrementalmente ([Model] ml_training = incremental)."""
+    return config.get('Model', 'ml_training', fallback='incremental').strip().lower() == 'incremental'
+
+def drift_params_from_config(config) -> dict:
+    """Limites de drift ([Model]) que disparam um treinamento completo no modo incremental."""
+    return {
+        'max_log_loss_increase': config.getfloat('Model', 'drift_max_log_loss_increase', fallback=0.02),
+        'max_calibration_error': config.getfloat('Model', 'drift_max_calibration_error', fallback=0.05),
+        'min_matches': config.getint('Model', 'drift_min_matches', fallback=1000),
+    }
+
 def sync_data(config):
-    """Sincroniza o banco de dados para os circuitos ATP e WTA."""
-    init_db()
+    """
+    Sincroniza o banco de dados para os circuitos de [Pipeline] circuits (padrão: ATP e WTA).
+
+    Os arquivos pendentes são baixados em paralelo; o ano mais recente já salvo é sempre
+    verificado de novo (com cache HTTP), para capturar partidas adicionadas depois.
+    """
+    from src.data_handler import DEFAULT_BASE_URL, init_db, configure_connection, get_last_year_in_db, write_snapshot, set_last_sync_time
+    from src.sync import sync_circuits
+    circuits = get_circuits(config)
+    init_db(circuits)
     data_up_to_year = config.getint('DataSource', 'data_up_to_year')
     start_year_default = config.getint('DataSource', 'start_year_default')
-    circuits = ['atp', 'wta']
+    base_url = config.get('DataSource', 'base_url', fallback=DEFAULT_BASE_URL)
+    max_workers = config.getint('DataSource', 'max_download_workers', fallback=8)
+    years_by_circuit, fresh_circuits = {}, set()
     for circuit in circuits:
-        print(f"\n--- Sincronizando circuito {circuit.upper()} ---")
         last_year_in_db = get_last_year_in_db(circuit)
-        start_year = last_year_in_db + 1 if last_year_in_db else start_year_default
+        start_year = last_year_in_db if last_year_in_db else start_year_default
         if last_year_in_db is None:
-            print(f"Nenhum dado encontrado para {circuit.upper()}. Iniciando download desde {start_year}...")
-        conn = sqlite3.connect(os.path.join("data", "777stats.db"))
+            # Banco vazio: o cache HTTP de execuções anteriores não vale mais
+            fresh_circuits.add(circuit)
+            logger.info(f"Nenhum dado encontrado para {circuit.upper()}. Iniciando download desde {start_year}...")
+        years_by_circuit[circuit] = list(range(start_year, data_up_to_year + 1))
+
+    logger.info(f"\n--- Sincronizando circuitos {', '.join(c.upper() for c in circuits)} ---")
+    conn = sqlite3.connect(os.path.join("data", "777stats.db"))
+    configure_connection(conn)
+    try:
+        with metrics.span('pipeline.sync'):
+            totals = sync_circuits(conn, years_by_circuit, base_url=base_url, max_workers=max_workers, ignore_cache_for=fresh_circuits)
+    finally:
+        conn.close()
+
+    # Regrava o snapshot colunar dos circuitos que receberam partidas novas
+    for circuit, counts in totals.items():
+        if counts['inserted']:
+            write_snapshot(circuit)
+    # Só uma sincronização completa renova a janela de frescor: com falhas, o próximo "predict" tenta de novo
+    failed = sum(counts['failed'] for counts in totals.values())
+    if failed:
+        logger.warning(f"Sincronização incompleta: {failed} arquivo(s) com falha. O horário da sincronização não foi registrado.")
+    else:
+        set_last_sync_time()
+    return totals
+
+def train_elo_model(config, circuit, historical_data):
+    """
+    Treina o Elo do zero com todo o histórico (`MatchHistory`) e salva o estado (com checkpoint) ao
+    lado do modelo, junto com o histórico de ratings de todas as partidas.
+    """
+    from src.data_handler import get_last_rowid
+    from src.elo_model import TennisEloModel
+    from src.rating_history import RatingHistory
+    last_rowid = get_last_rowid(circuit)
+    elo_model = TennisEloModel(**elo_params_from_config(config))
+    elo_model.history = RatingHistory(base_rating=elo_model.base_rating, decay_days=elo_model.decay_days)
+    elo_model.train_general(historical_data)
+    elo_model.set_checkpoint(last_rowid, historical_data.last_date)
+    save_elo_state(config, circuit, elo_model)
+    return elo_model
+
+def save_elo_state(config, circuit, elo_model):
+    """
+    Salva o estado Elo e, se já existir um bundle do circuito, atualiza o estado Elo dentro dele.
+    O histórico de ratings acumulado no treinamento é gravado em data/ e desanexado do modelo.
+    """
+    from src.data_handler import rating_history_path
+    from src.model_bundle import update_bundle_elo_state
+    elo_model.save(circuit_filename(config, 'elo_state_filename', circuit))
+    if elo_model.history is not None:
+        with metrics.span('elo.save_history'):
+            elo_model.history.save(rating_history_path(circuit), elo_model.last_rowid)
+        elo_model.history = None
+    bundle_filename = circuit_filename(config, 'bundle_filename', circuit)
+    if os.path.exists(bundle_filename):
         try:
-            for year in range(start_year, data_up_to_year + 1):
-                download_and_insert_data(year, circuit, conn)
-        finally:
-            conn.close()
+            update_bundle_elo_state(bundle_filename, elo_model)
+        except (ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Bundle ({circuit.upper()}) inválido ou de outros parâmetros do Elo; o estado Elo não foi atualizado nele: {e}")
+
+def load_elo_model(config, circuit):
+    """
+    Carrega o estado Elo salvo e aplica apenas as partidas inseridas desde o último checkpoint.
+    Se não houver estado compatível, treina do zero com todo o histórico.
+    """
+    from src.data_handler import count_matches_before, get_last_rowid, load_match_history, load_new_matches_from_db, rating_history_path
+    from src.elo_model import TennisEloModel
+    from src.rating_history import RatingHistory
+    state_filename = circuit_filename(config, 'elo_state_filename', circuit)
+    last_rowid = get_last_rowid(circuit)
+
+    elo_model = None
+    if os.path.exists(state_filename):
+        try:
+            with metrics.span('elo.load_state'):
+                elo_model = TennisEloModel.load(state_filename)
+        except (ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Estado Elo ({circuit.upper()}) inválido, será recriado: {e}")
+        expected_params = TennisEloModel(**elo_params_from_config(config)).params()
+        if elo_model is not None and (elo_model.params() != expected_params or elo_model.last_rowid > last_rowid):
+            logger.warning(f"Estado Elo ({circuit.upper()}) desatualizado (parâmetros ou banco diferentes). Recriando...")
+            elo_model = None
+        elif elo_model is not None and RatingHistory.saved_checkpoint(rating_history_path(circuit)) != elo_model.last_rowid:
+            logger.warning(f"Histórico de ratings ({circuit.upper()}) ausente ou fora do checkpoint do Elo. Recriando...")
+            elo_model = None
+
+    if elo_model is None:
+        historical_data = load_match_history(circuit)
+        if historical_data.empty:
+            return None
+        return train_elo_model(config, circuit, historical_data)
+
+    new_matches = load_new_matches_from_db(circuit, elo_model.last_rowid)
+    if new_matches.empty:
+        logger.info(f"Estado Elo ({circuit.upper()}) carregado; nenhuma partida nova desde o último checkpoint.")
+        return elo_model
+    out_of_order = count_matches_before(new_matches, elo_model.last_date)
+    if out_of_order:
+        logger.warning(f"{out_of_order} partida(s) nova(s) ({circuit.upper()}) anterior(es) ao checkpoint do Elo ({elo_model.last_date}). Recriando com todo o histórico...")
+        return train_elo_model(config, circuit, load_match_history(circuit))
+
+    logger.info(f"Atualizando Elo ({circuit.upper()}) com {len(new_matches)} partidas novas...")
+    elo_model.history = RatingHistory.load(rating_history_path(circuit))
+    elo_model.train_general(new_matches)
+    elo_model.set_checkpoint(last_rowid, new_matches['tourney_date'].max())
+    save_elo_state(config, circuit, elo_model)
+    return elo_model
 
 def train_and_save_model(config, circuit):
-    """Função para treinar e salvar o modelo de um circuito específico."""
-    model_filename = config.get('Model', f'model_filename_{circuit}')
-    print(f"\nNenhum modelo de ML ({circuit.upper()}) encontrado. Iniciando pipeline de treinamento...")
-    historical_data = load_all_data_from_db(circuit)
+    """
+    Função para treinar e salvar o modelo de um circuito específico.
+    Retorna o preditor leve carregado do bundle recém-exportado.
+    """
+    from src.data_handler import get_last_rowid, load_match_history
+    from src.feature_engineering import PointInTimeFeatureBuilder, create_dataset_for_ml
+    from src.ml_model import MLModel # Importação tardia: o sklearn só é necessário para treinar
+    from src.model_bundle import export_model_bundle, load_model_bundle
+    from src.rating_history import RatingHistory
+    model_filename = circuit_filename(config, 'model_filename', circuit)
+    bundle_filename = circuit_filename(config, 'bundle_filename', circuit)
+    historical_data = load_match_history(circuit)
     if historical_data.empty:
-        print(f"Nenhum dado histórico da {circuit.upper()} para treinar.")
+        logger.info(f"Nenhum dado histórico da {circuit.upper()} para treinar.")
         return None
-    elo_model = TennisEloModel()
-    elo_model.train_general(historical_data)
-    elo_model.train_recent_form(historical_data, months=config.getint('Model', 'recent_form_months'))
-    X_train, y_train = create_dataset_for_ml(circuit, historical_data, elo_model)
-    ml_model = MLModel()
+    last_rowid = get_last_rowid(circuit)
+    # A passada de features já treina o Elo com todo o histórico: o Elo do gerador é salvo como o
+    # estado Elo do circuito, sem uma segunda passada
+    builder = PointInTimeFeatureBuilder(**elo_params_from_config(config))
+    elo_model = builder.elo_model
+    elo_model.history = RatingHistory(base_rating=elo_model.base_rating, decay_days=elo_model.decay_days)
+    X_train, y_train = create_dataset_for_ml(circuit, historical_data, elo_model, builder=builder)
+    elo_model.set_checkpoint(last_rowid, historical_data.last_date)
+    save_elo_state(config, circuit, elo_model)
+    ml_model = MLModel(incremental=incremental_training(config))
     ml_model.train(X_train, y_train)
-    print(f"Salvando modelo de ML ({circuit.upper()}) treinado em '{model_filename}'...")
+    logger.info(f"Salvando modelo de ML ({circuit.upper()}) treinado em '{model_filename}'...")
     with open(model_filename, 'wb') as f:
         pickle.dump(ml_model, f)
-    print("Modelo salvo!")
-    return ml_model
+    if ml_model.incremental:
+        # Checkpoint do treinamento incremental: a passada de features continua da última partida treinada
+        builder.save(circuit_filename(config, 'training_state_filename', circuit))
+    export_model_bundle(bundle_filename, ml_model, elo_model, circuit)
+    logger.info(f"Modelo salvo! Bundle de inferência gravado em '{bundle_filename}'.")
+    predictor, _ = load_model_bundle(bundle_filename)
+    return predictor
 
-def main():
-    """Função principal para executar o fluxo do sistema."""
-    config = load_config()
-    circuits = ['atp', 'wta']
-    ml_models, elo_models, known_players_map = {}, {}, {}
+def update_ml_model(config, circuit):
+    """
+    Atualiza o modelo de ML (modo incremental) só com as partidas inseridas desde o checkpoint de
+    treinamento e reexporta o bundle; o custo é proporcional ao número de partidas novas.
+    Treina do zero se não houver checkpoint compatível ou se as métricas de drift passarem dos
+    limites de [Model]. Retorna o preditor, ou None se não houver partidas novas.
+    """
+    from src.data_handler import count_matches_before, get_last_rowid, load_new_matches_from_db
+    from src.elo_model import TennisEloModel
+    from src.feature_engineering import PointInTimeFeatureBuilder, randomize_orientation
+    from src.model_bundle import export_model_bundle, load_model_bundle
+    model_filename = circuit_filename(config, 'model_filename', circuit)
+    bundle_filename = circuit_filename(config, 'bundle_filename', circuit)
+    state_filename = circuit_filename(config, 'training_state_filename', circuit)
+    last_rowid = get_last_rowid(circuit)
 
-    print("--- INICIANDO SISTEMA DE ANÁLISE DE TÊNIS 777stats ---")
-    if '--retrain' in sys.argv:
-        print("Flag '--retrain' detectada. Todos os modelos serão treinados do zero.")
-        for c in circuits:
-            fname = config.get('Model', f'model_filename_{c}')
-            if os.path.exists(fname): os.remove(fname)
-            print(f"Arquivo de modelo antigo '{fname}' removido.")
-    
-    sync_data(config)
+    try:
+        with open(model_filename, 'rb') as f: ml_model = pickle.load(f)
+        builder = PointInTimeFeatureBuilder.load(state_filename)
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+        logger.info(f"\nSem checkpoint de treinamento incremental ({circuit.upper()}): {e}. Treinando do zero...")
+        return train_and_save_model(config, circuit)
+    checkpoint = builder.elo_model.last_rowid
+    expected_params = TennisEloModel(**elo_params_from_config(config)).params()
+    if not getattr(ml_model, 'incremental', False) or builder.elo_model.params() != expected_params or checkpoint > last_rowid:
+        logger.info(f"\nModelo de ML ({circuit.upper()}) incompatível com o treinamento incremental (modelo, parâmetros ou banco diferentes). Treinando do zero...")
+        return train_and_save_model(config, circuit)
+    if checkpoint == last_rowid:
+        logger.info(f"\nModelo de ML ({circuit.upper()}) já treinado com todas as partidas do banco.")
+        return None
 
-    for circuit in circuits:
-        model_filename = config.get('Model', f'model_filename_{circuit}')
-        if os.path.exists(model_filename):
-            print(f"\nCarregando modelo de ML ({circuit.upper()})...")
-            with open(model_filename, 'rb') as f: ml_models[circuit] = pickle.load(f)
-            print(f"Modelo ({circuit.upper()}) carregado!")
+    new_matches = load_new_matches_from_db(circuit, checkpoint)
+    out_of_order = count_matches_before(new_matches, builder.elo_model.last_date)
+    if out_of_order:
+        logger.info(f"\n{out_of_order} partida(s) nova(s) ({circuit.upper()}) anterior(es) ao checkpoint de treinamento. Treinando do zero...")
+        return train_and_save_model(config, circuit)
+    logger.info(f"\nAtualizando modelo de ML ({circuit.upper()}) com {len(new_matches)} partidas novas...")
+    with metrics.span('ml.incremental_features'):
+        X_new = builder.transform(new_matches)
+    X_new, y_new = randomize_orientation(X_new, seed=last_rowid)
+    update = ml_model.update(X_new, y_new)
+    drift = ml_model.drift_metrics()
+    logger.info(f"Log-loss nas partidas novas: {update['log_loss']:.4f} | desde o último treino completo "
+                f"({drift['matches']} partidas): {drift['log_loss']:.4f} (referência: {drift['baseline_log_loss']:.4f}), "
+                f"erro de calibração {drift['calibration_error']:.3f}")
+    if ml_model.needs_refit(**drift_params_from_config(config)):
+        logger.warning(f"Desempenho do modelo de ML ({circuit.upper()}) degradou além dos limites de drift. Treinando do zero...")
+        metrics.increment('ml_drift_refits')
+        return train_and_save_model(config, circuit)
+
+    builder.elo_model.set_checkpoint(last_rowid, new_matches['tourney_date'].max())
+    with open(model_filename, 'wb') as f:
+        pickle.dump(ml_model, f)
+    builder.save(state_filename)
+    export_model_bundle(bundle_filename, ml_model, load_elo_model(config, circuit), circuit)
+    logger.info(f"Modelo de ML ({circuit.upper()}) atualizado! Bundle de inferência gravado em '{bundle_filename}'.")
+    predictor, _ = load_model_bundle(bundle_filename)
+    return predictor
+
+def load_predictor(config, circuit, update=False):
+    """
+    Carrega o preditor do circuito a partir do bundle (sem importar o sklearn). Um modelo .pkl
+    antigo é convertido para bundle; sem modelo, ou com bundle incompatível (inclusive treinado com
+    parâmetros do Elo diferentes dos de [Model], ex.: após "sweep --write-config"), treina do zero.
+    Com `update` (e [Model] ml_training = incremental), antes atualiza o modelo com as partidas novas.
+    """
+    from src.elo_model import TennisEloModel
+    from src.feature_engineering import FEATURE_NAMES
+    from src.model_bundle import export_model_bundle, load_model_bundle
+    bundle_filename = circuit_filename(config, 'bundle_filename', circuit)
+    model_filename = circuit_filename(config, 'model_filename', circuit)
+    if update and incremental_training(config) and os.path.exists(model_filename):
+        predictor = update_ml_model(config, circuit)
+        if predictor is not None:
+            return predictor
+    if os.path.exists(bundle_filename):
+        logger.info(f"\nCarregando modelo de ML ({circuit.upper()})...")
+        try:
+            predictor, bundle_elo = load_model_bundle(bundle_filename)
+            expected_params = TennisEloModel(**elo_params_from_config(config)).params()
+            if bundle_elo.params() != expected_params:
+                raise ValueError(f"treinado com os parâmetros do Elo {bundle_elo.params()}, mas [Model] define {expected_params}")
+            logger.info(f"Modelo ({circuit.upper()}) carregado!")
+            return predictor
+        except (ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Bundle ({circuit.upper()}) inválido ou incompatível: {e}")
+    elif os.path.exists(model_filename):
+        with open(model_filename, 'rb') as f: ml_model = pickle.load(f)
+        # Modelos salvos com um esquema de features anterior não podem ser convertidos: treina do zero
+        num_features = len(getattr(ml_model.scaler, 'mean_', ()))
+        if num_features != len(FEATURE_NAMES):
+            logger.warning(f"Modelo de ML ({circuit.upper()}) '{model_filename}' usa {num_features} features "
+                           f"(esperadas {len(FEATURE_NAMES)}); será treinado de novo.")
         else:
-            ml_models[circuit] = train_and_save_model(config, circuit)
-        
-        print(f"Preparando gerador de features para jogos futuros ({circuit.upper()})...")
-        historical_data = load_all_data_from_db(circuit)
-        if not historical_data.empty:
-            elo_model = TennisEloModel()
-            elo_model.train_general(historical_data)
-            elo_model.train_recent_form(historical_data, months=config.getint('Model', 'recent_form_months'))
+            logger.info(f"\nConvertendo modelo de ML ({circuit.upper()}) '{model_filename}' para bundle...")
+            elo_model = load_elo_model(config, circuit)
+            if elo_model is not None:
+                export_model_bundle(bundle_filename, ml_model, elo_model, circuit)
+                predictor, _ = load_model_bundle(bundle_filename)
+                return predictor
+    logger.info(f"\nNenhum modelo de ML ({circuit.upper()}) encontrado. Iniciando pipeline de treinamento...")
+    return train_and_save_model(config, circuit)
+
+def remove_model_files(config, circuits):
+    """Remove modelos, bundles e estados Elo salvos, forçando um treinamento do zero."""
+    for c in circuits:
+        for key in MODEL_FILE_DEFAULTS:
+            fname = circuit_filename(config, key, c)
+            if os.path.exists(fname): os.remove(fname)
+            logger.info(f"Arquivo de modelo antigo '{fname}' removido.")
+
+def prepare_circuit(circuit, update=False):
+    """
+    Pipeline de um circuito: carrega (ou treina) o preditor, atualiza o Elo e monta o resolvedor
+    de nomes. Retorna (preditor, modelo Elo, resolvedor). Pode rodar em um processo separado.
+    Com `update`, o modelo de ML também é atualizado com as partidas novas (ver `update_ml_model`).
+    """
+    from src.utils import PlayerNameResolver
+    config = load_config()
+    with metrics.span('pipeline.load_predictor'):
+        predictor = load_predictor(config, circuit, update=update)
+
+    logger.info(f"Preparando gerador de features para jogos futuros ({circuit.upper()})...")
+    with metrics.span('pipeline.load_elo'):
+        elo_model = load_elo_model(config, circuit)
+    resolver = None
+    if elo_model is not None:
+        with metrics.span('pipeline.build_resolver'):
+            resolver = PlayerNameResolver(elo_model.known_players())
+    return predictor, elo_model, resolver
+
+def load_models(config, circuits, max_workers=1, update=False):
+    """
+    Carrega (ou treina) preditores, modelos Elo e resolvedores de nomes de cada circuito.
+    Com `max_workers` diferente de 1, cada circuito é preparado em um processo próprio.
+    Com `update`, os modelos de ML são atualizados com as partidas novas do banco.
+    """
+    from src.pipeline import run_circuits
+    results = run_circuits(functools.partial(prepare_circuit, update=update), circuits, max_workers=max_workers)
+    ml_models, elo_models, known_players_map = {}, {}, {}
+    for circuit, (predictor, elo_model, resolver) in results.items():
+        ml_models[circuit] = predictor
+        if elo_model is not None:
             elo_models[circuit] = elo_model
-            known_players_map[circuit] = set(elo_model.ratings_hard.keys()) | set(elo_model.ratings_clay.keys()) | set(elo_model.ratings_grass.keys())
+            known_players_map[circuit] = resolver
+    return ml_models, elo_models, known_players_map
+
+def prediction_rows(predictions) -> list:
+    """Linhas da tabela de análise (colunas de `PREDICTION_HEADERS`) a partir das previsões."""
+    return [
+        [row['Circuit'], row['Player 1'], row['Player 2'], row['Surface'], f"{row['H2H P1']} - {row['H2H P2']}", f"{row['Prob P1']:.2%}"]
+        for _, row in predictions.iterrows()
+    ]
+
+def analyze_upcoming_matches(ml_models, elo_models, known_players_map):
+    """Lê `upcoming_matches.csv`, calcula as probabilidades em lote e imprime a tabela de análise."""
+    import pandas as pd
+    from tabulate import tabulate
+    from src.prediction import predict_upcoming_matches
 
     try:
         upcoming_matches_df = pd.read_csv("upcoming_matches.csv")
     except FileNotFoundError:
         print("\nArquivo 'upcoming_matches.csv' não encontrado. Por favor, execute 'scrape_matches.py' primeiro.")
-        return
-        
+        return None
+
     if upcoming_matches_df.empty:
         print("\nNenhum jogo encontrado no arquivo 'upcoming_matches.csv' para análise.")
-        return
-
-    results_data, headers = [], ["Circuito", "Jogador 1", "Jogador 2", "Superfície", "H2H Geral", "Prob. P1 (ML)"]
-    for index, match in upcoming_matches_df.iterrows():
-        circuit = match['Circuit'].lower()
-        surface = match['Surface']
-        scraped_p1 = match['Player 1']
-        scraped_p2 = match['Player 2']
-
-        if circuit not in ml_models or ml_models[circuit] is None or surface == 'Unknown':
-            continue
+        return None
 
-        known_players = known_players_map.get(circuit, set())
-        full_name_p1 = normalize_player_name(scraped_p1, known_players)
-        full_name_p2 = normalize_player_name(scraped_p2, known_players)
-        
-        if not full_name_p1 or not full_name_p2:
-            continue
-        
-        h2h = get_h2h_record(circuit, full_name_p1, full_name_p2)
-        h2h_str = f"{h2h['overall']['p1_wins']} - {h2h['overall']['p2_wins']}"
-        
-        elo_model_for_prediction = elo_models[circuit]
-        feature_vector = create_feature_vector(full_name_p1, full_name_p2, surface, elo_model_for_prediction, h2h)
-        
-        prediction = ml_models[circuit].predict_proba([feature_vector])
-        prob_p1_wins = prediction[0][1]
-        
-        results_data.append([circuit.upper(), full_name_p1, full_name_p2, surface, h2h_str, f"{prob_p1_wins:.2%}"])
+    predictions = predict_upcoming_matches(upcoming_matches_df, ml_models, elo_models, known_players_map)
+    results_data = prediction_rows(predictions)
 
     print("\n--- ANÁLISE DOS PRÓXIMOS JOGOS (MODELO MACHINE LEARNING) ---")
     if not results_data:
         print("Nenhuma partida com dados completos foi encontrada para hoje.")
     else:
-        print(tabulate(results_data, headers=headers, tablefmt="grid"))
+        print(tabulate(results_data, headers=PREDICTION_HEADERS, tablefmt="grid"))
         print("\nCompare a probabilidade final (Prob. P1) com as odds do mercado para o Jogador 1!")
+    return predictions
+
+def is_data_fresh(config) -> bool:
+    """Indica se a última sincronização bem-sucedida está dentro da janela de frescor do config.ini."""
+    from src.data_handler import get_last_sync_time
+    last_sync = get_last_sync_time()
+    freshness = timedelta(hours=config.getfloat('DataSource', 'freshness_hours', fallback=12))
+    return last_sync is not None and datetime.now() - last_sync < freshness
+
+def cmd_sync(config, args):
+    sync_data(config)
+
+def cmd_train(config, args):
+    if args.force:
+        logger.info("Opção '--force' detectada. Todos os modelos serão treinados do zero.")
+        remove_model_files(config, get_circuits(config))
+    if not args.no_sync:
+        sync_data(config)
+    load_models(config, get_circuits(config), max_workers=args.workers or pipeline_workers(config), update=True)
+
+def cmd_predict(config, args):
+    start = time.perf_counter()
+    if args.sync or (not args.no_sync and not is_data_fresh(config)):
+        sync_data(config)
+    else:
+        logger.info("Base de dados dentro da janela de frescor; sincronização ignorada.")
+    # Com todos os bundles prontos, carregar no próprio processo é mais rápido que abrir processos
+    circuits = get_circuits(config)
+    needs_training = any(not os.path.exists(circuit_filename(config, 'bundle_filename', circuit)) for circuit in circuits)
+    analyze_upcoming_matches(*load_models(config, circuits, max_workers=pipeline_workers(config) if needs_training else 1))
+
+    elapsed = time.perf_counter() - start
+    target = config.getfloat('CLI', 'predict_target_seconds', fallback=2.0)
+    print(f"\nTempo total do predict: {elapsed:.2f}s (meta: {target:.2f}s).")
+    if elapsed > target:
+        print("Aviso: o predict excedeu a meta de tempo configurada em [CLI] predict_target_seconds.")
+
+def cmd_status(config, args):
+    from src.data_handler import get_last_sync_time, get_table_summary
+    print("--- STATUS DO 777stats ---")
+    last_sync = get_last_sync_time()
+    fresh = "dentro" if is_data_fresh(config) else "fora"
+    print(f"Última sincronização: {last_sync:%Y-%m-%d %H:%M:%S} ({fresh} da janela de frescor)" if last_sync else "Última sincronização: nunca")
+    for circuit in get_circuits(config):
+        summary = get_table_summary(circuit)
+        print(f"\n[{circuit.upper()}] partidas: {summary['rows']} | última partida: {summary['last_date'] or '-'}")
+        for key in MODEL_FILE_DEFAULTS:
+            fname = circuit_filename(config, key, circuit)
+            if os.path.exists(fname):
+                modified = datetime.fromtimestamp(os.path.getmtime(fname))
+                print(f"  {fname}: atualizado em {modified:%Y-%m-%d %H:%M:%S}")
+            else:
+                print(f"  {fname}: ausente")
+
+def cmd_serve(config, args):
+    from src.server import serve
+    serve(
+        {circuit: circuit_filename(config, 'bundle_filename', circuit) for circuit in get_circuits(config)},
+        host=args.host or config.get('Server', 'host', fallback='127.0.0.1'),
+        port=args.port or config.getint('Server', 'port', fallback=8777),
+        reload_interval=config.getfloat('Server', 'reload_interval_seconds', fallback=2.0),
+        db_connections=config.getint('Server', 'db_connections', fallback=4),
+    )
+
+def cmd_backtest(config, args):
+    import json
+    from src.backtest import build_backtest_dataset, format_report, run_backtest
+    from src.data_handler import load_all_data_from_db
+    elo_params = elo_params_from_config(config)
+    datasets = {}
+    for circuit in get_circuits(config):
+        historical_data = load_all_data_from_db(circuit)
+        if historical_data.empty:
+            logger.info(f"Nenhum dado histórico da {circuit.upper()} para o backtest.")
+            continue
+        logger.info(f"Calculando features ponto a ponto ({circuit.upper()}) para {len(historical_data)} partidas...")
+        datasets[circuit] = build_backtest_dataset(historical_data, **elo_params)
+    if not datasets:
+        return
+
+    max_workers = args.workers or config.getint('Backtest', 'max_workers', fallback=0) or None
+    report = run_backtest(
+        datasets,
+        min_train_seasons=args.min_train_seasons or config.getint('Backtest', 'min_train_seasons', fallback=3),
+        train_window=config.getint('Backtest', 'train_window_seasons', fallback=0) or None,
+        max_workers=max_workers,
+        bins=config.getint('Backtest', 'calibration_bins', fallback=10),
+    )
+    print(format_report(report))
+
+    output_file = args.output or config.get('Backtest', 'output_file', fallback=os.path.join('data', 'backtest.json'))
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nRelatório completo (com curvas de calibração por superfície) salvo em '{output_file}'.")
+
+def cmd_sweep(config, args):
+    from src.data_handler import load_all_data_from_db
+    from src.elo_sweep import sweep_elo, write_elo_params_to_config
+    from tabulate import tabulate
+    k_factors = args.k or [float(k) for k in config.get('Sweep', 'k_factors', fallback='16,24,32,48,64').split(',')]
+    months = args.months or [int(m) for m in config.get('Sweep', 'recent_form_months', fallback='3,6,12').split(',')]
+    base_rating = elo_params_from_config(config)['base_rating']
+    burn_in_months = config.getint('Sweep', 'burn_in_months', fallback=12)
+
+    totals = None
+    for circuit in get_circuits(config):
+        historical_data = load_all_data_from_db(circuit)
+        if historical_data.empty:
+            logger.info(f"Nenhum dado histórico da {circuit.upper()} para a varredura.")
+            continue
+        logger.info(f"Avaliando {len(k_factors) * len(months)} configurações do Elo ({circuit.upper()}) em {len(historical_data)} partidas...")
+        results = sweep_elo(historical_data, k_factors, months, base_rating=base_rating, burn_in_months=burn_in_months)
+        rows = [[f"{row.k_factor:g}", row.recent_form_months, f"{row.log_loss:.4f}", f"{row.log_loss_geral:.4f}",
+                 f"{row.log_loss_recente:.4f}", f"{row.accuracy:.2%}"] for row in results.head(args.top).itertuples()]
+        print(f"\n--- VARREDURA ELO {circuit.upper()} ({results['matches'].iat[0]} partidas avaliadas) ---")
+        print(tabulate(rows, headers=["K", "Meses", "Log-loss", "Log-loss Geral", "Log-loss Recente", "Acurácia"], tablefmt="grid"))
+
+        # Melhor configuração conjunta: menor log-loss total (ponderado pelo número de partidas de cada circuito)
+        weighted = results.set_index(['k_factor', 'recent_form_months'])['log_loss'] * results['matches'].iat[0]
+        totals = weighted if totals is None else totals + weighted
+    if totals is None:
+        return
+
+    best_k, best_months = totals.idxmin()
+    print(f"\nMelhor configuração (todos os circuitos): k_factor = {best_k:g}, recent_form_months = {best_months}")
+    if args.write_config:
+        write_elo_params_to_config('config.ini', best_k, best_months)
+        print("Parâmetros gravados em [Model] no config.ini. Os modelos de ML foram treinados com os parâmetros anteriores "
+              "e serão treinados de novo na próxima execução (ou rode 'python main.py train --force' agora).")
+
+def cmd_simulate(config, args):
+    import pandas as pd
+    from tabulate import tabulate
+    from src.draw_simulator import BYE, draws_from_upcoming, simulate_tournament
+    from src.elo_model import SURFACES
+    from src.utils import get_surface_from_tournament
+    iterations = args.iterations or config.getint('Simulation', 'iterations', fallback=100000)
+    model = (args.model or config.get('Simulation', 'model', fallback='elo')).lower()
+
+    if args.players:
+        circuit = (args.circuit or get_circuits(config)[0]).lower()
+        tournament = args.tournament or "Chave informada"
+        draws = {(circuit, tournament): (args.players, get_surface_from_tournament(tournament))}
+    else:
+        try:
+            upcoming_matches_df = pd.read_csv("upcoming_matches.csv")
+        except FileNotFoundError:
+            print("\nArquivo 'upcoming_matches.csv' não encontrado. Informe a chave com --players ou execute 'scrape_matches.py'.")
+            return
+        draws = {
+            (circuit, tournament): draw for (circuit, tournament), draw in draws_from_upcoming(upcoming_matches_df).items()
+            if (not args.circuit or circuit == args.circuit.lower()) and (not args.tournament or args.tournament.lower() in str(tournament).lower())
+        }
+    if not draws:
+        print("\nNenhuma chave encontrada para simular.")
+        return
+
+    ml_models, elo_models, resolvers = load_models(config, sorted({circuit for circuit, _ in draws}))
+    for (circuit, tournament), (players, surface) in draws.items():
+        surface = args.surface or surface
+        if circuit not in elo_models or (model == 'ml' and ml_models.get(circuit) is None):
+            print(f"\n{circuit.upper()} - {tournament}: sem modelo treinado para o circuito.")
+            continue
+        if surface not in SURFACES:
+            print(f"\n{circuit.upper()} - {tournament}: superfície desconhecida (use --surface).")
+            continue
+        resolved = [player if player == BYE else resolvers[circuit].resolve(player) for player in players]
+        unresolved = [player for player, name in zip(players, resolved) if name is None]
+        if unresolved:
+            logger.warning(f"{len(unresolved)} jogadores sem histórico em {tournament} (rating inicial): {', '.join(unresolved)}")
+        draw = [name or player for player, name in zip(players, resolved)]
+
+        results = simulate_tournament(draw, surface, elo_models[circuit], ml_models[circuit] if model == 'ml' else None,
+                                      circuit, iterations=iterations, seed=args.seed)
+        # A primeira rodada (100% para todos) não é exibida
+        rounds = list(results.columns[2:])
+        rows = [[row[0]] + [f"{value:.1%}" for value in row[2:]] for row in results.head(args.top).itertuples(index=False)]
+        print(f"\n--- {circuit.upper()} - {tournament} ({surface}, {len(draw)} vagas, {iterations} simulações, modelo {model.upper()}) ---")
+        print(tabulate(rows, headers=["Jogador"] + rounds, tablefmt="grid"))
+
+def cmd_rating(config, args):
+    from tabulate import tabulate
+    from src.data_handler import rating_history_path
+    from src.elo_model import SURFACES
+    from src.rating_history import RatingHistory
+    from src.utils import PlayerNameResolver
+    circuit = (args.circuit or get_circuits(config)[0]).lower()
+    path = rating_history_path(circuit)
+    if not os.path.exists(path):
+        print(f"\nHistórico de ratings ({circuit.upper()}) não encontrado. Rode 'python main.py train' primeiro.")
+        return
+    with metrics.span('rating.load_history'):
+        history = RatingHistory.load(path)
+    player = PlayerNameResolver(history.player_names).resolve(args.player)
+    if player is None:
+        print(f"\nJogador '{args.player}' não encontrado no histórico da {circuit.upper()}.")
+        return
+
+    surfaces = [args.surface] if args.surface else list(SURFACES)
+    if args.trajectory:
+        for surface in surfaces:
+            trajectory = history.trajectory(player, surface).tail(args.top)
+            rows = [[f"{row.date:%Y-%m-%d}", f"{row.elo_geral:.1f}", f"{row.forma:+.1f}"] for row in trajectory.itertuples()]
+            print(f"\n--- {player} ({circuit.upper()}, {surface}): últimas {len(rows)} partidas ---")
+            print(tabulate(rows, headers=["Data", "Elo Geral", "Desvio de forma"], tablefmt="grid"))
+        return
+
+    date = args.date or datetime.now().strftime('%Y-%m-%d')
+    general = history.ratings_as_of([player] * len(surfaces), surfaces, [date] * len(surfaces))
+    recent = history.ratings_as_of([player] * len(surfaces), surfaces, [date] * len(surfaces), recent=True)
+    rows = [[surface, f"{g:.1f}", f"{r:.1f}"] for surface, g, r in zip(surfaces, general, recent)]
+    print(f"\n--- {player} ({circuit.upper()}): Elo antes de {date} ---")
+    print(tabulate(rows, headers=["Superfície", "Elo Geral", "Elo Recente"], tablefmt="grid"))
+
+def run_full_pipeline(config, retrain=False):
+    """Fluxo completo original: sincroniza, carrega/treina os modelos e analisa os jogos do dia."""
+    logger.info("--- INICIANDO SISTEMA DE ANÁLISE DE TÊNIS 777stats ---")
+    if retrain:
+        logger.info("Flag '--retrain' detectada. Todos os modelos serão treinados do zero.")
+        remove_model_files(config, get_circuits(config))
+
+    sync_data(config)
+    analyze_upcoming_matches(*load_models(config, get_circuits(config), max_workers=pipeline_workers(config), update=True))
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='main.py', description="777stats - análise de partidas de tênis (ATP/WTA).")
+    parser.add_argument('--retrain', action='store_true', help="Sem subcomando: treina todos os modelos do zero antes da análise.")
+    parser.add_argument('--metrics', action='store_true', help="Grava tempos por etapa e contadores (ver [Metrics] no config.ini).")
+    parser.add_argument('--profile', metavar='ETAPAS', help="Etapas a perfilar com cProfile, separadas por vírgula (ex.: elo.train_general).")
+    subparsers = parser.add_subparsers(dest='command')
+
+    subparsers.add_parser('sync', help="Sincroniza o banco de dados com os CSVs de partidas.")
+
+    train_parser = subparsers.add_parser('train', help="Treina os modelos que ainda não existem e atualiza os existentes com as partidas novas.")
+    train_parser.add_argument('--force', action='store_true', help="Remove os modelos salvos e treina do zero.")
+    train_parser.add_argument('--no-sync', action='store_true', help="Não sincroniza o banco antes de treinar.")
+    train_parser.add_argument('--workers', type=int, help="Processos para preparar os circuitos em paralelo (padrão: [Pipeline] max_workers).")
+
+    predict_parser = subparsers.add_parser('predict', help="Analisa os jogos de upcoming_matches.csv.")
+    sync_group = predict_parser.add_mutually_exclusive_group()
+    sync_group.add_argument('--sync', action='store_true', help="Sincroniza mesmo com a base dentro da janela de frescor.")
+    sync_group.add_argument('--no-sync', action='store_true', help="Nunca sincroniza antes de analisar.")
+
+    subparsers.add_parser('status', help="Mostra o estado do banco, dos modelos e da última sincronização.")
+
+    serve_parser = subparsers.add_parser('serve', help="Servidor HTTP local com o dashboard e a API de previsões.")
+    serve_parser.add_argument('--host', help="Endereço de escuta (padrão: [Server] host).")
+    serve_parser.add_argument('--port', type=int, help="Porta de escuta (padrão: [Server] port).")
+
+    backtest_parser = subparsers.add_parser('backtest', help="Avaliação walk-forward dos modelos por temporada.")
+    backtest_parser.add_argument('--min-train-seasons', type=int, help="Temporadas mínimas de treino antes do primeiro teste.")
+    backtest_parser.add_argument('--workers', type=int, help="Número de processos (padrão: [Backtest] max_workers ou todos os núcleos).")
+    backtest_parser.add_argument('--output', help="Arquivo JSON do relatório (padrão: [Backtest] output_file).")
+
+    sweep_parser = subparsers.add_parser('sweep', help="Avalia várias combinações de parâmetros do Elo em uma única passada.")
+    sweep_parser.add_argument('--k', type=float, nargs='+', help="Valores de k_factor (padrão: [Sweep] k_factors).")
+    sweep_parser.add_argument('--months', type=int, nargs='+', help="Constantes de decaimento da Forma Recente em meses (padrão: [Sweep] recent_form_months).")
+    sweep_parser.add_argument('--top', type=int, default=10, help="Número de configurações exibidas por circuito.")
+    sweep_parser.add_argument('--write-config', action='store_true', help="Grava a melhor configuração em [Model] no config.ini.")
+
+    simulate_parser = subparsers.add_parser('simulate', help="Simula chaves de torneio: chance de cada jogador chegar a cada rodada.")
+    simulate_parser.add_argument('--players', nargs='+', metavar='JOGADOR', help="Jogadores na ordem da chave (BYE para vaga vazia). Padrão: torneios de upcoming_matches.csv.")
+    simulate_parser.add_argument('--tournament', help="Nome do torneio (filtra upcoming_matches.csv; com --players, define a superfície).")
+    simulate_parser.add_argument('--circuit', help="Circuito (atp/wta).")
+    simulate_parser.add_argument('--surface', choices=['Hard', 'Clay', 'Grass'], help="Superfície (padrão: a do torneio).")
+    simulate_parser.add_argument('--model', choices=['elo', 'ml'], help="Probabilidades pelo Elo da superfície ou pelo modelo de ML (padrão: [Simulation] model).")
+    simulate_parser.add_argument('--iterations', type=int, help="Número de simulações (padrão: [Simulation] iterations).")
+    simulate_parser.add_argument('--seed', type=int, help="Semente do sorteio, para resultados reprodutíveis.")
+    simulate_parser.add_argument('--top', type=int, default=16, help="Número de jogadores exibidos por torneio.")
+
+    rating_parser = subparsers.add_parser('rating', help="Elo de um jogador antes de uma data (consulta ao histórico de ratings).")
+    rating_parser.add_argument('player', help="Nome do jogador (completo ou no formato do site de jogos).")
+    rating_parser.add_argument('--date', help="Data (AAAA-MM-DD); considera as partidas anteriores a ela (padrão: hoje).")
+    rating_parser.add_argument('--surface', choices=['Hard', 'Clay', 'Grass'], help="Superfície (padrão: todas).")
+    rating_parser.add_argument('--circuit', help="Circuito (atp/wta).")
+    rating_parser.add_argument('--trajectory', action='store_true', help="Mostra a evolução do rating nas últimas partidas.")
+    rating_parser.add_argument('--top', type=int, default=20, help="Número de partidas exibidas com --trajectory.")
+    return parser
+
+def main(argv=None):
+    """Função principal: despacha para o subcomando escolhido (ou para o fluxo completo)."""
+    args = build_parser().parse_args(sys.argv[1:] if argv is None else argv)
+    config = load_config()
+    setup_instrumentation(config, args)
+    commands = {'sync': cmd_sync, 'train': cmd_train, 'predict': cmd_predict, 'status': cmd_status, 'serve': cmd_serve, 'backtest': cmd_backtest, 'sweep': cmd_sweep,
+                'simulate': cmd_simulate, 'rating': cmd_rating}
+    try:
+        with metrics.span(f"command.{args.command or 'full'}"):
+            if args.command is None:
+                run_full_pipeline(config, retrain=args.retrain)
+            else:
+                commands[args.command](config, args)
+    finally:
+        write_metrics(config)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
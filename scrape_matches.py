@@ -1,115 +1,59 @@
 # scrape_matches.py
+#
+#   python scrape_matches.py                      -> coleta a agenda (modo de [Scraper] fetch_mode)
+#   python scrape_matches.py --mode browser       -> força o uso do navegador (Selenium)
+#   python scrape_matches.py --from-file dia.html -> processa uma página salva, sem acessar a rede
 
-import pandas as pd
+import argparse
 import configparser
+import logging
+import sys
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup, NavigableString
-from src.utils import get_surface_from_tournament
+import pandas as pd
+from src.scraper import FETCH_MODES, SCHEDULE_COLUMNS, BrowserPool, parse_schedule_html, scrape_schedule
 
 OUTPUT_CSV = "upcoming_matches.csv"
 
+logger = logging.getLogger("scrape_matches")
+
 def load_config():
     """Carrega as configurações do arquivo config.ini."""
     config = configparser.ConfigParser()
     config.read('config.ini')
     return config
 
-def setup_driver():
-    """Configura e inicializa o driver do Selenium em modo headless e mais limpo."""
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("log-level=3")
-    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-    
-    service = ChromeService(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-    return driver
-
-def get_page_source(driver, url: str) -> str:
-    """Navega até a URL e espera inteligentemente até que um link de jogo agendado apareça."""
-    print(f"Acessando {url} e aguardando conteúdo...")
-    driver.get(url)
-    try:
-        # Espera até 15 segundos pela presença de um link com a classe 'sched'.
-        wait = WebDriverWait(driver, 15)
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'a.sched')))
-        print("Conteúdo carregado com sucesso.")
-        return driver.page_source
-    except Exception as e:
-        print(f"Erro ao esperar pelo conteúdo da página: {e}")
-        return ""
-
-def parse_source_to_dataframe(html_source: str) -> pd.DataFrame:
-    """Processa o código HTML e extrai os jogos para um DataFrame."""
-    if not html_source:
-        return pd.DataFrame()
-
-    soup = BeautifulSoup(html_source, 'lxml')
-    all_matches = []
-    
-    # Encontra todos os links '<a>' que marcam um jogo agendado ('scheduled')
-    scheduled_links = soup.select("a.sched")
-
-    for link in scheduled_links:
-        try:
-            # Pega o texto que vem imediatamente antes do link, que contém os jogadores
-            players_text = link.previous_sibling
-            if not isinstance(players_text, NavigableString) or ' - ' not in players_text:
-                continue
-            
-            player1, player2 = [p.strip() for p in players_text.split(' - ')]
-            
-            # Encontra o cabeçalho <h4> mais próximo que vem ANTES do link do jogo
-            header = link.find_previous('h4')
-            tournament_name = header.text.strip() if header else "Desconhecido"
-            
-            surface = get_surface_from_tournament(tournament_name)
-            circuit = 'wta' if "wta" in tournament_name.lower() else 'atp'
-
-            all_matches.append({
-                "Circuit": circuit.upper(),
-                "Player 1": player1,
-                "Player 2": player2,
-                "Tournament": tournament_name,
-                "Surface": surface
-            })
-        except (AttributeError, ValueError, IndexError):
-            continue
-            
-    return pd.DataFrame(all_matches)
-
-def main():
+def main(argv=None):
     """Função principal para orquestrar o scraping e salvar em CSV."""
     config = load_config()
-    schedule_url = config.get('Scraper', 'schedule_url')
-    
-    print("Iniciando o scraper de partidas (versão definitiva)...")
-    driver = setup_driver()
-    
-    try:
-        html = get_page_source(driver, schedule_url)
-        df = parse_source_to_dataframe(html)
-    finally:
-        driver.quit()
+    parser = argparse.ArgumentParser(description="Coleta os jogos do dia do flashscore.mobi.")
+    parser.add_argument('--mode', choices=FETCH_MODES, default=config.get('Scraper', 'fetch_mode', fallback='auto'),
+                        help="http: requisição simples; browser: Selenium; auto: HTTP com o navegador como alternativa.")
+    parser.add_argument('--from-file', nargs='+', metavar='HTML', help="Páginas salvas em disco a processar no lugar da coleta.")
+    parser.add_argument('--output', default=OUTPUT_CSV, help=f"Arquivo CSV de saída (padrão: {OUTPUT_CSV}).")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
+    start = time.perf_counter()
+    if args.from_file:
+        matches = []
+        for path in args.from_file:
+            with open(path, 'rb') as f:
+                matches.extend(parse_schedule_html(f.read()))
+    else:
+        # Uma ou mais URLs separadas por espaço ou vírgula (ex.: hoje e amanhã)
+        schedule_urls = config.get('Scraper', 'schedule_url').replace(',', ' ').split()
+        logger.info("Iniciando o scraper de partidas (modo %s)...", args.mode)
+        with BrowserPool(driver_path=config.get('Scraper', 'chromedriver_path', fallback='') or None) as browser:
+            matches = scrape_schedule(schedule_urls, mode=args.mode, browser=browser)
+    df = pd.DataFrame(matches, columns=SCHEDULE_COLUMNS)
 
     if df.empty:
-        print("Nenhuma partida agendada encontrada. O site pode estar sem jogos ou sua estrutura mudou.")
-        pd.DataFrame(columns=["Circuit", "Player 1", "Player 2", "Tournament", "Surface"]).to_csv(OUTPUT_CSV, index=False)
+        logger.info("Nenhuma partida agendada encontrada. O site pode estar sem jogos ou sua estrutura mudou.")
+        df.to_csv(args.output, index=False)
         return
 
-    df.to_csv(OUTPUT_CSV, index=False, encoding='utf-8-sig')
-    print(f"\nScraping concluído. {len(df)} partidas salvas em '{OUTPUT_CSV}'.")
+    df.to_csv(args.output, index=False, encoding='utf-8-sig')
+    logger.info("\nScraping concluído em %.2fs. %d partidas salvas em '%s'.", time.perf_counter() - start, len(df), args.output)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
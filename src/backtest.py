@@ -0,0 +1,149 @@
+# src/backtest.py
+#
+# Backtest walk-forward do MLModel: para cada temporada N+1, treina com as temporadas até N e
+# avalia as probabilidades na temporada N+1.
+#
+# As features ponto a ponto (Elo e H2H antes de cada partida) são calculadas uma única vez por
+# circuito, em uma passada cronológica, e compartilhadas por todos os folds: a matriz é gravada
+# em arquivos .npy que cada processo do pool abre mapeados em memória, sem recalcular o Elo.
+
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from src import metrics
+from src.evaluation import evaluate_predictions
+from src.feature_engineering import PointInTimeFeatureBuilder, randomize_orientation
+
+logger = logging.getLogger(__name__)
+
+ALL_SURFACES = 'Todas'
+
+def build_backtest_dataset(historical_data: pd.DataFrame, base_rating=1500, k_factor=32, recent_form_months=6, seed=42) -> dict:
+    """
+    Calcula as features ponto a ponto de todo o histórico (já em ordem cronológica) e retorna
+    {'X', 'y', 'season', 'surface'}, com a orientação das partidas sorteada como no treinamento.
+    """
+    builder = PointInTimeFeatureBuilder(base_rating=base_rating, k_factor=k_factor, recent_form_months=recent_form_months)
+    with metrics.span('backtest.features'):
+        X, y = randomize_orientation(builder.transform(historical_data), seed)
+    return {
+        'X': X,
+        'y': y,
+        'season': pd.to_datetime(historical_data['tourney_date']).dt.year.to_numpy(dtype=np.int32),
+        'surface': historical_data['surface'].astype(str).to_numpy(),
+    }
+
+def make_folds(seasons: np.ndarray, min_train_seasons=3, train_window=None) -> list:
+    """
+    Divide as temporadas em folds walk-forward: [(primeira temporada de treino, última de treino,
+    temporada de teste)]. Com `train_window`, o treino usa só as últimas `train_window` temporadas.
+    """
+    unique_seasons = np.unique(seasons).tolist()
+    folds = []
+    for position in range(min_train_seasons, len(unique_seasons)):
+        first = position - train_window if train_window else 0
+        folds.append((unique_seasons[max(first, 0)], unique_seasons[position - 1], unique_seasons[position]))
+    return folds
+
+# Arrays compartilhados em cada processo do pool: {circuito: (X, y, season)} mapeados em memória
+_WORKER_DATA = {}
+
+def _init_worker(paths: dict):
+    # Os folds não repetem no terminal as mensagens de progresso de cada treinamento
+    logging.getLogger('src.ml_model').setLevel(logging.WARNING)
+    for circuit, (x_path, y_path, season_path) in paths.items():
+        _WORKER_DATA[circuit] = tuple(np.load(path, mmap_mode='r') for path in (x_path, y_path, season_path))
+
+def _run_fold(circuit: str, fold: tuple):
+    """Treina um MLModel com as temporadas de treino do fold e prevê a temporada de teste."""
+    from src.ml_model import MLModel # Importação tardia: o sklearn é carregado só nos processos do pool
+    X, y, season = _WORKER_DATA[circuit]
+    first_season, last_season, test_season = fold
+    train = (season >= first_season) & (season <= last_season)
+    test_indices = np.flatnonzero(season == test_season)
+    if len(np.unique(y[train])) < 2:
+        return circuit, fold, test_indices, np.full(len(test_indices), 0.5)
+    ml_model = MLModel()
+    ml_model.train(X[train], y[train])
+    return circuit, fold, test_indices, ml_model.predict_proba(X[test_indices])[:, 1]
+
+def _elo_probabilities(X: np.ndarray) -> np.ndarray:
+    """Probabilidade do Elo Geral puro (linha de base), a partir da diferença de rating da feature 0."""
+    return 1 / (1 + 10 ** (-X[:, 0] / 400))
+
+def run_backtest(datasets: dict, min_train_seasons=3, train_window=None, max_workers=None, bins=10) -> dict:
+    """
+    Executa os folds de todos os circuitos em um pool de processos e agrega as métricas.
+
+    :param datasets: {circuito: dataset de `build_backtest_dataset`}.
+    :return: {circuito: {'folds': [...], 'by_surface': {superfície: métricas}}}.
+    """
+    folds_by_circuit = {circuit: make_folds(data['season'], min_train_seasons, train_window) for circuit, data in datasets.items()}
+    probabilities = {circuit: np.full(len(data['y']), np.nan) for circuit, data in datasets.items()}
+    fold_results = {circuit: [] for circuit in datasets}
+
+    with tempfile.TemporaryDirectory(prefix='777stats-backtest-') as shared_dir, metrics.span('backtest.folds'):
+        paths = {}
+        for circuit, data in datasets.items():
+            paths[circuit] = tuple(os.path.join(shared_dir, f"{circuit}_{name}.npy") for name in ('X', 'y', 'season'))
+            for path, name in zip(paths[circuit], ('X', 'y', 'season')):
+                np.save(path, data[name])
+
+        tasks = [(circuit, fold) for circuit, folds in folds_by_circuit.items() for fold in folds]
+        logger.info("Executando %d folds walk-forward em até %s processos...", len(tasks), max_workers or os.cpu_count())
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(paths,)) as executor:
+            futures = [executor.submit(_run_fold, circuit, fold) for circuit, fold in tasks]
+            for future in futures:
+                circuit, fold, test_indices, fold_probabilities = future.result()
+                probabilities[circuit][test_indices] = fold_probabilities
+                data = datasets[circuit]
+                fold_metrics = evaluate_predictions(data['y'][test_indices], fold_probabilities, bins)
+                fold_metrics.pop('calibration', None)
+                elo_metrics = evaluate_predictions(data['y'][test_indices], _elo_probabilities(data['X'][test_indices]), bins)
+                fold_results[circuit].append({
+                    'train_seasons': [fold[0], fold[1]], 'test_season': fold[2],
+                    'n_train': int(((data['season'] >= fold[0]) & (data['season'] <= fold[1])).sum()),
+                    **fold_metrics, 'elo_log_loss': elo_metrics.get('log_loss'),
+                })
+                metrics.increment('backtest_folds')
+
+    report = {}
+    for circuit, data in datasets.items():
+        tested = ~np.isnan(probabilities[circuit])
+        by_surface = {}
+        for surface in [ALL_SURFACES] + sorted(set(data['surface'][tested].tolist())):
+            mask = tested if surface == ALL_SURFACES else tested & (data['surface'] == surface)
+            by_surface[surface] = evaluate_predictions(data['y'][mask], probabilities[circuit][mask], bins)
+            by_surface[surface]['elo_log_loss'] = evaluate_predictions(data['y'][mask], _elo_probabilities(data['X'][mask]), bins).get('log_loss')
+        report[circuit] = {'folds': fold_results[circuit], 'by_surface': by_surface}
+    return report
+
+def format_report(report: dict) -> str:
+    """Tabelas de texto (por fold e por superfície) para exibir no terminal."""
+    from tabulate import tabulate
+    sections = []
+    for circuit, result in report.items():
+        fold_rows = [
+            [f"{fold['train_seasons'][0]}-{fold['train_seasons'][1]}", fold['test_season'], fold['n_train'], fold['n'],
+             f"{fold['log_loss']:.4f}", f"{fold['elo_log_loss']:.4f}", f"{fold['brier']:.4f}", f"{fold['accuracy']:.2%}"]
+            for fold in result['folds'] if fold['n']
+        ]
+        sections.append(f"--- BACKTEST {circuit.upper()}: FOLDS WALK-FORWARD ---\n" + tabulate(
+            fold_rows, headers=["Treino", "Teste", "N treino", "N teste", "Log-loss", "Log-loss Elo", "Brier", "Acurácia"], tablefmt="grid"))
+
+        surface_rows = [
+            [surface, values['n'], f"{values['log_loss']:.4f}", f"{values['elo_log_loss']:.4f}", f"{values['brier']:.4f}", f"{values['accuracy']:.2%}"]
+            for surface, values in result['by_surface'].items() if values['n']
+        ]
+        sections.append(f"--- BACKTEST {circuit.upper()}: POR SUPERFÍCIE ---\n" + tabulate(
+            surface_rows, headers=["Superfície", "N", "Log-loss", "Log-loss Elo", "Brier", "Acurácia"], tablefmt="grid"))
+
+        calibration = result['by_surface'].get(ALL_SURFACES, {}).get('calibration', [])
+        calibration_rows = [[row['bin'], row['n'], f"{row['mean_predicted']:.3f}", f"{row['observed']:.3f}"] for row in calibration]
+        sections.append(f"--- BACKTEST {circuit.upper()}: CALIBRAÇÃO ---\n" + tabulate(
+            calibration_rows, headers=["Faixa", "N", "Prob. média prevista", "Frequência observada"], tablefmt="grid"))
+    return "\n\n".join(sections)
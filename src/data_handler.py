@@ -1,49 +1,148 @@
 # src/data_handler.py
 
+import io
+import logging
 import os
+import numpy as np
 import pandas as pd
-import requests
 import sqlite3
+from datetime import datetime
+from pathlib import Path
 from dotenv import load_dotenv
+from src import metrics
+from src.match_history import MATCH_COLUMNS, MatchHistory
 
 load_dotenv()
 DATA_DIR = "data"
 DB_PATH = os.path.join(DATA_DIR, "777stats.db")
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
 
-def init_db():
-    """Inicializa o banco de dados e cria as tabelas para ATP e WTA se não existirem."""
+logger = logging.getLogger(__name__)
+
+# URL base dos CSVs de Jeff Sackmann (configurável em config.ini para testes com um servidor local)
+DEFAULT_BASE_URL = "https://raw.githubusercontent.com/JeffSackmann/tennis_{circuit}/master/"
+
+# Linhas lidas do SQLite por bloco ao gravar o snapshot (só um bloco de strings fica em memória)
+SNAPSHOT_READ_CHUNK = 50_000
+
+def init_db(circuits=('atp', 'wta')):
+    """Inicializa o banco de dados e cria as tabelas de cada circuito (padrão: ATP e WTA) se não existirem."""
     os.makedirs(DATA_DIR, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
+    # WAL: leitores (processos dos circuitos, servidor) não bloqueiam nem são bloqueados pela escrita
+    conn.execute("PRAGMA journal_mode = WAL")
     cursor = conn.cursor()
-    
-    # Cria tabela para o circuito ATP
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS atp_matches (
-            tourney_id TEXT, tourney_name TEXT, surface TEXT, tourney_date DATE,
-            winner_id INTEGER, winner_name TEXT, loser_id INTEGER, loser_name TEXT,
-            UNIQUE(tourney_id, tourney_date, winner_id, loser_id)
-        )
-    """)
-    
-    # Cria tabela para o circuito WTA
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS wta_matches (
-            tourney_id TEXT, tourney_name TEXT, surface TEXT, tourney_date DATE,
-            winner_id INTEGER, winner_name TEXT, loser_id INTEGER, loser_name TEXT,
-            UNIQUE(tourney_id, tourney_date, winner_id, loser_id)
-        )
-    """)
-    
+
+    # Cria uma tabela de partidas por circuito
+    for circuit in circuits:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {circuit}_matches (
+                tourney_id TEXT, tourney_name TEXT, surface TEXT, tourney_date DATE,
+                winner_id INTEGER, winner_name TEXT, loser_id INTEGER, loser_name TEXT,
+                UNIQUE(tourney_id, tourney_date, winner_id, loser_id)
+            )
+        """)
+
+    # Metadados da base (ex.: horário da última sincronização)
+    cursor.execute("CREATE TABLE IF NOT EXISTS sync_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    # Cria as tabelas de resumo de confrontos diretos (H2H), uma linha por par ordenado de jogadores
+    for circuit in circuits:
+        h2h_table = f"{circuit}_h2h"
+        exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (h2h_table,)).fetchone()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {h2h_table} (
+                player_a TEXT, player_b TEXT,
+                a_wins INTEGER DEFAULT 0, b_wins INTEGER DEFAULT 0,
+                a_wins_hard INTEGER DEFAULT 0, b_wins_hard INTEGER DEFAULT 0,
+                a_wins_clay INTEGER DEFAULT 0, b_wins_clay INTEGER DEFAULT 0,
+                a_wins_grass INTEGER DEFAULT 0, b_wins_grass INTEGER DEFAULT 0,
+                PRIMARY KEY (player_a, player_b)
+            ) WITHOUT ROWID
+        """)
+        if not exists:
+            # Banco já existente: materializa o H2H a partir de todas as partidas salvas
+            update_h2h_index(circuit, conn, after_rowid=0)
+
     conn.commit()
     conn.close()
 
+def connect_read_only(db_path: str = DB_PATH, **kwargs):
+    """
+    Abre o banco somente para leitura (URI com mode=ro). Usada pelas consultas, que podem rodar em
+    vários processos ao mesmo tempo enquanto apenas a sincronização escreve.
+    """
+    return sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True, **kwargs)
+
+def update_h2h_index(circuit: str, conn, after_rowid: int):
+    """
+    Soma ao resumo de H2H as partidas com rowid maior que `after_rowid`.
+    Não faz commit: deve rodar na mesma transação que inseriu as partidas.
+    """
+    table_name = f"{circuit}_matches"
+    h2h_table = f"{circuit}_h2h"
+    conn.execute(f"""
+        INSERT INTO {h2h_table} (player_a, player_b, a_wins, b_wins, a_wins_hard, b_wins_hard,
+                                 a_wins_clay, b_wins_clay, a_wins_grass, b_wins_grass)
+        SELECT MIN(winner_name, loser_name), MAX(winner_name, loser_name),
+               SUM(winner_name < loser_name), SUM(winner_name > loser_name),
+               SUM(winner_name < loser_name AND surface = 'Hard'), SUM(winner_name > loser_name AND surface = 'Hard'),
+               SUM(winner_name < loser_name AND surface = 'Clay'), SUM(winner_name > loser_name AND surface = 'Clay'),
+               SUM(winner_name < loser_name AND surface = 'Grass'), SUM(winner_name > loser_name AND surface = 'Grass')
+        FROM {table_name}
+        WHERE rowid > ?
+        GROUP BY 1, 2
+        ON CONFLICT (player_a, player_b) DO UPDATE SET
+            a_wins = a_wins + excluded.a_wins, b_wins = b_wins + excluded.b_wins,
+            a_wins_hard = a_wins_hard + excluded.a_wins_hard, b_wins_hard = b_wins_hard + excluded.b_wins_hard,
+            a_wins_clay = a_wins_clay + excluded.a_wins_clay, b_wins_clay = b_wins_clay + excluded.b_wins_clay,
+            a_wins_grass = a_wins_grass + excluded.a_wins_grass, b_wins_grass = b_wins_grass + excluded.b_wins_grass
+    """, (after_rowid,))
+
+def set_last_sync_time(when: datetime = None):
+    """Registra o horário da última sincronização concluída."""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        conn.execute("INSERT OR REPLACE INTO sync_meta (key, value) VALUES ('last_sync', ?)", ((when or datetime.now()).isoformat(),))
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_last_sync_time():
+    """Retorna o horário da última sincronização concluída, ou None se nunca houve uma."""
+    if not os.path.exists(DB_PATH):
+        return None
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute("SELECT value FROM sync_meta WHERE key = 'last_sync'").fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+def get_table_summary(circuit: str) -> dict:
+    """Resumo rápido da tabela de um circuito: número de partidas e data da mais recente."""
+    summary = {'rows': 0, 'last_date': None}
+    if not os.path.exists(DB_PATH):
+        return summary
+    conn = connect_read_only()
+    try:
+        rows, last_date = conn.execute(f"SELECT COUNT(*), MAX(tourney_date) FROM {circuit}_matches").fetchone()
+        summary.update(rows=rows, last_date=last_date)
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        conn.close()
+    return summary
+
 def get_last_year_in_db(circuit: str):
     """Consulta o banco para encontrar o último ano com dados salvos para um circuito."""
     if not os.path.exists(DB_PATH):
         return None
     
     table_name = f"{circuit}_matches"
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_read_only()
     try:
         query = f"SELECT MAX(strftime('%Y', tourney_date)) as last_year FROM {table_name}"
         df = pd.read_sql_query(query, conn)
@@ -54,51 +153,216 @@ def get_last_year_in_db(circuit: str):
     finally:
         conn.close()
 
-def download_and_insert_data(year: int, circuit: str, conn):
-    """Baixa os dados de um ano para um circuito e insere no banco de dados."""
-    base_url = f"https://raw.githubusercontent.com/JeffSackmann/tennis_{circuit}/master/"
-    file_name = f"{circuit}_matches_{year}.csv"
-    file_url = f"{base_url}{file_name}"
+def configure_connection(conn):
+    """Ajusta a conexão para escrita em lote: WAL, fsync reduzido e tabelas temporárias em memória."""
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -65536")
+
+def parse_matches_csv(source) -> pd.DataFrame:
+    """Lê um CSV no formato de Jeff Sackmann (bytes ou caminho) e mantém apenas as colunas do banco."""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    df = pd.read_csv(source, encoding='utf-8', usecols=MATCH_COLUMNS, dtype={'tourney_id': str, 'tourney_date': str})
+    df = df[MATCH_COLUMNS]
+    df['tourney_date'] = pd.to_datetime(df['tourney_date'], format='%Y%m%d').dt.strftime('%Y-%m-%d')
+    df.dropna(subset=['winner_name', 'loser_name', 'surface'], inplace=True)
+    return df
+
+def insert_matches(circuit: str, df: pd.DataFrame, conn) -> dict:
+    """
+    Insere as partidas com um único `executemany` em uma transação e atualiza o H2H.
+    Retorna quantas linhas foram inseridas e quantas foram ignoradas (já existentes).
+    """
     table_name = f"{circuit}_matches"
-    
-    print(f"Verificando dados de {year} para o circuito {circuit.upper()}...")
+    rows = df.astype(object).where(df.notna(), None).to_numpy().tolist()
     try:
-        response = requests.get(file_url)
-        response.raise_for_status()
-        
-        df = pd.read_csv(file_url, encoding='utf-8')
-        columns_to_keep = ['tourney_id', 'tourney_name', 'surface', 'tourney_date', 'winner_id', 'winner_name', 'loser_id', 'loser_name']
-        df = df[columns_to_keep]
-        df['tourney_date'] = pd.to_datetime(df['tourney_date'], format='%Y%m%d').dt.strftime('%Y-%m-%d')
-        df.dropna(subset=['winner_name', 'loser_name', 'surface'], inplace=True)
-        
-        cursor = conn.cursor()
-        for index, row in df.iterrows():
-            cursor.execute(f"""
-                INSERT OR IGNORE INTO {table_name} (tourney_id, tourney_name, surface, tourney_date, winner_id, winner_name, loser_id, loser_name)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, tuple(row))
+        last_rowid = conn.execute(f"SELECT IFNULL(MAX(rowid), 0) FROM {table_name}").fetchone()[0]
+        changes_before = conn.total_changes
+        conn.executemany(f"""
+            INSERT OR IGNORE INTO {table_name} (tourney_id, tourney_name, surface, tourney_date, winner_id, winner_name, loser_id, loser_name)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        inserted = conn.total_changes - changes_before
+        if inserted:
+            with metrics.span('data.update_h2h'):
+                update_h2h_index(circuit, conn, last_rowid)
         conn.commit()
-        print(f"Dados de {year} ({circuit.upper()}) sincronizados com o banco.")
+    except Exception:
+        # Desfaz inserções parciais para que partidas e H2H continuem consistentes
+        conn.rollback()
+        raise
+    metrics.increment('rows_received', len(rows))
+    metrics.increment('rows_inserted', inserted)
+    metrics.increment('rows_ignored', len(rows) - inserted)
+    return {'inserted': inserted, 'ignored': len(rows) - inserted}
+
+def ingest_csv_file(path: str, circuit: str, conn) -> dict:
+    """Insere um CSV local (ex.: fixtures de teste) pelo mesmo caminho de ingestão em lote."""
+    return insert_matches(circuit, parse_matches_csv(path), conn)
+
+def download_and_insert_data(year: int, circuit: str, conn, base_url: str = DEFAULT_BASE_URL):
+    """
+    Baixa os dados de um ano para um circuito e insere no banco de dados.
+    Retorna as contagens de linhas inseridas/ignoradas, ou None se o arquivo não pôde ser processado.
+    """
+    file_name = f"{circuit}_matches_{year}.csv"
+    file_url = f"{base_url.format(circuit=circuit)}{file_name}"
+
+    import requests # Importação tardia: o cliente HTTP só é necessário ao baixar dados
+
+    logger.info("Verificando dados de %s para o circuito %s...", year, circuit.upper())
+    try:
+        with metrics.span('sync.download'):
+            response = requests.get(file_url)
+            response.raise_for_status()
+        metrics.increment('files_downloaded')
+        metrics.increment('bytes_downloaded', len(response.content))
+
+        # O corpo já baixado é processado uma única vez, sem um segundo download pelo pandas
+        with metrics.span('sync.insert'):
+            counts = insert_matches(circuit, parse_matches_csv(response.content), conn)
+        logger.info("Dados de %s (%s) sincronizados com o banco: %d partidas inseridas, %d ignoradas.",
+                    year, circuit.upper(), counts['inserted'], counts['ignored'])
+        return counts
 
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
-            print(f"Dados para o ano {year} ({circuit.upper()}) ainda não disponíveis (404 Not Found).")
+            logger.info("Dados para o ano %s (%s) ainda não disponíveis (404 Not Found).", year, circuit.upper())
         else:
-            print(f"Erro HTTP ao baixar dados de {year} ({circuit.upper()}): {e}")
+            logger.error("Erro HTTP ao baixar dados de %s (%s): %s", year, circuit.upper(), e)
     except Exception as e:
-        print(f"Erro inesperado ao processar dados de {year} ({circuit.upper()}): {e}")
+        logger.error("Erro inesperado ao processar dados de %s (%s): %s", year, circuit.upper(), e)
+    return None
+
+def _table_version(conn, table_name: str) -> tuple:
+    """Carimbo de versão da tabela: (número de linhas, maior rowid). Muda a cada inserção."""
+    count, max_rowid = conn.execute(f"SELECT COUNT(*), IFNULL(MAX(rowid), 0) FROM {table_name}").fetchone()
+    return int(count), int(max_rowid)
+
+def _snapshot_path(circuit: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{circuit}_matches.npz")
+
+def rating_history_path(circuit: str) -> str:
+    """Arquivo do histórico de ratings (`RatingHistory`) do circuito, gravado ao lado do banco."""
+    return os.path.join(DATA_DIR, f"{circuit}_rating_history.npz")
+
+def write_snapshot(circuit: str) -> bool:
+    """
+    Grava um snapshot colunar (`MatchHistory`) da tabela do circuito, já ordenado por data: nomes
+    de jogadores e torneios codificados em dicionário, ids em int32, datas como número de dias
+    (int32) e a superfície como enum int8. Retorna False se a tabela estiver vazia ou não existir.
+    """
+    with metrics.span('data.write_snapshot'):
+        return _write_snapshot(circuit)
+
+def _write_snapshot(circuit: str) -> bool:
+    if not os.path.exists(DB_PATH):
+        return False
+
+    table_name = f"{circuit}_matches"
+    conn = connect_read_only()
+    try:
+        # Versão e conteúdo lidos na mesma transação de leitura
+        conn.execute("BEGIN")
+        version = _table_version(conn, table_name)
+        chunks = pd.read_sql_query(f"SELECT {', '.join(MATCH_COLUMNS)} FROM {table_name} ORDER BY tourney_date, rowid",
+                                   conn, chunksize=SNAPSHOT_READ_CHUNK)
+        history = MatchHistory.from_chunks(chunks)
+    except (sqlite3.OperationalError, pd.errors.DatabaseError):
+        return False
+    finally:
+        conn.close()
+    if history.empty:
+        return False
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = _snapshot_path(circuit)
+    temp_path = f"{path}.tmp.npz"
+    history.save(temp_path, version=np.array(version, dtype=np.int64))
+    os.replace(temp_path, path)
+    return True
+
+def _table_version_from_db(circuit: str):
+    """Carimbo de versão atual da tabela do circuito (None se o banco ou a tabela não existirem)."""
+    if not os.path.exists(DB_PATH):
+        return None
+    conn = connect_read_only()
+    try:
+        return _table_version(conn, f"{circuit}_matches")
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+def load_match_history(circuit: str) -> MatchHistory:
+    """
+    Carrega o histórico compacto (`MatchHistory`) de um circuito, já ordenado por data.
+
+    A leitura é feita pelo snapshot colunar em `data/snapshots`, que é regravado sempre que o
+    carimbo de versão da tabela (número de linhas, maior rowid) não coincidir.
+    """
+    version = _table_version_from_db(circuit)
+    if not version or version[0] == 0:
+        return MatchHistory.empty_history()
+
+    with metrics.span('data.load_all'):
+        path = _snapshot_path(circuit)
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as snapshot:
+                up_to_date = tuple(snapshot['version'].tolist()) == version
+            if up_to_date:
+                return MatchHistory.load(path)
+        if not write_snapshot(circuit):
+            return MatchHistory.empty_history()
+        return MatchHistory.load(path)
 
 def load_all_data_from_db(circuit: str) -> pd.DataFrame:
-    """Carrega todos os dados históricos de um circuito a partir do banco de dados."""
+    """
+    Carrega todos os dados históricos de um circuito, já ordenados por data, como DataFrame
+    compacto (colunas categóricas, int32 e datetime64). Veja `load_match_history`.
+    """
+    return load_match_history(circuit).to_dataframe()
+
+def get_last_rowid(circuit: str) -> int:
+    """Retorna o maior rowid da tabela do circuito (0 se vazia), usado como checkpoint incremental."""
+    if not os.path.exists(DB_PATH):
+        return 0
+
+    table_name = f"{circuit}_matches"
+    conn = connect_read_only()
+    try:
+        last_rowid = conn.execute(f"SELECT MAX(rowid) FROM {table_name}").fetchone()[0]
+        return last_rowid or 0
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+def load_new_matches_from_db(circuit: str, after_rowid: int) -> pd.DataFrame:
+    """
+    Carrega apenas as partidas inseridas depois do checkpoint `after_rowid`, em ordem cronológica
+    (data e rowid, a mesma ordem do histórico completo). Aplicá-las sobre o estado salvo só equivale
+    a reprocessar tudo se nenhuma for anterior à data do checkpoint; veja `count_matches_before`.
+    """
     if not os.path.exists(DB_PATH):
         return pd.DataFrame()
-        
+
     table_name = f"{circuit}_matches"
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_read_only()
     try:
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-        df.sort_values(by='tourney_date', inplace=True)
-        return df
+        return pd.read_sql_query(f"SELECT * FROM {table_name} WHERE rowid > ? ORDER BY tourney_date, rowid", conn, params=(after_rowid,))
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+def count_matches_before(new_matches: pd.DataFrame, last_date) -> int:
+    """
+    Conta as partidas novas com data anterior a `last_date` (data do checkpoint). Elas seriam
+    aplicadas depois de partidas mais recentes (ex.: linhas antigas acrescentadas ao CSV do ano
+    corrente), então o estado incremental deixaria de coincidir com o do histórico completo.
+    Partidas na própria data do checkpoint não contam: no histórico completo elas também vêm depois.
+    """
+    if new_matches.empty or last_date is None:
+        return 0
+    return int((new_matches['tourney_date'] < last_date).sum())
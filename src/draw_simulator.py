@@ -0,0 +1,139 @@
+# src/draw_simulator.py
+#
+# Simulação Monte Carlo de chaves de torneio (mata-mata). A matriz de probabilidades de vitória
+# entre todos os pares de jogadores é calculada uma única vez para a superfície (pelo Elo ou pelo
+# modelo de ML); depois, todas as simulações avançam juntas, rodada a rodada: os confrontos de uma
+# rodada são pares de colunas de uma matriz (simulações x vagas) e os vencedores são sorteados de
+# uma vez com NumPy.
+
+import logging
+import numpy as np
+import pandas as pd
+from src import metrics
+from src.feature_engineering import create_feature_matrix
+from src.utils import get_h2h_records
+
+logger = logging.getLogger(__name__)
+
+# Vaga vazia na chave: o adversário avança sem jogar
+BYE = 'BYE'
+
+# Rótulos das rodadas a partir das oitavas (as anteriores seguem o padrão R<jogadores>, como nos CSVs)
+_LATE_ROUNDS = {8: 'QF', 4: 'SF', 2: 'F', 1: 'Título'}
+
+def round_labels(draw_size: int) -> list:
+    """Rodadas de uma chave de `draw_size` vagas, da primeira até o título (ex.: 128 -> R128, ..., F, Título)."""
+    labels = []
+    while draw_size >= 1:
+        labels.append(_LATE_ROUNDS.get(draw_size, f"R{draw_size}"))
+        draw_size //= 2
+    return labels
+
+def elo_probability_matrix(players: list, surface: str, elo_model, recent=False) -> np.ndarray:
+    """Matriz P[i, j] = probabilidade de `players[i]` vencer `players[j]` pelo Elo da superfície."""
+    ratings = elo_model.get_ratings(players, [surface] * len(players), recent=recent)
+    return 1 / (1 + 10 ** ((ratings[None, :] - ratings[:, None]) / 400))
+
+def ml_probability_matrix(players: list, surface: str, elo_model, predictor, circuit: str, conn=None) -> np.ndarray:
+    """
+    Matriz P[i, j] pelo modelo de ML (features de Elo e H2H de todos os pares, em um único lote).
+    Cada par é avaliado nas duas orientações e a média é usada, para que P[i, j] + P[j, i] = 1.
+    """
+    n = len(players)
+    first, second = np.nonzero(~np.eye(n, dtype=bool))
+    p1_names = [players[i] for i in first.tolist()]
+    p2_names = [players[j] for j in second.tolist()]
+    h2h_records = get_h2h_records(circuit, list(zip(p1_names, p2_names)), conn=conn)
+    X = create_feature_matrix(p1_names, p2_names, [surface] * len(p1_names), elo_model, h2h_records)
+    probabilities = np.full((n, n), 0.5)
+    probabilities[first, second] = predictor.predict_proba(X)[:, 1]
+    return (probabilities + 1 - probabilities.T) / 2
+
+def simulate_draw(slots, probabilities: np.ndarray, iterations=100_000, seed=None, batch_size=25_000) -> np.ndarray:
+    """
+    Simula a chave `iterations` vezes.
+
+    :param slots: Índice (em `probabilities`) do jogador de cada vaga, na ordem da chave; o número
+        de vagas deve ser uma potência de 2.
+    :param probabilities: Matriz P[i, j] de probabilidades de vitória de i sobre j.
+    :return: Matriz (jogadores x rodadas) com a probabilidade de cada jogador chegar a cada rodada
+        (a primeira coluna é a rodada inicial e a última, o título).
+    """
+    slots = np.asarray(slots, dtype=np.int32)
+    num_rounds = int(np.log2(len(slots)))
+    if len(slots) != 2 ** num_rounds:
+        raise ValueError(f"A chave precisa ter um número de vagas potência de 2 (recebidas {len(slots)}).")
+    num_players = len(probabilities)
+    reached = np.zeros((num_players, num_rounds + 1))
+    reached[:, 0] = np.bincount(slots, minlength=num_players) * iterations
+    rng = np.random.default_rng(seed)
+
+    with metrics.span('simulation.draw'):
+        for start in range(0, iterations, batch_size):
+            batch = min(batch_size, iterations - start)
+            alive = np.broadcast_to(slots, (batch, len(slots)))
+            for round_number in range(1, num_rounds + 1):
+                first, second = alive[:, 0::2], alive[:, 1::2]
+                first_wins = rng.random(first.shape, dtype=np.float32) < probabilities[first, second]
+                alive = np.where(first_wins, first, second)
+                reached[:, round_number] += np.bincount(alive.ravel(), minlength=num_players)
+    metrics.increment('simulated_draws', iterations)
+    return reached / iterations
+
+def simulate_tournament(draw: list, surface: str, elo_model, predictor=None, circuit: str = None,
+                        iterations=100_000, seed=None, conn=None) -> pd.DataFrame:
+    """
+    Probabilidade de cada jogador da chave chegar a cada rodada.
+
+    :param draw: Jogadores na ordem da chave (vencedor da vaga 1 x vaga 2 encontra o de 3 x 4, etc.);
+        `BYE` (ou None) marca vagas vazias. Chaves incompletas são completadas com BYEs até a próxima
+        potência de 2, mantendo os confrontos da primeira rodada.
+    :param predictor: Modelo de ML do circuito; sem ele, as probabilidades vêm do Elo da superfície.
+    :return: DataFrame com a coluna 'Jogador' e uma coluna por rodada, ordenado pela chance de título.
+    """
+    draw = [BYE if player is None else player for player in draw]
+    if len(draw) % 2:
+        draw.append(BYE)
+    num_matches = len(draw) // 2
+    size = 2 << max(num_matches - 1, 0).bit_length()
+    if size != len(draw):
+        # Os confrontos informados são espalhados pela chave, para que as vagas vazias não se
+        # concentrem em uma só metade
+        logger.warning("Chave com %d vagas completada com BYEs até %d vagas.", len(draw), size)
+        padded = [BYE] * size
+        for match, position in enumerate((np.arange(num_matches) * (size // 2) // num_matches).tolist()):
+            padded[2 * position:2 * position + 2] = draw[2 * match:2 * match + 2]
+        draw = padded
+
+    players = list(dict.fromkeys(player for player in draw if player != BYE))
+    if predictor is not None:
+        probabilities = ml_probability_matrix(players, surface, elo_model, predictor, circuit, conn=conn)
+    else:
+        probabilities = elo_probability_matrix(players, surface, elo_model)
+
+    # A última linha/coluna representa o BYE, que sempre perde
+    bye = len(players)
+    matrix = np.zeros((bye + 1, bye + 1))
+    matrix[:bye, :bye] = probabilities
+    matrix[:bye, bye] = 1.0
+    index = {player: position for position, player in enumerate(players)}
+    slots = [index.get(player, bye) for player in draw]
+
+    reached = simulate_draw(slots, matrix, iterations=iterations, seed=seed)[:bye]
+    results = pd.DataFrame(reached, columns=round_labels(size))
+    results.insert(0, 'Jogador', players)
+    return results.sort_values(list(results.columns[:0:-1]), ascending=False, kind='stable').reset_index(drop=True)
+
+def draws_from_upcoming(upcoming_matches: pd.DataFrame) -> dict:
+    """
+    Monta as chaves a partir de `upcoming_matches.csv`: os jogos de cada torneio, na ordem do
+    arquivo, formam a chave a partir da rodada atual. Retorna {(circuito, torneio): (jogadores, superfície)}.
+    """
+    draws = {}
+    columns = ['Circuit', 'Tournament', 'Player 1', 'Player 2', 'Surface']
+    for circuit, tournament, player1, player2, surface in zip(*(upcoming_matches[column].tolist() for column in columns)):
+        players, surfaces = draws.setdefault((str(circuit).lower(), tournament), ([], []))
+        players.extend([player1, player2])
+        surfaces.append(surface)
+    return {key: (players, next((surface for surface in surfaces if surface != 'Unknown'), 'Unknown'))
+            for key, (players, surfaces) in draws.items()}
@@ -1,88 +1,361 @@
 # src/elo_model.py
 
+import logging
 import math
+import pickle
+import numpy as np
 import pandas as pd
-from datetime import timedelta
+from src import metrics
+from src.form_store import PlayerFormStore
+from src.match_history import DEFAULT_CHUNK_SIZE, MatchHistory, latest_per_code
+
+# Superfícies com Elo próprio. Partidas em outras superfícies (ex.: Carpet) não alteram os ratings.
+SURFACES = ('Hard', 'Clay', 'Grass')
+SURFACE_CODES = {surface: code for code, surface in enumerate(SURFACES)}
+
+# Versão do formato de estado persistido (get_state/save)
+STATE_VERSION = 3
+
+logger = logging.getLogger(__name__)
+
+def encode_surfaces(surfaces) -> np.ndarray:
+    """Converte nomes de superfície em códigos inteiros (-1 para superfícies sem Elo)."""
+    # Fatoriza antes de mapear: só os valores distintos passam pelo dicionário (nulos viram -1)
+    if not isinstance(surfaces, (pd.Series, pd.Categorical, np.ndarray)):
+        surfaces = np.asarray(surfaces, dtype=object)
+    codes, uniques = pd.factorize(surfaces)
+    lookup = np.array([SURFACE_CODES.get(surface, -1) for surface in uniques] + [-1], dtype=np.int64)
+    return lookup[codes]
+
+def match_days(historical_data) -> np.ndarray:
+    """Datas das partidas como número de dias desde 1970-01-01 (sem alterar o DataFrame recebido)."""
+    if isinstance(historical_data, MatchHistory):
+        return historical_data.days.astype(np.int64)
+    return pd.to_datetime(historical_data['tourney_date']).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+def _to_day(date) -> int:
+    return int(np.datetime64(pd.Timestamp(date).date(), 'D').astype(np.int64))
+
+def _run_elo_updates(ratings: np.ndarray, form: np.ndarray, form_day: np.ndarray, surface_codes: np.ndarray, winner_idx: np.ndarray,
+                     loser_idx: np.ndarray, days: np.ndarray, k_factor: float, decay_days: float, diffs: list = None,
+                     history: list = None):
+    """
+    Núcleo sequencial do Elo. Percorre arrays simples de inteiros e floats (sem linhas do pandas)
+    e grava o resultado de volta nas matrizes (superfície x jogador).
+
+    Na mesma passada atualiza a Forma Recente, guardada como um desvio (`form`) em relação ao Elo
+    Geral: antes de cada partida o desvio decai exponencialmente com o tempo desde a última partida
+    do jogador na superfície (constante `decay_days`), e depois recebe uma atualização Elo própria,
+    calculada com os ratings recentes (Geral + desvio). Jogadores sem partidas recentes voltam ao
+    Elo Geral, em vez de recomeçar do rating inicial.
+
+    :param diffs: Lista opcional que recebe, por partida, (diferença Geral, diferença Recente)
+        antes da atualização, do ponto de vista do vencedor ((0, 0) para superfícies sem Elo).
+    :param history: Lista opcional que recebe, por partida com Elo, (rating do vencedor, rating do
+        perdedor, desvio do vencedor, desvio do perdedor) após a atualização.
+    """
+    # Listas Python são mais rápidas que escalares NumPy para acesso elemento a elemento.
+    table = [row.tolist() for row in ratings]
+    form_table = [row.tolist() for row in form]
+    day_table = [row.tolist() for row in form_day]
+    pow_, exp_ = math.pow, math.exp
+    record = diffs.append if diffs is not None else None
+    record_after = history.append if history is not None else None
+    for s, w, l, day in zip(surface_codes.tolist(), winner_idx.tolist(), loser_idx.tolist(), days.tolist()):
+        if s < 0:
+            if record:
+                record((0.0, 0.0))
+            continue
+        surface_ratings = table[s]
+        winner_rating = surface_ratings[w]
+        loser_rating = surface_ratings[l]
+        prob_winner = 1 / (1 + pow_(10, (loser_rating - winner_rating) / 400))
+        rating_change = k_factor * (1 - prob_winner)
+        surface_ratings[w] = winner_rating + rating_change
+        surface_ratings[l] = loser_rating - rating_change
+
+        # Forma Recente: desvio decaído até a data da partida
+        surface_form, surface_days = form_table[s], day_table[s]
+        winner_form = surface_form[w] * exp_(-(day - surface_days[w]) / decay_days)
+        loser_form = surface_form[l] * exp_(-(day - surface_days[l]) / decay_days)
+        recent_diff = winner_rating + winner_form - loser_rating - loser_form
+        form_change = k_factor * (1 - 1 / (1 + pow_(10, -recent_diff / 400)))
+        surface_form[w] = winner_form + form_change
+        surface_form[l] = loser_form - form_change
+        surface_days[w] = surface_days[l] = day
+        if record:
+            record((winner_rating - loser_rating, recent_diff))
+        if record_after:
+            record_after((surface_ratings[w], surface_ratings[l], surface_form[w], surface_form[l]))
+    ratings[:] = table
+    form[:] = form_table
+    form_day[:] = day_table
 
 class TennisEloModel:
     """
     Uma classe para calcular e gerenciar ratings Elo para jogadores de tênis,
     com ratings separados por superfície e para forma geral vs. recente.
+
+    Os jogadores são identificados por `winner_id`/`loser_id` e mapeados para índices
+    inteiros densos; os ratings ficam em arrays NumPy (superfície x jogador).
+
+    A Forma Recente é um desvio em relação ao Elo Geral que decai com o tempo (constante de
+    `recent_form_months * 30` dias) e é atualizado na mesma passada do Elo Geral; o rating
+    recente pode ser consultado em qualquer data posterior às partidas processadas.
     """
-    def __init__(self, base_rating=1500, k_factor=32):
+    def __init__(self, base_rating=1500, k_factor=32, recent_form_months=6):
         self.base_rating = base_rating
         self.k_factor = k_factor
-        
-        # Dicionários para o Elo Geral (longo prazo)
-        self.ratings_hard = {}
-        self.ratings_clay = {}
-        self.ratings_grass = {}
-
-        # Dicionários para o Elo de Forma Recente (curto prazo)
-        self.recent_ratings_hard = {}
-        self.recent_ratings_clay = {}
-        self.recent_ratings_grass = {}
-
-    def _get_ratings_for_surface(self, surface: str, recent=False):
-        """Método auxiliar para retornar o dicionário de ratings correto (geral ou recente)."""
-        if recent:
-            if surface == 'Hard': return self.recent_ratings_hard
-            if surface == 'Clay': return self.recent_ratings_clay
-            if surface == 'Grass': return self.recent_ratings_grass
+        self.recent_form_months = recent_form_months
+
+        # Mapeamento de jogadores: chave (id ou nome) -> índice denso -> nome
+        self._player_keys = {}
+        self._name_to_index = {}
+        self.player_names = []
+
+        # Arrays para o Elo Geral (longo prazo) e o desvio de Forma Recente, com o dia
+        # (desde 1970-01-01) em que cada desvio foi atualizado pela última vez
+        self._ratings = np.full((len(SURFACES), 0), float(base_rating))
+        self._form = np.zeros((len(SURFACES), 0))
+        self._form_day = np.zeros((len(SURFACES), 0), dtype=np.int64)
+
+        # Marca quais jogadores já disputaram partidas em cada superfície
+        self._played = np.zeros((len(SURFACES), 0), dtype=bool)
+
+        # Checkpoint do treinamento incremental: última linha (rowid) e data processadas
+        self.last_rowid = 0
+        self.last_date = None
+
+        # Histórico de ratings (`RatingHistory`) opcional, preenchido durante o treinamento
+        self.history = None
+
+        # Features de forma (partidas recentes, taxa de vitórias, dias sem jogar) de cada jogador
+        self.form_store = PlayerFormStore()
+
+    @property
+    def num_players(self) -> int:
+        return len(self.player_names)
+
+    @property
+    def decay_days(self) -> float:
+        """Constante de tempo (em dias) do decaimento da Forma Recente."""
+        return self.recent_form_months * 30
+
+    def _grow(self, num_players: int):
+        """Expande os arrays de ratings para comportar novos jogadores."""
+        extra = num_players - self._ratings.shape[1]
+        if extra <= 0:
+            return
+        pad = np.full((len(SURFACES), extra), float(self.base_rating))
+        self._ratings = np.concatenate([self._ratings, pad], axis=1)
+        self._form = np.concatenate([self._form, np.zeros((len(SURFACES), extra))], axis=1)
+        self._form_day = np.concatenate([self._form_day, np.zeros((len(SURFACES), extra), dtype=np.int64)], axis=1)
+        self._played = np.concatenate([self._played, np.zeros((len(SURFACES), extra), dtype=bool)], axis=1)
+        self.form_store.grow(num_players)
+
+    def _intern_players(self, historical_data):
+        """Converte vencedores/perdedores em índices densos, registrando jogadores novos."""
+        if isinstance(historical_data, MatchHistory):
+            codes, unique_keys, unique_names = historical_data.player_keys()
         else:
-            if surface == 'Hard': return self.ratings_hard
-            if surface == 'Clay': return self.ratings_clay
-            if surface == 'Grass': return self.ratings_grass
-        return {}
+            use_ids = {'winner_id', 'loser_id'}.issubset(historical_data.columns) and \
+                not historical_data[['winner_id', 'loser_id']].isna().any().any()
+            key_columns = ['winner_id', 'loser_id'] if use_ids else ['winner_name', 'loser_name']
 
-    def _get_rating(self, player_name: str, surface: str, recent=False) -> float:
-        """Obtém o rating de um jogador para uma superfície específica (geral ou recente)."""
-        ratings = self._get_ratings_for_surface(surface, recent)
-        return ratings.get(player_name, self.base_rating)
+            # Intercala vencedor/perdedor para que a ordem dos nomes siga a cronologia das partidas
+            keys = historical_data[key_columns].to_numpy().ravel()
+            names = historical_data[['winner_name', 'loser_name']].to_numpy().ravel()
+            codes, unique_keys = pd.factorize(keys)
+            unique_names = latest_per_code(codes, names, len(unique_keys))
 
-    def get_win_probability(self, player_a_name: str, player_b_name: str, surface: str, recent=False) -> float:
+        mapping = np.empty(len(unique_keys), dtype=np.int64)
+        for position, key in enumerate(unique_keys.tolist()):
+            index = self._player_keys.get(key)
+            if index is None:
+                index = len(self.player_names)
+                self._player_keys[key] = index
+                self.player_names.append(None)
+            mapping[position] = index
+
+        # Usa o nome mais recente de cada jogador
+        for index, name in zip(mapping.tolist(), unique_names.tolist()):
+            self.player_names[index] = name
+            self._name_to_index[name] = index
+
+        self._grow(self.num_players)
+        indices = mapping[codes]
+        return indices[0::2], indices[1::2]
+
+    def _encode_matches(self, historical_data):
+        """Retorna (códigos de superfície, índices dos vencedores, índices dos perdedores)."""
+        winner_idx, loser_idx = self._intern_players(historical_data)
+        if isinstance(historical_data, MatchHistory):
+            surface_codes = historical_data.surface_codes(SURFACE_CODES)
+        else:
+            surface_codes = encode_surfaces(historical_data['surface'])
+        return surface_codes, winner_idx, loser_idx
+
+    def _as_of_day(self, as_of=None) -> int:
+        """Dia de referência das consultas de Forma Recente (padrão: data da última partida processada)."""
+        if as_of is None:
+            as_of = self.last_date
+        return _to_day(as_of) if as_of is not None else None
+
+    def _recent_table(self, as_of=None) -> np.ndarray:
+        """Ratings de Forma Recente (superfície x jogador) na data `as_of`."""
+        day = self._as_of_day(as_of)
+        if day is None:
+            return self._ratings + self._form
+        # Datas anteriores à última atualização de um jogador usam o desvio daquela atualização
+        elapsed = np.maximum(day - self._form_day, 0)
+        return self._ratings + self._form * np.exp(-elapsed / self.decay_days)
+
+    def _ratings_dict(self, surface: str, recent=False) -> dict:
+        code = SURFACE_CODES[surface]
+        ratings = self._recent_table()[code] if recent else self._ratings[code]
+        indices = np.flatnonzero(self._played[code])
+        return {self.player_names[i]: float(ratings[i]) for i in indices}
+
+    # Visões em dicionário (nome -> rating), mantidas por compatibilidade
+    ratings_hard = property(lambda self: self._ratings_dict('Hard'))
+    ratings_clay = property(lambda self: self._ratings_dict('Clay'))
+    ratings_grass = property(lambda self: self._ratings_dict('Grass'))
+    recent_ratings_hard = property(lambda self: self._ratings_dict('Hard', recent=True))
+    recent_ratings_clay = property(lambda self: self._ratings_dict('Clay', recent=True))
+    recent_ratings_grass = property(lambda self: self._ratings_dict('Grass', recent=True))
+
+    def known_players(self) -> set:
+        """Retorna o conjunto de jogadores com pelo menos uma partida em Hard, Clay ou Grass."""
+        return {self.player_names[i] for i in np.flatnonzero(self._played.any(axis=0))}
+
+    def _get_rating(self, player_name: str, surface: str, recent=False, as_of=None) -> float:
+        """Obtém o rating de um jogador para uma superfície específica (geral ou recente, na data `as_of`)."""
+        return float(self.get_ratings([player_name], [surface], recent, as_of)[0])
+
+    def get_ratings(self, player_names, surfaces, recent=False, as_of=None) -> np.ndarray:
+        """
+        Versão vetorizada de `_get_rating`: ratings de vários jogadores/superfícies de uma vez.
+        Com `recent=True`, a Forma Recente é decaída até `as_of` (padrão: última partida processada).
+        """
+        lookup = self._name_to_index.get
+        indices = np.fromiter((lookup(name, -1) for name in player_names), dtype=np.int64, count=len(player_names))
+        codes = encode_surfaces(surfaces)
+        valid = (indices >= 0) & (codes >= 0)
+        ratings = np.full(len(codes), float(self.base_rating))
+        codes, indices = codes[valid], indices[valid]
+        ratings[valid] = self._ratings[codes, indices]
+        if recent:
+            day = self._as_of_day(as_of)
+            form = self._form[codes, indices]
+            if day is not None:
+                form = form * np.exp(-np.maximum(day - self._form_day[codes, indices], 0) / self.decay_days)
+            ratings[valid] += form
+        return ratings
+
+    def get_form_features(self, player_names, as_of=None) -> np.ndarray:
+        """
+        Features de forma (jogadores x `FORM_FEATURES`) na data `as_of` (padrão: última partida
+        processada, a mesma referência da Forma Recente). Jogadores desconhecidos recebem os valores
+        de quem nunca jogou.
+        """
+        lookup = self._name_to_index.get
+        indices = np.fromiter((lookup(name, -1) for name in player_names), dtype=np.int64, count=len(player_names))
+        day = self._as_of_day(as_of)
+        return self.form_store.features(indices, day if day is not None else 0)
+
+    def get_win_probability(self, player_a_name: str, player_b_name: str, surface: str, recent=False, as_of=None) -> float:
         """Calcula a probabilidade de vitória do Jogador A (geral ou recente)."""
-        rating_a = self._get_rating(player_a_name, surface, recent)
-        rating_b = self._get_rating(player_b_name, surface, recent)
-        
+        rating_a = self._get_rating(player_a_name, surface, recent, as_of)
+        rating_b = self._get_rating(player_b_name, surface, recent, as_of)
+
         expected_prob_a = 1 / (1 + math.pow(10, (rating_b - rating_a) / 400))
         return expected_prob_a
 
-    def _update_ratings(self, winner_name: str, loser_name: str, surface: str, recent=False):
-        """Atualiza os ratings Elo de ambos os jogadores (geral ou recente)."""
-        ratings = self._get_ratings_for_surface(surface, recent)
-        
-        winner_rating = self._get_rating(winner_name, surface, recent)
-        loser_rating = self._get_rating(loser_name, surface, recent)
-
-        prob_winner = self.get_win_probability(winner_name, loser_name, surface, recent)
-        rating_change = self.k_factor * (1 - prob_winner)
-
-        ratings[winner_name] = winner_rating + rating_change
-        ratings[loser_name] = loser_rating - rating_change
-
-    def train_general(self, historical_data: pd.DataFrame):
-        """Treina o modelo Elo Geral com todos os dados históricos."""
-        print(f"Treinando o modelo Elo Geral com {len(historical_data)} partidas...")
-        for index, match in historical_data.iterrows():
-            self._update_ratings(match['winner_name'], match['loser_name'], match['surface'], recent=False)
-        print("Treinamento do Elo Geral completo!")
-
-    def train_recent_form(self, historical_data: pd.DataFrame, months=6):
-        """Treina o modelo Elo de Forma Recente com os dados dos últimos X meses."""
-        if historical_data.empty:
-            print("Nenhum dado para treinar a forma recente.")
-            return
-            
-        # Garante que a coluna de data esteja no formato correto
-        historical_data['tourney_date'] = pd.to_datetime(historical_data['tourney_date'])
-        
-        # Filtra os dados para o período desejado
-        last_date = historical_data['tourney_date'].max()
-        cutoff_date = last_date - timedelta(days=months * 30)
-        recent_data = historical_data[historical_data['tourney_date'] >= cutoff_date]
-
-        print(f"Treinando o modelo de Forma Recente com {len(recent_data)} partidas dos últimos {months} meses...")
-        for index, match in recent_data.iterrows():
-            self._update_ratings(match['winner_name'], match['loser_name'], match['surface'], recent=True)
-        print("Treinamento de Forma Recente completo!")
\ No newline at end of file
+    def _mark_played(self, surface_codes, winner_idx, loser_idx):
+        """Registra que os jogadores disputaram partidas nas superfícies indicadas."""
+        valid = surface_codes >= 0
+        self._played[surface_codes[valid], winner_idx[valid]] = True
+        self._played[surface_codes[valid], loser_idx[valid]] = True
+
+    def _train(self, surface_codes, winner_idx, loser_idx, days, diffs: list = None, form_features: list = None):
+        after = [] if self.history is not None else None
+        _run_elo_updates(self._ratings, self._form, self._form_day, surface_codes, winner_idx, loser_idx, days,
+                         self.k_factor, self.decay_days, diffs, after)
+        self._mark_played(surface_codes, winner_idx, loser_idx)
+        # A forma conta as partidas de todas as superfícies (inclusive as sem Elo)
+        self.form_store.update(winner_idx, loser_idx, days, form_features)
+        if after is not None:
+            self.history.record(surface_codes, winner_idx, loser_idx, days, after, self.player_names)
+
+    def train_general(self, historical_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Treina o Elo Geral e a Forma Recente com as partidas (em ordem cronológica), em uma única
+        passada. Pode ser chamado de novo só com as partidas novas. O DataFrame não é alterado.
+
+        :param historical_data: DataFrame ou `MatchHistory` (percorrido em blocos de `chunk_size`).
+        """
+        logger.info("Treinando o modelo Elo Geral e de Forma Recente com %d partidas...", len(historical_data))
+        if not historical_data.empty:
+            chunks = historical_data.iter_chunks(chunk_size) if isinstance(historical_data, MatchHistory) else [historical_data]
+            with metrics.span('elo.train_general'):
+                for chunk in chunks:
+                    self._train(*self._encode_matches(chunk), match_days(chunk))
+            metrics.increment('elo_matches_processed', len(historical_data))
+        logger.info("Treinamento do Elo completo!")
+
+    def set_checkpoint(self, last_rowid: int, last_date):
+        """Registra até onde o histórico do banco já foi processado."""
+        self.last_rowid = int(last_rowid)
+        if last_date is not None and not pd.isna(last_date):
+            last_date = pd.Timestamp(last_date).strftime('%Y-%m-%d')
+            self.last_date = max(self.last_date or last_date, last_date)
+
+    def params(self) -> dict:
+        """Parâmetros que definem os ratings; um estado salvo só é reaproveitado se eles coincidirem."""
+        return {'base_rating': self.base_rating, 'k_factor': self.k_factor, 'recent_form_months': self.recent_form_months}
+
+    def get_state(self) -> dict:
+        """Exporta o estado completo do modelo como tipos simples (dict, list, arrays NumPy)."""
+        return {
+            'version': STATE_VERSION,
+            'params': self.params(),
+            'player_keys': dict(self._player_keys),
+            'player_names': list(self.player_names),
+            'ratings': self._ratings.copy(),
+            'form': self._form.copy(),
+            'form_day': self._form_day.copy(),
+            'played': self._played.copy(),
+            'form_store': self.form_store.get_state(),
+            'last_rowid': self.last_rowid,
+            'last_date': self.last_date,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'TennisEloModel':
+        """Reconstrói um modelo a partir de um estado exportado por `get_state`."""
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"Versão de estado Elo incompatível: {state.get('version')}")
+        params = state['params']
+        model = cls(base_rating=params['base_rating'], k_factor=params['k_factor'], recent_form_months=params['recent_form_months'])
+        model._player_keys = dict(state['player_keys'])
+        model.player_names = list(state['player_names'])
+        model._name_to_index = {name: index for index, name in enumerate(model.player_names)}
+        model._ratings = state['ratings'].copy()
+        model._form = state['form'].copy()
+        model._form_day = state['form_day'].copy()
+        model._played = state['played'].copy()
+        model.form_store = PlayerFormStore.from_state(state['form_store'])
+        model.last_rowid = state['last_rowid']
+        model.last_date = state['last_date']
+        return model
+
+    def save(self, filename: str):
+        """Salva o estado Elo em disco (ao lado do modelo de ML)."""
+        with open(filename, 'wb') as f:
+            pickle.dump(self.get_state(), f)
+
+    @classmethod
+    def load(cls, filename: str) -> 'TennisEloModel':
+        """Carrega um estado Elo salvo por `save`."""
+        with open(filename, 'rb') as f:
+            return cls.from_state(pickle.load(f))
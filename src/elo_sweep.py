@@ -0,0 +1,153 @@
+# src/elo_sweep.py
+#
+# Varredura de parâmetros do Elo: avalia muitas combinações (k_factor, decaimento da Forma Recente)
+# em uma única passada cronológica, com os ratings de todas as configurações em arrays 2-D.
+#
+# As partidas são agrupadas em "níveis": o nível de uma partida é um a mais que o maior nível das
+# partidas anteriores dos mesmos jogadores na mesma superfície. Partidas de um mesmo nível não
+# compartilham (jogador, superfície), então podem ser atualizadas juntas por broadcasting
+# (configurações x partidas), com o mesmo resultado da atualização sequencial.
+
+import logging
+import re
+import numpy as np
+import pandas as pd
+from src import metrics
+from src.elo_model import TennisEloModel, match_days
+
+logger = logging.getLogger(__name__)
+
+def _match_levels(group_w: np.ndarray, group_l: np.ndarray) -> np.ndarray:
+    """Nível de cada partida (0, 1, ...) a partir dos grupos (jogador, superfície) dos dois lados."""
+    last_level = {}
+    levels = np.empty(len(group_w), dtype=np.int64)
+    get = last_level.get
+    for position, (w, l) in enumerate(zip(group_w.tolist(), group_l.tolist())):
+        level = max(get(w, -1), get(l, -1)) + 1
+        last_level[w] = last_level[l] = level
+        levels[position] = level
+    return levels
+
+def sweep_elo(historical_data: pd.DataFrame, k_factors, recent_form_months, base_rating=1500, burn_in_months=12) -> pd.DataFrame:
+    """
+    Avalia todas as combinações (k_factor, meses da Forma Recente) em uma passada.
+
+    Para cada partida (após o período inicial `burn_in_months`, usado só para aquecer os ratings)
+    são medidas as probabilidades pré-partida do vencedor pelo Elo Geral, pela Forma Recente e pela
+    combinação das duas (média das diferenças de rating), no mesmo formato ponto a ponto de
+    `PointInTimeFeatureBuilder`. O ranking usa o log-loss da combinação.
+
+    :return: DataFrame ordenado do melhor para o pior, com uma linha por configuração.
+    """
+    k_values = np.asarray(sorted(set(float(k) for k in k_factors)))
+    month_values = sorted(set(int(m) for m in recent_form_months))
+    configs = [(k, months) for k in k_values for months in month_values]
+    config_k = np.asarray([k for k, _ in configs])
+    config_k_index = np.repeat(np.arange(len(k_values)), len(month_values))
+    config_window = np.tile(np.arange(len(month_values)), len(k_values))
+
+    with metrics.span('sweep.prepare'):
+        elo_model = TennisEloModel(base_rating=base_rating)
+        surface_codes, winner_idx, loser_idx = elo_model._encode_matches(historical_data)
+        days = match_days(historical_data)
+        valid = surface_codes >= 0
+        surface_codes, winner_idx, loser_idx, days = surface_codes[valid], winner_idx[valid], loser_idx[valid], days[valid]
+        num_matches, num_players = len(surface_codes), elo_model.num_players
+        scored = days >= days.min() + burn_in_months * 30 if num_matches else np.zeros(0, dtype=bool)
+
+        # Grupos (jogador, superfície)
+        group_w = surface_codes * num_players + winner_idx
+        group_l = surface_codes * num_players + loser_idx
+        levels = _match_levels(group_w, group_l)
+        logger.debug("Varredura: %d partidas em %d níveis, %d configurações.", num_matches, levels.max(initial=-1) + 1, len(configs))
+
+    # Elo Geral de cada k_factor: (k_factors x grupos jogador/superfície)
+    general = np.full((len(k_values), 3 * num_players), float(base_rating))
+    # Desvio de Forma Recente de cada configuração e dia da última atualização de cada grupo
+    form = np.zeros((len(configs), 3 * num_players))
+    form_day = np.zeros(3 * num_players, dtype=np.int64)
+    decay_days = np.asarray([months * 30.0 for months in month_values])[config_window][:, None]
+    loss_general = np.zeros(len(k_values))
+    loss_recent = np.zeros(len(configs))
+    loss_combined = np.zeros(len(configs))
+    correct_combined = np.zeros(len(configs))
+
+    order = np.argsort(levels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(levels[order])) + 1
+    with metrics.span('sweep.pass'):
+        for batch in np.split(order, boundaries):
+            gw_index, gl_index = group_w[batch], group_l[batch]
+
+            # Elo Geral: (k_factors x partidas)
+            gw, gl = general[:, gw_index], general[:, gl_index]
+            general_diff = gw - gl
+            change = k_values[:, None] * (1 - 1 / (1 + 10 ** (-general_diff / 400)))
+            general[:, gw_index] = gw + change
+            general[:, gl_index] = gl - change
+
+            # Forma Recente: desvio decaído até a data da partida, com a constante de cada configuração
+            batch_days = days[batch]
+            fw = form[:, gw_index] * np.exp(-(batch_days - form_day[gw_index]) / decay_days)
+            fl = form[:, gl_index] * np.exp(-(batch_days - form_day[gl_index]) / decay_days)
+            recent_diff = general_diff[config_k_index] + fw - fl
+            change = config_k[:, None] * (1 - 1 / (1 + 10 ** (-recent_diff / 400)))
+            form[:, gw_index] = fw + change
+            form[:, gl_index] = fl - change
+            form_day[gw_index] = form_day[gl_index] = batch_days
+
+            batch_scored = scored[batch]
+            if batch_scored.any():
+                general_diff, recent_diff = general_diff[:, batch_scored], recent_diff[:, batch_scored]
+                # -log(p) com p = 1 / (1 + 10^(-diff/400))  ->  log1p(10^(-diff/400))
+                loss_general += np.log1p(10 ** (-general_diff / 400)).sum(axis=1)
+                loss_recent += np.log1p(10 ** (-recent_diff / 400)).sum(axis=1)
+                combined_diff = (general_diff[config_k_index] + recent_diff) / 2
+                loss_combined += np.log1p(10 ** (-combined_diff / 400)).sum(axis=1)
+                correct_combined += ((combined_diff > 0) + 0.5 * (combined_diff == 0)).sum(axis=1)
+
+    num_scored = max(int(scored.sum()), 1)
+    results = pd.DataFrame({
+        'k_factor': config_k,
+        'recent_form_months': [months for _, months in configs],
+        'log_loss': loss_combined / num_scored,
+        'log_loss_geral': loss_general[config_k_index] / num_scored,
+        'log_loss_recente': loss_recent / num_scored,
+        'accuracy': correct_combined / num_scored,
+        'matches': int(scored.sum()),
+    })
+    metrics.increment('sweep_configurations', len(configs))
+    return results.sort_values('log_loss', kind='stable').reset_index(drop=True)
+
+def write_elo_params_to_config(path: str, k_factor: float, recent_form_months: int):
+    """
+    Grava k_factor e recent_form_months na seção [Model] do config.ini, preservando os comentários.
+    Sem seção [Model], ela é criada no fim do arquivo.
+    """
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    values = {'k_factor': f"{k_factor:g}", 'recent_form_months': str(int(recent_form_months))}
+    section, model_end, written = None, None, set()
+    for position, line in enumerate(lines):
+        header = re.match(r'\s*\[([^\]]+)\]', line)
+        if header:
+            if section == 'Model':
+                break
+            section = header.group(1)
+            if section == 'Model':
+                model_end = position
+            continue
+        key = re.match(r'\s*([A-Za-z_]+)\s*=', line)
+        if section == 'Model' and key and key.group(1) in values:
+            lines[position] = f"{key.group(1)} = {values[key.group(1)]}"
+            written.add(key.group(1))
+        if section == 'Model':
+            model_end = position
+    missing = [f"{key} = {value}" for key, value in values.items() if key not in written]
+    if model_end is None:
+        while lines and not lines[-1].strip():
+            lines.pop()
+        lines += ([''] if lines else []) + ['[Model]'] + missing + ['']
+    elif missing:
+        lines[model_end + 1:model_end + 1] = missing
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
@@ -0,0 +1,29 @@
+# src/evaluation.py
+#
+# Métricas de qualidade das probabilidades previstas, usadas pelo backtest e pelo monitoramento de
+# drift do modelo de ML.
+
+import numpy as np
+
+def evaluate_predictions(y: np.ndarray, probabilities: np.ndarray, bins=10) -> dict:
+    """Log-loss, Brier score, acurácia e curva de calibração (faixas de probabilidade prevista)."""
+    y = np.asarray(y, dtype=float)
+    p = np.clip(np.asarray(probabilities, dtype=float), 1e-15, 1 - 1e-15)
+    if len(y) == 0:
+        return {'n': 0}
+    bin_index = np.minimum((p * bins).astype(int), bins - 1)
+    counts = np.bincount(bin_index, minlength=bins)
+    predicted = np.bincount(bin_index, weights=p, minlength=bins)
+    observed = np.bincount(bin_index, weights=y, minlength=bins)
+    calibration = [
+        {'bin': f"{b / bins:.1f}-{(b + 1) / bins:.1f}", 'n': int(counts[b]),
+         'mean_predicted': float(predicted[b] / counts[b]), 'observed': float(observed[b] / counts[b])}
+        for b in range(bins) if counts[b]
+    ]
+    return {
+        'n': int(len(y)),
+        'log_loss': float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))),
+        'brier': float(np.mean((p - y) ** 2)),
+        'accuracy': float(np.mean((p >= 0.5) == (y == 1))),
+        'calibration': calibration,
+    }
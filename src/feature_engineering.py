@@ -1,10 +1,27 @@
 # src/feature_engineering.py
 
+import logging
+import os
+import pickle
+import numpy as np
 import pandas as pd
-from src.elo_model import TennisEloModel
-from src.utils import get_h2h_record
+from src import metrics
+from src.elo_model import TennisEloModel, match_days
+from src.form_store import FORM_FEATURES
+from src.match_history import DEFAULT_CHUNK_SIZE, MatchHistory
 from typing import Tuple
-from tqdm import tqdm # <<< NOVA IMPORTAÇÃO
+
+logger = logging.getLogger(__name__)
+
+# Ordem das features produzidas por create_feature_vector/create_feature_matrix (esquema dos modelos salvos)
+FEATURE_NAMES = ['elo_geral_diff', 'elo_recente_diff', 'h2h_p1_wins', 'h2h_p2_wins', 'h2h_surface_p1_wins', 'h2h_surface_p2_wins',
+                 'partidas_7d_diff', 'partidas_14d_diff', 'partidas_30d_diff', 'taxa_vitorias_diff', 'dias_sem_jogar_diff']
+
+# Colunas das features de forma (Jogador 1 - Jogador 2, na ordem de `FORM_FEATURES`)
+FORM_COLUMNS = slice(6, 6 + len(FORM_FEATURES))
+
+# Versão do estado salvo de PointInTimeFeatureBuilder (checkpoint do treinamento incremental)
+BUILDER_STATE_VERSION = 2
 
 def create_feature_vector(p1_name: str, p2_name: str, surface: str, elo_model: TennisEloModel, h2h: dict) -> list:
     """Cria um vetor de características numéricas para uma única partida."""
@@ -21,31 +38,147 @@ def create_feature_vector(p1_name: str, p2_name: str, surface: str, elo_model: T
         h2h_surface['p1_wins'],
         h2h_surface['p2_wins'],
     ]
+    form = elo_model.get_form_features([p1_name, p2_name])
+    features.extend((form[0] - form[1]).tolist())
+    return features
+
+def create_feature_matrix(p1_names, p2_names, surfaces, elo_model: TennisEloModel, h2h_records: list) -> np.ndarray:
+    """Versão vetorizada de `create_feature_vector`: uma linha de features por partida."""
+    features = np.zeros((len(h2h_records), len(FEATURE_NAMES)))
+    if not h2h_records:
+        return features
+    features[:, 0] = elo_model.get_ratings(p1_names, surfaces) - elo_model.get_ratings(p2_names, surfaces)
+    features[:, 1] = elo_model.get_ratings(p1_names, surfaces, recent=True) - elo_model.get_ratings(p2_names, surfaces, recent=True)
+    empty = {'p1_wins': 0, 'p2_wins': 0}
+    features[:, 2:6] = [
+        (h2h['overall']['p1_wins'], h2h['overall']['p2_wins'], h2h.get(surface, empty)['p1_wins'], h2h.get(surface, empty)['p2_wins'])
+        for h2h, surface in zip(h2h_records, surfaces)
+    ]
+    features[:, FORM_COLUMNS] = elo_model.get_form_features(p1_names) - elo_model.get_form_features(p2_names)
     return features
 
-def create_dataset_for_ml(circuit: str, historical_data: pd.DataFrame, elo_model: TennisEloModel) -> Tuple[list, list]:
-    """Processa todos os dados históricos para criar um dataset de features (X) e rótulos (y)."""
-    print(f"Iniciando engenharia de features para o dataset {circuit.upper()} de Machine Learning...")
-    X, y, h2h_cache = [], [], {}
-
-    # <<< ALTERAÇÃO AQUI: Envolvendo o loop com tqdm >>>
-    # O 'desc' mostra uma descrição, e 'total' ajuda a tqdm a calcular o tempo restante.
-    loop_description = f"Processando {circuit.upper()}"
-    for index, match in tqdm(historical_data.iterrows(), total=historical_data.shape[0], desc=loop_description):
-        p1_name, p2_name, surface = match['winner_name'], match['loser_name'], match['surface']
-        import random
-        if random.random() < 0.5:
-            p1_name, p2_name = p2_name, p1_name
-        
-        label = 1 if p1_name == match['winner_name'] else 0
-        h2h_key = tuple(sorted((p1_name, p2_name)))
-        if h2h_key not in h2h_cache:
-            h2h_cache[h2h_key] = get_h2h_record(circuit, p1_name, p2_name)
-        h2h = h2h_cache[h2h_key]
-
-        features = create_feature_vector(p1_name, p2_name, surface, elo_model, h2h)
-        X.append(features)
-        y.append(label)
-
-    print(f"Engenharia de features concluída. Dataset criado com {len(X)} exemplos.")
-    return X, y
\ No newline at end of file
+class PointInTimeFeatureBuilder:
+    """
+    Constrói o dataset de ML em uma única passada cronológica.
+
+    Para cada partida, emite as features como estavam *antes* dela (sem vazar resultados
+    futuros) e só então atualiza, em memória, o Elo Geral, o Elo de Forma Recente e os
+    contadores de H2H por superfície, além das features de forma de cada jogador. Nenhuma
+    consulta ao banco é feita.
+
+    O Elo (Geral e Forma Recente decaída no tempo) é atualizado pelo mesmo núcleo de
+    `TennisEloModel`, então as features de treino coincidem com as usadas na previsão.
+    """
+    def __init__(self, base_rating=1500, k_factor=32, recent_form_months=6):
+        # Modelo Elo próprio: ao fim da passada ele contém o Elo treinado com todo o histórico.
+        self.elo_model = TennisEloModel(base_rating=base_rating, k_factor=k_factor, recent_form_months=recent_form_months)
+
+        # Par ordenado de índices (a < b) -> [vitórias a, vitórias b, a/b em Hard, a/b em Clay, a/b em Grass]
+        self._h2h = {}
+
+    def transform(self, historical_data, chunk_size=DEFAULT_CHUNK_SIZE) -> np.ndarray:
+        """
+        Processa as partidas (já em ordem cronológica) e retorna uma matriz (n x `FEATURE_NAMES`) com as
+        features pré-partida na orientação vencedor = Jogador 1. Um `MatchHistory` é percorrido
+        em blocos de `chunk_size` partidas.
+        """
+        features = np.zeros((len(historical_data), len(FEATURE_NAMES)))
+        chunks = historical_data.iter_chunks(chunk_size) if isinstance(historical_data, MatchHistory) else [historical_data]
+        start = 0
+        for chunk in chunks:
+            if len(chunk):
+                self._transform_chunk(chunk, features[start:start + len(chunk)])
+            start += len(chunk)
+        return features
+
+    def _transform_chunk(self, historical_data, features: np.ndarray):
+        elo_model = self.elo_model
+        surface_codes, winner_idx, loser_idx = elo_model._encode_matches(historical_data)
+        diffs, form_features = [], []
+        elo_model._train(surface_codes, winner_idx, loser_idx, match_days(historical_data), diffs, form_features)
+        features[:, 0:2] = diffs
+        features[:, FORM_COLUMNS] = form_features
+
+        h2h = self._h2h
+        rows = []
+        append = rows.append
+        for s, w, l in zip(surface_codes.tolist(), winner_idx.tolist(), loser_idx.tolist()):
+            # H2H antes da partida
+            if w < l:
+                key, w_side = (w, l), 0
+            else:
+                key, w_side = (l, w), 1
+            counts = h2h.get(key)
+            if counts is None:
+                counts = h2h[key] = [0] * 8
+            h2h_w, h2h_l = counts[w_side], counts[1 - w_side]
+            counts[w_side] += 1
+
+            if s < 0:
+                # Superfícies sem Elo (ex.: Carpet) contam apenas para o H2H geral
+                append((h2h_w, h2h_l, 0, 0))
+                continue
+
+            surface_w, surface_l = counts[2 + 2 * s + w_side], counts[3 + 2 * s - w_side]
+            counts[2 + 2 * s + w_side] += 1
+            append((h2h_w, h2h_l, surface_w, surface_l))
+
+        features[:, 2:6] = rows
+
+    def get_state(self) -> dict:
+        """Exporta o estado da passada (Elo, forma e contadores de H2H), para continuá-la depois só com as partidas novas."""
+        return {'version': BUILDER_STATE_VERSION, 'elo_state': self.elo_model.get_state(), 'h2h': self._h2h}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'PointInTimeFeatureBuilder':
+        """Reconstrói o gerador a partir de um estado exportado por `get_state`."""
+        if state.get('version') != BUILDER_STATE_VERSION:
+            raise ValueError(f"Versão de estado do gerador de features incompatível: {state.get('version')}")
+        builder = cls()
+        builder.elo_model = TennisEloModel.from_state(state['elo_state'])
+        builder._h2h = state['h2h']
+        return builder
+
+    def save(self, filename: str):
+        """Salva o estado da passada (checkpoint do treinamento incremental do modelo de ML)."""
+        temp_filename = f"{filename}.tmp"
+        with open(temp_filename, 'wb') as f:
+            pickle.dump(self.get_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> 'PointInTimeFeatureBuilder':
+        """Carrega um estado salvo por `save`."""
+        with open(filename, 'rb') as f:
+            return cls.from_state(pickle.load(f))
+
+def randomize_orientation(X: np.ndarray, seed=42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Recebe features na orientação vencedor = Jogador 1 e sorteia a orientação de cada partida:
+    metade dos exemplos passa a ter o vencedor como Jogador 2. Retorna (X, y), alterando X no lugar.
+    """
+    swap = np.random.default_rng(seed).random(len(X)) < 0.5
+    X[swap, 0:2] *= -1
+    X[swap, 2:6] = X[swap][:, [3, 2, 5, 4]]
+    X[swap, FORM_COLUMNS] *= -1
+    y = (~swap).astype(int)
+    return X, y
+
+def create_dataset_for_ml(circuit: str, historical_data, elo_model: TennisEloModel, seed=42, builder=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Processa todos os dados históricos para criar um dataset de features (X) e rótulos (y).
+
+    As features são calculadas ponto a ponto (antes de cada partida) por um
+    `PointInTimeFeatureBuilder` com os mesmos parâmetros de `elo_model`. Passe `builder` para
+    continuar uma passada salva (ou guardar o estado ao final para atualizações incrementais).
+    """
+    logger.info("Iniciando engenharia de features para o dataset %s de Machine Learning...", circuit.upper())
+    if builder is None:
+        builder = PointInTimeFeatureBuilder(base_rating=elo_model.base_rating, k_factor=elo_model.k_factor,
+                                            recent_form_months=elo_model.recent_form_months)
+    with metrics.span('features.build_dataset'):
+        X = builder.transform(historical_data)
+    X, y = randomize_orientation(X, seed)
+
+    logger.info("Engenharia de features concluída. Dataset criado com %d exemplos.", len(X))
+    return X, y
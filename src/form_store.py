@@ -0,0 +1,141 @@
+# src/form_store.py
+#
+# Features de forma por jogador (cansaço e momento): partidas nos últimos 7/14/30 dias, taxa de
+# vitórias nas últimas partidas e dias desde a última partida.
+#
+# Cada jogador tem buffers circulares com as datas e os resultados das últimas partidas e agregados
+# mantidos a cada partida (soma das vitórias na janela e, para cada janela de dias, o ponteiro da
+# partida mais antiga ainda dentro dela). Na passada cronológica de treinamento, cada partida custa
+# O(1) amortizado; as consultas para jogos futuros leem um buffer de tamanho fixo por jogador.
+
+import numpy as np
+
+# Janelas (em dias) das contagens de partidas recentes
+WINDOWS = (7, 14, 30)
+
+# Partidas consideradas na taxa de vitórias
+WIN_RATE_MATCHES = 10
+
+# Tamanho do buffer circular por jogador (teto das contagens das janelas; como as partidas de um
+# torneio têm a data de início do torneio, uma janela de 30 dias pode cobrir vários torneios)
+BUFFER_SIZE = 24
+
+# Teto dos dias desde a última partida (também usado para quem nunca jogou)
+MAX_IDLE_DAYS = 365
+
+# Nomes das features de cada jogador, na ordem de `features`
+FORM_FEATURES = ['partidas_7d', 'partidas_14d', 'partidas_30d', 'taxa_vitorias', 'dias_sem_jogar']
+
+# Dia "vazio" das posições ainda não preenchidas do buffer
+_EMPTY_DAY = -(1 << 30)
+
+class PlayerFormStore:
+    """Estado das features de forma de todos os jogadores, indexado pelos índices do `TennisEloModel`."""
+    def __init__(self):
+        self.days = np.full((0, BUFFER_SIZE), _EMPTY_DAY, dtype=np.int32)
+        self.wins = np.zeros((0, BUFFER_SIZE), dtype=np.int8)
+        # Partidas já registradas por jogador (posição da próxima escrita no buffer = count % BUFFER_SIZE)
+        self.count = np.zeros(0, dtype=np.int64)
+        # Para cada janela, número de partidas do jogador que já saíram dela
+        self.expired = np.zeros((0, len(WINDOWS)), dtype=np.int64)
+        self.recent_wins = np.zeros(0, dtype=np.int64)
+
+    def grow(self, num_players: int):
+        """Expande os arrays para comportar novos jogadores."""
+        extra = num_players - len(self.count)
+        if extra <= 0:
+            return
+        self.days = np.concatenate([self.days, np.full((extra, BUFFER_SIZE), _EMPTY_DAY, dtype=np.int32)])
+        self.wins = np.concatenate([self.wins, np.zeros((extra, BUFFER_SIZE), dtype=np.int8)])
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.expired = np.concatenate([self.expired, np.zeros((extra, len(WINDOWS)), dtype=np.int64)])
+        self.recent_wins = np.concatenate([self.recent_wins, np.zeros(extra, dtype=np.int64)])
+
+    def update(self, winner_idx: np.ndarray, loser_idx: np.ndarray, days: np.ndarray, features: list = None):
+        """
+        Registra as partidas (em ordem cronológica), de todas as superfícies.
+
+        :param features: Lista opcional que recebe, por partida, as features de forma do vencedor
+            menos as do perdedor *antes* da partida (na ordem de `FORM_FEATURES`).
+        """
+        # Listas Python são mais rápidas que escalares NumPy para acesso elemento a elemento.
+        day_table, win_table = self.days.tolist(), self.wins.tolist()
+        count, expired, recent_wins = self.count.tolist(), self.expired.tolist(), self.recent_wins.tolist()
+        record = features.append if features is not None else None
+        windows = list(enumerate(WINDOWS))
+
+        def before_match(player, day):
+            """Features do jogador antes da partida; avança os ponteiros das janelas até a data."""
+            player_days, n, player_expired = day_table[player], count[player], expired[player]
+            if not n:
+                return [0, 0, 0, 0.5, MAX_IDLE_DAYS]
+            row = []
+            floor = n - BUFFER_SIZE
+            for window_position, window in windows:
+                oldest = player_expired[window_position]
+                if oldest < floor:
+                    oldest = floor
+                limit = day - window
+                while oldest < n and player_days[oldest % BUFFER_SIZE] <= limit:
+                    oldest += 1
+                player_expired[window_position] = oldest
+                row.append(n - oldest)
+            row.append(recent_wins[player] / (n if n < WIN_RATE_MATCHES else WIN_RATE_MATCHES))
+            idle = day - player_days[(n - 1) % BUFFER_SIZE]
+            row.append(idle if idle < MAX_IDLE_DAYS else MAX_IDLE_DAYS)
+            return row
+
+        for w, l, day in zip(winner_idx.tolist(), loser_idx.tolist(), days.tolist()):
+            if record:
+                record([a - b for a, b in zip(before_match(w, day), before_match(l, day))])
+            for player, won in ((w, 1), (l, 0)):
+                n = count[player]
+                position = n % BUFFER_SIZE
+                # Soma das vitórias nas últimas WIN_RATE_MATCHES partidas
+                if n >= WIN_RATE_MATCHES:
+                    recent_wins[player] += won - win_table[player][(n - WIN_RATE_MATCHES) % BUFFER_SIZE]
+                else:
+                    recent_wins[player] += won
+                day_table[player][position] = day
+                win_table[player][position] = won
+                count[player] = n + 1
+
+        self.days[:] = day_table
+        self.wins[:] = win_table
+        self.count[:] = count
+        self.expired[:] = expired
+        self.recent_wins[:] = recent_wins
+
+    def features(self, indices: np.ndarray, day: int) -> np.ndarray:
+        """
+        Features de forma (jogadores x `FORM_FEATURES`) na data `day` (dias desde 1970-01-01), para
+        jogadores já registrados; índices negativos (desconhecidos) recebem os valores de quem nunca jogou.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        result = np.zeros((len(indices), len(FORM_FEATURES)))
+        result[:, len(WINDOWS)] = 0.5
+        result[:, len(WINDOWS) + 1] = MAX_IDLE_DAYS
+        known = indices >= 0
+        players = indices[known]
+        count = self.count[players]
+        played = count > 0
+        player_days = self.days[players]
+        for window_position, window in enumerate(WINDOWS):
+            result[known, window_position] = (player_days > day - window).sum(axis=1)
+        rate = np.where(played, self.recent_wins[players] / np.maximum(np.minimum(count, WIN_RATE_MATCHES), 1), 0.5)
+        last_day = player_days[np.arange(len(players)), (count - 1) % BUFFER_SIZE]
+        idle = np.where(played, np.clip(day - last_day.astype(np.int64), 0, MAX_IDLE_DAYS), MAX_IDLE_DAYS)
+        result[known, len(WINDOWS)] = rate
+        result[known, len(WINDOWS) + 1] = idle
+        return result
+
+    def get_state(self) -> dict:
+        return {'days': self.days.copy(), 'wins': self.wins.copy(), 'count': self.count.copy(),
+                'expired': self.expired.copy(), 'recent_wins': self.recent_wins.copy()}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'PlayerFormStore':
+        store = cls()
+        store.days, store.wins, store.count = state['days'].copy(), state['wins'].copy(), state['count'].copy()
+        store.expired, store.recent_wins = state['expired'].copy(), state['recent_wins'].copy()
+        return store
@@ -0,0 +1,164 @@
+# src/match_history.py
+#
+# Histórico de partidas em formato compacto: jogadores e torneios codificados em dicionário
+# (códigos int32 + uma tabela de nomes), ids em int32 (-1 = ausente), datas como número de dias
+# desde 1970-01-01 (int32) e a superfície como um enum int8. É o mesmo conjunto de arrays do
+# snapshot colunar em `data/snapshots`, então carregar o histórico é ler o .npz, sem passar por
+# strings Python linha a linha.
+#
+# O Elo e o gerador de features consomem o histórico em blocos (`iter_chunks`), que são fatias
+# (views) dos arrays: nenhum bloco copia o histórico inteiro.
+#
+# Memória medida (tracemalloc, pico) com um histórico sintético do tamanho da Era Aberta de um
+# circuito (200 mil partidas, 8 mil jogadores):
+#   - DataFrame de strings lido do SQLite (formato antigo) ........ ~126 MB (80 MB retidos)
+#   - gravação do snapshot em blocos (from_chunks) ................ ~62 MB (nada retido)
+#   - load_match_history (MatchHistory a partir do snapshot) ....... ~7 MB
+#   - MatchHistory.to_dataframe (categorias + int32) ............... ~13 MB (7 MB retidos)
+#   - TennisEloModel.train_general sobre os blocos ................. ~20 MB
+
+import numpy as np
+import pandas as pd
+
+# Colunas dos CSVs de Jeff Sackmann que são armazenadas no banco
+MATCH_COLUMNS = ['tourney_id', 'tourney_name', 'surface', 'tourney_date', 'winner_id', 'winner_name', 'loser_id', 'loser_name']
+
+# Colunas codificadas em dicionário: (array de códigos, tabela de valores)
+_CATEGORICAL = ('tourney_id', 'tourney_name', 'surface')
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+def latest_per_code(codes: np.ndarray, values: np.ndarray, num_codes: int) -> np.ndarray:
+    """Para cada código (0..num_codes-1), o valor da sua última ocorrência em `codes`."""
+    _, first_in_reversed = np.unique(codes[::-1], return_index=True)
+    return values[len(codes) - 1 - first_in_reversed][:num_codes]
+
+class MatchHistory:
+    """
+    Histórico de um circuito em ordem cronológica, guardado em arrays NumPy compactos.
+
+    Arrays por partida: `winner_name`/`loser_name` (códigos em `players`), `winner_id`/`loser_id`,
+    `tourney_date` (dias desde 1970-01-01), `tourney_id`/`tourney_name`/`surface` (códigos em
+    `<coluna>_categories`).
+    """
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+
+    def __len__(self) -> int:
+        return len(self.arrays['tourney_date'])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def players(self) -> np.ndarray:
+        return self.arrays['players']
+
+    @property
+    def days(self) -> np.ndarray:
+        return self.arrays['tourney_date']
+
+    @property
+    def last_date(self):
+        """Data da partida mais recente (None se o histórico estiver vazio)."""
+        return pd.Timestamp(np.datetime64(int(self.days.max()), 'D')) if len(self) else None
+
+    @classmethod
+    def empty_history(cls) -> 'MatchHistory':
+        return cls.from_chunks([])
+
+    @classmethod
+    def from_chunks(cls, chunks) -> 'MatchHistory':
+        """
+        Monta o histórico a partir de DataFrames no formato do banco (ex.: `pd.read_sql_query` com
+        `chunksize`), já em ordem cronológica. Os valores são codificados bloco a bloco, então só um
+        bloco de strings fica em memória por vez.
+        """
+        tables = {column: {} for column in _CATEGORICAL + ('players',)}
+        parts = {column: [] for column in MATCH_COLUMNS}
+
+        def encode(table: dict, values) -> np.ndarray:
+            # Fatoriza o bloco e traduz os valores distintos para os códigos globais (nulos viram -1)
+            codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+            mapping = np.fromiter((table.setdefault(value, len(table)) for value in uniques.tolist()),
+                                  dtype=np.int32, count=len(uniques))
+            return np.append(mapping, np.int32(-1))[codes]
+
+        for chunk in chunks:
+            for column in _CATEGORICAL:
+                parts[column].append(encode(tables[column], chunk[column]))
+            for column in ('winner_name', 'loser_name'):
+                parts[column].append(encode(tables['players'], chunk[column]))
+            for column in ('winner_id', 'loser_id'):
+                parts[column].append(pd.to_numeric(chunk[column], errors='coerce').fillna(-1).to_numpy(dtype=np.int32))
+            parts['tourney_date'].append(pd.to_datetime(chunk['tourney_date']).to_numpy().astype('datetime64[D]').astype(np.int32))
+
+        arrays = {column: np.concatenate(values) if values else np.zeros(0, dtype=np.int32) for column, values in parts.items()}
+        arrays['surface'] = arrays['surface'].astype(np.int8)
+        arrays['players'] = np.array(list(tables['players']), dtype=str)
+        for column in _CATEGORICAL:
+            arrays[f"{column}_categories"] = np.array(list(tables[column]), dtype=str)
+        return cls(arrays)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'MatchHistory':
+        return cls.from_chunks([df])
+
+    @classmethod
+    def load(cls, path: str) -> 'MatchHistory':
+        """Carrega o histórico de um snapshot .npz (gravado por `save`)."""
+        with np.load(path, allow_pickle=False) as snapshot:
+            return cls({name: snapshot[name] for name in snapshot.files if name != 'version'})
+
+    def save(self, path: str, **extra):
+        """Grava os arrays em um .npz (`extra`: arrays adicionais, ex.: o carimbo de versão da tabela)."""
+        np.savez(path, **self.arrays, **extra)
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Percorre o histórico em blocos consecutivos (views dos arrays, sem cópia)."""
+        chunk_size = max(int(chunk_size), 1)
+        per_match = {name: array for name, array in self.arrays.items() if name not in ('players',) and not name.endswith('_categories')}
+        for start in range(0, len(self), chunk_size):
+            chunk = dict(self.arrays)
+            chunk.update({name: array[start:start + chunk_size] for name, array in per_match.items()})
+            yield MatchHistory(chunk)
+
+    def surface_codes(self, codes: dict) -> np.ndarray:
+        """Converte o enum de superfície do histórico para a codificação `codes` (nome -> código; -1 fora dele)."""
+        lookup = np.array([codes.get(name, -1) for name in self.arrays['surface_categories'].tolist()] + [-1], dtype=np.int64)
+        return lookup[self.arrays['surface']]
+
+    def player_keys(self):
+        """
+        Jogadores de cada partida intercalados (vencedor, perdedor), já fatorizados:
+        (códigos, chave de cada código, nome mais recente de cada código). A chave é o id quando
+        todos os ids existem, senão o nome.
+        """
+        name_codes = np.column_stack([self.arrays['winner_name'], self.arrays['loser_name']]).ravel()
+        ids = np.column_stack([self.arrays['winner_id'], self.arrays['loser_id']]).ravel()
+        use_ids = len(ids) > 0 and not (ids < 0).any()
+        codes, unique_keys = pd.factorize(ids if use_ids else name_codes)
+        unique_names = self.players[latest_per_code(codes, name_codes, len(unique_keys))]
+        if not use_ids:
+            unique_keys = unique_names
+        return codes, unique_keys, unique_names
+
+    def memory_usage(self) -> int:
+        """Bytes ocupados pelos arrays do histórico."""
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """DataFrame no formato do banco, com colunas categóricas, int32 e datetime64 (sem strings por linha)."""
+        columns = {}
+        for column in _CATEGORICAL:
+            columns[column] = pd.Categorical.from_codes(self.arrays[column], categories=self.arrays[f"{column}_categories"])
+        columns['tourney_date'] = self.days.astype('datetime64[D]')
+        for side in ('winner', 'loser'):
+            ids = self.arrays[f"{side}_id"]
+            columns[f"{side}_id"] = pd.array(np.where(ids < 0, None, ids), dtype='Int32') if (ids < 0).any() else ids
+            columns[f"{side}_name"] = pd.Categorical.from_codes(self.arrays[f"{side}_name"], categories=self.players)
+        return pd.DataFrame(columns)[MATCH_COLUMNS]
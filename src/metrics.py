@@ -0,0 +1,158 @@
+# src/metrics.py
+#
+# Instrumentação leve do pipeline: spans cronometrados por etapa, contadores e perfil (cProfile)
+# opcional por etapa. Desligada por padrão; nesse caso `span` devolve um contexto nulo
+# compartilhado e `increment` retorna na primeira linha, então o custo é praticamente zero.
+
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_NULL_SPAN = contextlib.nullcontext()
+
+class MetricsRegistry:
+    """
+    Acumula a duração de cada etapa (número de execuções, tempo total e máximo) e contadores
+    nomeados. Os nomes das etapas usam pontos como separador ("sync.download", "elo.train_general").
+    """
+    def __init__(self):
+        self.enabled = False
+        self.profile_stages = set()
+        self.profile_dir = "profiles"
+        self.counters = {}
+        self.spans = {}
+        # Funções chamadas no início (elapsed=None) e no fim de cada etapa: listener(nome, elapsed)
+        self.listeners = []
+        self._profiling = False
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=True, profile_stages=(), profile_dir="profiles"):
+        """Liga/desliga a coleta e define as etapas que devem ser perfiladas com cProfile."""
+        self.enabled = enabled
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+
+    def add_listener(self, listener):
+        """
+        Registra `listener(nome, elapsed)`, chamado no início (elapsed=None) e no fim de cada etapa
+        cronometrada (ex.: progresso ao vivo na interface gráfica). Uma exceção lançada no início
+        interrompe a etapa antes que ela comece.
+        """
+        self.listeners.append(listener)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.spans.clear()
+
+    def increment(self, name: str, value=1):
+        """Soma `value` ao contador `name` (não faz nada com a instrumentação desligada)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def span(self, name: str):
+        """Context manager que cronometra a etapa `name` (e a perfila, se ela estiver em `profile_stages`)."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._timed_span(name)
+
+    @contextlib.contextmanager
+    def _timed_span(self, name: str):
+        for listener in self.listeners:
+            listener(name, None)
+        # Apenas um cProfile pode estar ativo por vez: etapas aninhadas não são perfiladas de novo
+        profiler = None
+        if name in self.profile_stages and not self._profiling:
+            profiler, self._profiling = cProfile.Profile(), True
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                self._dump_profile(name, profiler)
+            with self._lock:
+                stats = self.spans.setdefault(name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+                stats['count'] += 1
+                stats['total_seconds'] += elapsed
+                stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+            logger.debug("span=%s seconds=%.6f", name, elapsed)
+            for listener in self.listeners:
+                listener(name, elapsed)
+
+    def _dump_profile(self, name: str, profiler: cProfile.Profile):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{name}.prof")
+        profiler.dump_stats(path)
+        logger.info("Perfil da etapa '%s' salvo em '%s' (abra com: python -m pstats %s).", name, path, path)
+
+    def merge(self, snapshot: dict):
+        """Soma ao registro os spans e contadores de um `snapshot` (ex.: vindo de outro processo)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, other in snapshot.get('spans', {}).items():
+                stats = self.spans.setdefault(name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+                stats['count'] += other['count']
+                stats['total_seconds'] += other['total_seconds']
+                stats['max_seconds'] = max(stats['max_seconds'], other['max_seconds'])
+            for name, value in snapshot.get('counters', {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        """Cópia dos spans e contadores atuais, no formato do arquivo JSON de métricas."""
+        with self._lock:
+            return {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'spans': {name: dict(stats) for name, stats in sorted(self.spans.items())},
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+    def prometheus_text(self) -> str:
+        """Exporta as métricas no formato texto do Prometheus (para o textfile collector do node_exporter)."""
+        data = self.snapshot()
+        lines = [
+            "# HELP stats777_stage_seconds_total Tempo total gasto em cada etapa do pipeline.",
+            "# TYPE stats777_stage_seconds_total counter",
+        ]
+        lines += [f'stats777_stage_seconds_total{{stage="{name}"}} {stats["total_seconds"]:.6f}' for name, stats in data['spans'].items()]
+        lines += [
+            "# HELP stats777_stage_runs_total Número de execuções de cada etapa do pipeline.",
+            "# TYPE stats777_stage_runs_total counter",
+        ]
+        lines += [f'stats777_stage_runs_total{{stage="{name}"}} {stats["count"]}' for name, stats in data['spans'].items()]
+        for name, value in data['counters'].items():
+            metric = f"stats777_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str):
+        _write_atomic(path, json.dumps(self.snapshot(), indent=2, ensure_ascii=False) + "\n")
+
+    def write_prometheus(self, path: str):
+        _write_atomic(path, self.prometheus_text())
+
+def _write_atomic(path: str, text: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+# Registro global usado pelos módulos do pipeline
+registry = MetricsRegistry()
+span = registry.span
+increment = registry.increment
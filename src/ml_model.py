@@ -1,18 +1,46 @@
 # src/ml_model.py
 
-from sklearn.linear_model import LogisticRegression
+import logging
+import warnings
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.preprocessing import StandardScaler
 import numpy as np
+from src import metrics
+from src.evaluation import evaluate_predictions
+
+logger = logging.getLogger(__name__)
+
+# Fração final (mais recente) do treino usada para medir o log-loss de referência do drift
+BASELINE_HOLDOUT_FRACTION = 0.1
 
 class MLModel:
     """
     Uma classe para encapsular o modelo de Machine Learning.
+
+    Com `incremental=True` a regressão logística do treino completo é transferida para um
+    `SGDClassifier` (gradiente estocástico), que pode ser atualizado só com as partidas novas
+    (`update`) sem refazer o treinamento com todo o histórico.
     """
-    def __init__(self):
+    def __init__(self, incremental=False):
+        self.incremental = incremental
         # O StandardScaler ajuda a normalizar nossas features, o que melhora o desempenho do modelo.
+        # No modo incremental ele também é atualizado em fluxo (média e variância acumuladas).
         self.scaler = StandardScaler()
         # A Regressão Logística é o nosso algoritmo de previsão.
-        self.model = LogisticRegression(solver='liblinear', random_state=42)
+        if incremental:
+            # Passo constante e pequeno: cada atualização ajusta a solução do treino completo sem descartá-la
+            self.model = SGDClassifier(loss='log_loss', learning_rate='constant', eta0=0.001, max_iter=1, tol=None, random_state=42)
+        else:
+            self.model = LogisticRegression(solver='liblinear', random_state=42)
+
+        # Monitoramento de drift: log-loss de referência (fora da amostra) e métricas acumuladas das partidas
+        # avaliadas pelas atualizações seguintes (faixa de probabilidade -> [n, soma prevista, soma observada])
+        self.baseline_log_loss = None
+        self._reset_drift()
+
+    def _reset_drift(self):
+        self.drift = {'matches': 0, 'log_loss_sum': 0.0, 'calibration': {}, 'updates': 0}
 
     def train(self, X_train: list, y_train: list):
         """
@@ -21,15 +49,105 @@ class MLModel:
         :param X_train: Lista de vetores de features.
         :param y_train: Lista de rótulos (resultados das partidas).
         """
-        print("Treinando o modelo de Machine Learning...")
-        
-        # Primeiro, ajustamos o scaler aos dados de treino e os transformamos.
-        X_scaled = self.scaler.fit_transform(X_train)
-        
-        # Depois, treinamos o modelo com os dados escalados.
-        self.model.fit(X_scaled, y_train)
-        
-        print("Treinamento do modelo de ML concluído.")
+        logger.info("Treinando o modelo de Machine Learning...")
+
+        with metrics.span('ml.train'):
+            # Primeiro, ajustamos o scaler aos dados de treino e os transformamos.
+            X_scaled = self.scaler.fit_transform(X_train)
+
+            # Depois, treinamos o modelo com os dados escalados.
+            self._fit(X_scaled, y_train)
+
+        self.baseline_log_loss = self._holdout_log_loss(X_train, y_train) if self.incremental else None
+        self._reset_drift()
+        logger.info("Treinamento do modelo de ML concluído.")
+
+    def _fit(self, X_scaled, y_train):
+        if self.incremental:
+            # A regressão logística exata inicializa o modelo incremental, que faz uma passada de ajuste
+            solution = LogisticRegression(solver='liblinear', random_state=42).fit(X_scaled, y_train)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', ConvergenceWarning)
+                self.model.fit(X_scaled, y_train, coef_init=solution.coef_, intercept_init=solution.intercept_)
+        else:
+            self.model.fit(X_scaled, y_train)
+
+    def _holdout_log_loss(self, X_train, y_train) -> float:
+        """
+        Log-loss de referência do drift: um modelo treinado da mesma forma com as partidas mais antigas
+        é avaliado na fração final do treino (em ordem cronológica), que ele não viu, como as partidas
+        avaliadas pelas atualizações. O log-loss no próprio treino seria otimista e anteciparia os retreinos.
+        """
+        X_train, y_train = np.asarray(X_train, dtype=float), np.asarray(y_train)
+        split = len(y_train) - int(len(y_train) * BASELINE_HOLDOUT_FRACTION)
+        if split == len(y_train) or len(np.unique(y_train[:split])) < 2:
+            # Treino pequeno demais para separar uma parte: usa o log-loss no próprio treino
+            return evaluate_predictions(y_train, self.predict_proba(X_train)[:, 1])['log_loss']
+        reference = MLModel(incremental=self.incremental)
+        reference._fit(reference.scaler.fit_transform(X_train[:split]), y_train[:split])
+        return evaluate_predictions(y_train[split:], reference.predict_proba(X_train[split:])[:, 1])['log_loss']
+
+    def update(self, X_new, y_new) -> dict:
+        """
+        Atualiza o scaler e o modelo só com as partidas novas (modo incremental).
+
+        Antes da atualização, o modelo atual é avaliado nas partidas novas (que ele ainda não viu);
+        essas métricas alimentam o monitoramento de drift (`drift_metrics`).
+
+        :return: Métricas das partidas novas antes da atualização (partidas, log-loss e Brier).
+        """
+        if not self.incremental:
+            raise ValueError("Atualização incremental requer um MLModel criado com incremental=True.")
+        X_new, y_new = np.asarray(X_new, dtype=float), np.asarray(y_new)
+        evaluation = evaluate_predictions(y_new, self.predict_proba(X_new)[:, 1])
+        self.drift['matches'] += evaluation['n']
+        self.drift['log_loss_sum'] += evaluation['log_loss'] * evaluation['n']
+        self.drift['updates'] += 1
+        for row in evaluation['calibration']:
+            totals = self.drift['calibration'].setdefault(row['bin'], [0, 0.0, 0.0])
+            totals[0] += row['n']
+            totals[1] += row['n'] * row['mean_predicted']
+            totals[2] += row['n'] * row['observed']
+
+        with metrics.span('ml.update'):
+            mean, scale = self.scaler.mean_.copy(), self.scaler.scale_.copy()
+            self.scaler.partial_fit(X_new)
+            # Reescreve os coeficientes na nova escala, para que a atualização do scaler por si só
+            # não altere as previsões; quem ajusta o modelo às partidas novas é o partial_fit.
+            coef = self.model.coef_.ravel()
+            self.model.intercept_ = self.model.intercept_ + np.sum(coef * (self.scaler.mean_ - mean) / scale)
+            self.model.coef_ = (coef * self.scaler.scale_ / scale).reshape(1, -1)
+            self.model.partial_fit(self.scaler.transform(X_new), y_new)
+
+        metrics.increment('ml_incremental_matches', evaluation['n'])
+        return {'matches': evaluation['n'], 'log_loss': evaluation['log_loss'], 'brier': evaluation['brier']}
+
+    def drift_metrics(self) -> dict:
+        """
+        Métricas das partidas avaliadas desde o último treinamento completo: log-loss acumulado,
+        log-loss de referência fora da amostra (`baseline_log_loss`) e erro de calibração esperado (diferença média,
+        ponderada por faixa de probabilidade, entre a probabilidade prevista e a frequência observada).
+        """
+        # Modelos salvos antes do monitoramento de drift não têm esses atributos
+        drift, baseline = getattr(self, 'drift', None) or {'matches': 0}, getattr(self, 'baseline_log_loss', None)
+        matches = drift['matches']
+        if not matches:
+            return {'matches': 0, 'updates': 0, 'log_loss': None, 'calibration_error': None, 'baseline_log_loss': baseline}
+        calibration_error = sum(abs(predicted - observed) for _, predicted, observed in drift['calibration'].values()) / matches
+        return {'matches': matches, 'updates': drift['updates'], 'log_loss': drift['log_loss_sum'] / matches,
+                'calibration_error': calibration_error, 'baseline_log_loss': baseline}
+
+    def needs_refit(self, max_log_loss_increase=0.02, max_calibration_error=0.05, min_matches=1000) -> bool:
+        """
+        Indica se o modelo se degradou desde o último treinamento completo: com pelo menos
+        `min_matches` partidas avaliadas, o log-loss acumulado subiu mais que `max_log_loss_increase`
+        em relação ao de referência, ou o erro de calibração passou de `max_calibration_error`.
+        """
+        drift = self.drift_metrics()
+        if drift['matches'] < min_matches or drift['baseline_log_loss'] is None:
+            return False
+        return (drift['log_loss'] - drift['baseline_log_loss'] > max_log_loss_increase
+                or drift['calibration_error'] > max_calibration_error)
 
     def predict_proba(self, X_predict: list) -> np.ndarray:
         """
@@ -42,4 +160,4 @@ class MLModel:
         X_scaled = self.scaler.transform(X_predict)
         
         # Fazemos a previsão de probabilidade.
-        return self.model.predict_proba(X_scaled)
\ No newline at end of file
+        return self.model.predict_proba(X_scaled)
@@ -0,0 +1,105 @@
+# src/model_bundle.py
+#
+# Formato compacto e versionado para os modelos treinados. O bundle guarda apenas arrays NumPy e
+# tipos simples (sem objetos do scikit-learn), então a inferência não precisa importar o sklearn.
+
+import os
+import pickle
+import numpy as np
+from src.elo_model import TennisEloModel
+from src.feature_engineering import FEATURE_NAMES
+
+BUNDLE_FORMAT = '777stats-model-bundle'
+BUNDLE_VERSION = 1
+
+class LogisticPredictor:
+    """
+    Preditor somente-NumPy equivalente a `MLModel` (StandardScaler + LogisticRegression binária).
+    """
+    def __init__(self, scaler_mean, scaler_scale, coef, intercept, feature_schema):
+        self.scaler_mean = np.asarray(scaler_mean, dtype=float)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=float)
+        self.coef = np.asarray(coef, dtype=float).ravel()
+        self.intercept = float(np.asarray(intercept, dtype=float).ravel()[0])
+        self.feature_schema = list(feature_schema)
+
+    def predict_proba(self, X_predict) -> np.ndarray:
+        """
+        Prevê a probabilidade de vitória, no mesmo formato de `MLModel.predict_proba`.
+
+        :param X_predict: Lista (ou lista de listas) de vetores de features para prever.
+        :return: Um array com as probabilidades [prob_derrota, prob_vitoria].
+        """
+        X_scaled = (np.asarray(X_predict, dtype=float) - self.scaler_mean) / self.scaler_scale
+        prob_win = 1 / (1 + np.exp(-(X_scaled @ self.coef + self.intercept)))
+        return np.column_stack([1 - prob_win, prob_win])
+
+def export_model_bundle(filename: str, ml_model, elo_model: TennisEloModel, circuit: str):
+    """
+    Extrai os parâmetros de um `MLModel` treinado e os salva, junto com o estado Elo, em um bundle.
+    Lança ValueError se o modelo não tiver uma feature por coluna de `FEATURE_NAMES`.
+    """
+    bundle = {
+        'format': BUNDLE_FORMAT,
+        'version': BUNDLE_VERSION,
+        'circuit': circuit,
+        'feature_schema': list(FEATURE_NAMES),
+        'scaler_mean': np.asarray(ml_model.scaler.mean_, dtype=float),
+        'scaler_scale': np.asarray(ml_model.scaler.scale_, dtype=float),
+        'coef': np.asarray(ml_model.model.coef_, dtype=float).ravel(),
+        'intercept': float(np.asarray(ml_model.model.intercept_).ravel()[0]),
+        'elo_state': elo_model.get_state(),
+    }
+    _check_shapes(bundle, filename)
+    _write_bundle(filename, bundle)
+
+def update_bundle_elo_state(filename: str, elo_model: TennisEloModel):
+    """
+    Substitui o estado Elo de um bundle existente (após uma atualização incremental do Elo).
+    Lança ValueError se o bundle foi treinado com outros parâmetros do Elo: o modelo de ML
+    aprendeu sobre features daqueles parâmetros e precisa ser treinado de novo.
+    """
+    bundle = _read_bundle(filename)
+    if bundle_elo_params(bundle) != elo_model.params():
+        raise ValueError(f"Bundle '{filename}' treinado com outros parâmetros do Elo: {bundle_elo_params(bundle)}")
+    bundle['elo_state'] = elo_model.get_state()
+    _write_bundle(filename, bundle)
+
+def load_model_bundle(filename: str, expected_schema=FEATURE_NAMES):
+    """
+    Carrega um bundle e retorna (LogisticPredictor, TennisEloModel).
+    Lança ValueError se o formato, a versão ou o esquema de features não forem compatíveis.
+    """
+    bundle = _read_bundle(filename)
+    if list(bundle['feature_schema']) != list(expected_schema):
+        raise ValueError(f"Esquema de features do bundle '{filename}' incompatível: {bundle['feature_schema']}")
+    _check_shapes(bundle, filename)
+    predictor = LogisticPredictor(bundle['scaler_mean'], bundle['scaler_scale'], bundle['coef'],
+                                  bundle['intercept'], bundle['feature_schema'])
+    return predictor, TennisEloModel.from_state(bundle['elo_state'])
+
+def bundle_elo_params(bundle: dict) -> dict:
+    """Parâmetros do Elo (`TennisEloModel.params`) com que o modelo do bundle foi treinado."""
+    return bundle['elo_state']['params']
+
+def _check_shapes(bundle: dict, filename: str):
+    """Confere se o scaler e os coeficientes têm uma posição por feature do esquema."""
+    num_features = len(bundle['feature_schema'])
+    shapes = {name: np.shape(bundle[name]) for name in ('scaler_mean', 'scaler_scale', 'coef')}
+    if any(shape[-1:] != (num_features,) for shape in shapes.values()):
+        raise ValueError(f"Parâmetros do bundle '{filename}' incompatíveis com o esquema de {num_features} features: {shapes}")
+
+def _read_bundle(filename: str) -> dict:
+    with open(filename, 'rb') as f:
+        bundle = pickle.load(f)
+    if not isinstance(bundle, dict) or bundle.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"'{filename}' não é um bundle de modelo do 777stats.")
+    if bundle.get('version') != BUNDLE_VERSION:
+        raise ValueError(f"Versão de bundle não suportada em '{filename}': {bundle.get('version')}")
+    return bundle
+
+def _write_bundle(filename: str, bundle: dict):
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'wb') as f:
+        pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, filename)
@@ -0,0 +1,92 @@
+# src/pipeline.py
+#
+# Orquestração dos circuitos em paralelo: cada circuito (ATP, WTA, ...) roda sua preparação
+# (carga do banco, Elo, features, treinamento do ML) em um processo próprio. Os circuitos só
+# compartilham o arquivo SQLite, que os processos apenas leem (conexões somente-leitura); a
+# sincronização, que escreve no banco, continua no processo principal antes da distribuição.
+#
+# As mensagens de log dos processos chegam ao processo principal por uma fila, prefixadas com o
+# circuito, e as métricas (spans e contadores) de cada circuito são somadas às do processo principal.
+
+import logging
+import logging.handlers
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+class _CircuitFormatter(logging.Formatter):
+    """Prefixa as mensagens com o circuito, mantendo as quebras de linha iniciais antes do prefixo."""
+    def __init__(self, circuit: str):
+        super().__init__("%(message)s")
+        self.prefix = f"[{circuit.upper()}] "
+
+    def format(self, record):
+        message = super().format(record)
+        stripped = message.lstrip('\n')
+        return message[:len(message) - len(stripped)] + self.prefix + stripped
+
+# Handler da fila de logs instalado em cada processo do pool
+_QUEUE_HANDLER = None
+
+def _init_worker(log_queue, log_level: int, metrics_settings: dict):
+    global _QUEUE_HANDLER
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _QUEUE_HANDLER = logging.handlers.QueueHandler(log_queue)
+    root.addHandler(_QUEUE_HANDLER)
+    root.setLevel(log_level)
+    metrics.registry.configure(**metrics_settings)
+
+def _run_task(task, circuit: str, profile_dir: str):
+    """Executa a tarefa de um circuito no processo do pool e devolve (resultado, métricas do circuito)."""
+    _QUEUE_HANDLER.setFormatter(_CircuitFormatter(circuit))
+    metrics.registry.reset()
+    # Perfis por circuito, para que os processos não sobrescrevam os arquivos uns dos outros
+    metrics.registry.profile_dir = os.path.join(profile_dir, circuit)
+    with metrics.span('pipeline.circuit'):
+        result = task(circuit)
+    return result, metrics.registry.snapshot()
+
+def run_circuits(task, circuits, max_workers=None) -> dict:
+    """
+    Executa `task(circuito)` para cada circuito e retorna {circuito: resultado}.
+
+    Com mais de um circuito e `max_workers` diferente de 1, cada circuito roda em um processo
+    (no máximo `max_workers`; padrão: um por circuito, limitado ao número de núcleos). `task` deve ser uma função de módulo
+    (serializável) e o resultado precisa ser serializável com pickle.
+    """
+    circuits = list(circuits)
+    workers = min(max_workers or os.cpu_count() or 1, len(circuits))
+    if workers <= 1 or len(circuits) == 1:
+        return {circuit: task(circuit) for circuit in circuits}
+
+    root = logging.getLogger()
+    log_queue = multiprocessing.Queue()
+    # Os registros chegam já formatados (com o prefixo do circuito) e seguem para os handlers do processo principal
+    listener = logging.handlers.QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    metrics_settings = {'enabled': metrics.registry.enabled, 'profile_stages': sorted(metrics.registry.profile_stages),
+                        'profile_dir': metrics.registry.profile_dir}
+    logger.info("Preparando %d circuitos em %d processos...", len(circuits), workers)
+
+    results, listening = {}, False
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(log_queue, root.getEffectiveLevel(), metrics_settings))
+    try:
+        futures = {circuit: executor.submit(_run_task, task, circuit, metrics.registry.profile_dir) for circuit in circuits}
+        # A thread que repassa os logs só é iniciada depois que os processos já foram criados
+        listener.start()
+        listening = True
+        for circuit, future in futures.items():
+            results[circuit], circuit_metrics = future.result()
+            metrics.registry.merge(circuit_metrics)
+    finally:
+        # Encerrar os processos antes do listener garante que as últimas mensagens da fila sejam exibidas
+        executor.shutdown(cancel_futures=True)
+        if listening:
+            listener.stop()
+        log_queue.close()
+    return results
@@ -0,0 +1,90 @@
+# src/prediction.py
+
+import logging
+import pandas as pd
+from src import metrics
+from src.elo_model import SURFACES
+from src.feature_engineering import create_feature_matrix
+from src.utils import get_h2h_records
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_COLUMNS = ['Circuit', 'Player 1', 'Player 2', 'Tournament', 'Surface', 'H2H P1', 'H2H P2', 'Prob P1']
+
+def predict_upcoming_matches(upcoming_matches: pd.DataFrame, ml_models: dict, elo_models: dict, resolvers: dict,
+                             conn=None, keep_index=False) -> pd.DataFrame:
+    """
+    Calcula a probabilidade de vitória do Jogador 1 para todas as partidas do dia de uma vez.
+
+    As partidas são agrupadas por circuito; para cada grupo os nomes são resolvidos em lote, o H2H
+    é lido com uma única consulta, a matriz de features é montada de forma vetorizada e o
+    scaler/classificador rodam uma única vez.
+
+    :param upcoming_matches: DataFrame no formato de `upcoming_matches.csv`
+        (colunas Circuit, Player 1, Player 2, Tournament, Surface).
+    :param ml_models: Dicionário {circuito: MLModel}.
+    :param elo_models: Dicionário {circuito: TennisEloModel}.
+    :param resolvers: Dicionário {circuito: PlayerNameResolver}.
+    :param conn: Conexão SQLite já aberta para as consultas de H2H (opcional).
+    :param keep_index: Mantém o índice de `upcoming_matches`, para relacionar cada previsão à sua entrada.
+    :return: DataFrame com as colunas de `PREDICTION_COLUMNS`, na ordem original das partidas.
+        Partidas com superfície desconhecida ou jogadores não resolvidos são descartadas; superfícies
+        fora de `SURFACES` (além do marcador 'Unknown' do scraper) também são registradas no log como erro.
+    """
+    if upcoming_matches.empty:
+        return pd.DataFrame(columns=PREDICTION_COLUMNS)
+
+    with metrics.span('prediction.batch'):
+        rows = _predict_by_circuit(upcoming_matches, ml_models, elo_models, resolvers, conn)
+    if not rows:
+        return pd.DataFrame(columns=PREDICTION_COLUMNS)
+    positions = sorted(rows)
+    predictions = pd.DataFrame([rows[position] for position in positions], columns=PREDICTION_COLUMNS,
+                               index=upcoming_matches.index[positions])
+    return predictions if keep_index else predictions.reset_index(drop=True)
+
+def _predict_by_circuit(upcoming_matches: pd.DataFrame, ml_models: dict, elo_models: dict, resolvers: dict, conn=None) -> dict:
+    """
+    Retorna {posição da partida em `upcoming_matches`: linha de `PREDICTION_COLUMNS`}.
+    Trabalha com listas simples: o lote do dia é pequeno e o custo fixo do pandas dominaria.
+    """
+    circuits = [str(circuit).lower() for circuit in upcoming_matches['Circuit'].tolist()]
+    players1 = upcoming_matches['Player 1'].tolist()
+    players2 = upcoming_matches['Player 2'].tolist()
+    tournaments = upcoming_matches['Tournament'].tolist()
+    surfaces = upcoming_matches['Surface'].tolist()
+
+    positions_by_circuit = {}
+    for position, circuit in enumerate(circuits):
+        positions_by_circuit.setdefault(circuit, []).append(position)
+
+    rows = {}
+    for circuit, positions in positions_by_circuit.items():
+        if ml_models.get(circuit) is None or circuit not in elo_models or circuit not in resolvers:
+            continue
+        invalid = [position for position in positions if surfaces[position] not in SURFACES]
+        for position in invalid:
+            if surfaces[position] != 'Unknown':
+                logger.error("Superfície inválida '%s' em %s x %s (%s): partida não avaliada.",
+                             surfaces[position], players1[position], players2[position], circuit.upper())
+        metrics.increment('invalid_surfaces', len(invalid))
+        positions = [position for position in positions if surfaces[position] in SURFACES]
+        resolver = resolvers[circuit]
+        p1_names = resolver.resolve_many([players1[position] for position in positions])
+        p2_names = resolver.resolve_many([players2[position] for position in positions])
+        metrics.increment('names_unresolved', p1_names.count(None) + p2_names.count(None))
+        resolved = [(position, p1, p2) for position, p1, p2 in zip(positions, p1_names, p2_names) if p1 is not None and p2 is not None]
+        if not resolved:
+            continue
+        positions, p1_names, p2_names = (list(values) for values in zip(*resolved))
+        match_surfaces = [surfaces[position] for position in positions]
+
+        h2h_records = get_h2h_records(circuit, list(zip(p1_names, p2_names)), conn=conn)
+        X = create_feature_matrix(p1_names, p2_names, match_surfaces, elo_models[circuit], h2h_records)
+        probabilities = ml_models[circuit].predict_proba(X)[:, 1]
+        metrics.increment('matches_scored', len(probabilities))
+
+        for position, p1, p2, surface, h2h, probability in zip(positions, p1_names, p2_names, match_surfaces, h2h_records, probabilities.tolist()):
+            rows[position] = [circuit.upper(), p1, p2, tournaments[position], surface,
+                              h2h['overall']['p1_wins'], h2h['overall']['p2_wins'], probability]
+    return rows
@@ -0,0 +1,193 @@
+# src/rating_history.py
+#
+# Histórico de ratings: a cada partida processada pelo Elo, o rating (Geral e desvio de Forma
+# Recente) de cada jogador após a partida é anexado ao log. O log fica em arrays ordenados por
+# uma chave composta (jogador, superfície, dia), então "qual era o Elo de X no saibro antes de
+# Roland Garros 2019" é uma busca binária (`np.searchsorted`), sem reprocessar o histórico, e
+# consultas em lote (um DataFrame de jogador/data) são uma única busca vetorizada.
+#
+# É gravado em data/ (.npz), ao lado do banco, com o checkpoint (rowid) do Elo que o gerou.
+
+import math
+import os
+import numpy as np
+import pandas as pd
+from src.elo_model import SURFACE_CODES, SURFACES, _to_day, encode_surfaces
+
+# Versão do formato gravado por `save`
+HISTORY_VERSION = 1
+
+# Chave composta: (jogador * superfícies + superfície) nos bits altos e o dia (deslocado para ficar
+# positivo, cobrindo datas anteriores a 1970) nos bits baixos
+_DAY_BITS = 21
+_DAY_OFFSET = 1 << (_DAY_BITS - 1)
+
+def _composite_keys(player_idx: np.ndarray, surface_codes: np.ndarray, days: np.ndarray) -> np.ndarray:
+    groups = np.asarray(player_idx, dtype=np.int64) * len(SURFACES) + surface_codes
+    return (groups << _DAY_BITS) + (np.asarray(days, dtype=np.int64) + _DAY_OFFSET)
+
+def _to_days(dates) -> np.ndarray:
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+class RatingHistory:
+    """
+    Log de ratings por jogador, superfície e partida, em ordem cronológica.
+
+    As partidas são registradas pelo `TennisEloModel` (`record`, chamado durante o treinamento);
+    as consultas usam os nomes de `player_names` (o mesmo índice de jogadores do modelo Elo).
+    """
+    def __init__(self, base_rating=1500, decay_days=180):
+        self.base_rating = base_rating
+        self.decay_days = decay_days
+        self.player_names = []
+        self.last_rowid = 0
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._ratings = np.zeros(0)
+        self._forms = np.zeros(0)
+        self._pending = []
+        self._name_to_index = None
+
+    def __len__(self) -> int:
+        return len(self._keys) + sum(len(keys) for keys, _, _ in self._pending)
+
+    def record(self, surface_codes, winner_idx, loser_idx, days, after: list, player_names: list):
+        """
+        Anexa as partidas de um bloco de treinamento.
+
+        :param after: Por partida com Elo (superfície conhecida), (rating do vencedor, rating do
+            perdedor, desvio de forma do vencedor, desvio de forma do perdedor) após a partida.
+        :param player_names: Nomes dos jogadores por índice (do modelo Elo).
+        """
+        self.player_names = player_names
+        self._name_to_index = None
+        valid = surface_codes >= 0
+        if not valid.any():
+            return
+        after = np.asarray(after, dtype=float).reshape(-1, 4)
+        players = np.column_stack([winner_idx[valid], loser_idx[valid]]).ravel()
+        surfaces = np.repeat(surface_codes[valid], 2)
+        keys = _composite_keys(players, surfaces, np.repeat(days[valid], 2))
+        self._pending.append((keys, after[:, 0:2].ravel(), after[:, 2:4].ravel()))
+
+    def _consolidate(self):
+        """Junta as partidas pendentes ao log ordenado (a ordenação estável preserva a ordem das partidas de um mesmo dia)."""
+        if not self._pending:
+            return
+        keys = np.concatenate([self._keys] + [keys for keys, _, _ in self._pending])
+        ratings = np.concatenate([self._ratings] + [ratings for _, ratings, _ in self._pending])
+        forms = np.concatenate([self._forms] + [forms for _, _, forms in self._pending])
+        order = np.argsort(keys, kind='stable')
+        self._keys, self._ratings, self._forms = keys[order], ratings[order], forms[order]
+        self._pending = []
+
+    def _player_indices(self, player_names) -> np.ndarray:
+        if self._name_to_index is None:
+            self._name_to_index = {name: index for index, name in enumerate(self.player_names)}
+        lookup = self._name_to_index.get
+        return np.fromiter((lookup(name, -1) for name in player_names), dtype=np.int64, count=len(player_names))
+
+    def ratings_as_of(self, player_names, surfaces, dates, recent=False) -> np.ndarray:
+        """
+        Ratings de vários (jogador, superfície, data) de uma vez: o rating após a última partida do
+        jogador na superfície estritamente antes da data (o rating inicial, se não houver nenhuma).
+        Com `recent=True`, a Forma Recente daquela partida é decaída até a data.
+        """
+        self._consolidate()
+        indices = self._player_indices(list(player_names))
+        codes = encode_surfaces(surfaces)
+        days = _to_days(dates)
+        ratings = np.full(len(indices), float(self.base_rating))
+        valid = (indices >= 0) & (codes >= 0)
+        if not valid.any() or not len(self._keys):
+            return ratings
+
+        # Última entrada com chave menor que (jogador, superfície, dia): a busca binária cai na primeira
+        # partida do próprio dia ou depois dele
+        query = _composite_keys(indices[valid], codes[valid], days[valid])
+        positions = np.searchsorted(self._keys, query, side='left') - 1
+        clipped = np.maximum(positions, 0)
+        found = (positions >= 0) & ((self._keys[clipped] >> _DAY_BITS) == (query >> _DAY_BITS))
+        values = np.where(found, self._ratings[clipped], self.base_rating).astype(float)
+        if recent:
+            entry_days = (self._keys[clipped] & ((1 << _DAY_BITS) - 1)) - _DAY_OFFSET
+            values += np.where(found, self._forms[clipped] * np.exp(-(days[valid] - entry_days) / self.decay_days), 0.0)
+        ratings[valid] = values
+        return ratings
+
+    def rating_as_of(self, player_name: str, surface: str, date, recent=False) -> float:
+        """Rating do jogador na superfície antes da data (ex.: antes do início de um torneio)."""
+        self._consolidate()
+        index = self._player_indices([player_name])[0]
+        code = SURFACE_CODES.get(surface, -1)
+        if index < 0 or code < 0:
+            return float(self.base_rating)
+        # Mesma busca de `ratings_as_of`, sem o custo fixo das conversões vetorizadas
+        group = int(index) * len(SURFACES) + code
+        day = _to_day(date)
+        position = int(np.searchsorted(self._keys, (group << _DAY_BITS) + day + _DAY_OFFSET)) - 1
+        if position < 0 or int(self._keys[position]) >> _DAY_BITS != group:
+            return float(self.base_rating)
+        rating = float(self._ratings[position])
+        if recent:
+            entry_day = (int(self._keys[position]) & ((1 << _DAY_BITS) - 1)) - _DAY_OFFSET
+            rating += float(self._forms[position]) * math.exp(-(day - entry_day) / self.decay_days)
+        return rating
+
+    def join_as_of(self, df: pd.DataFrame, player_column='player', date_column='date', surface_column='surface',
+                   surface: str = None) -> pd.DataFrame:
+        """
+        Junção "as-of" de um DataFrame de (jogador, data[, superfície]) com o histórico: retorna uma
+        cópia com as colunas 'elo_geral' e 'elo_recente' na data de cada linha. `surface` fixa a
+        superfície de todas as linhas.
+        """
+        surfaces = [surface] * len(df) if surface is not None else df[surface_column].tolist()
+        players, dates = df[player_column].tolist(), df[date_column]
+        result = df.copy()
+        result['elo_geral'] = self.ratings_as_of(players, surfaces, dates)
+        result['elo_recente'] = self.ratings_as_of(players, surfaces, dates, recent=True)
+        return result
+
+    def trajectory(self, player_name: str, surface: str) -> pd.DataFrame:
+        """Evolução do rating do jogador na superfície: uma linha por partida (data, Elo Geral, desvio de forma)."""
+        self._consolidate()
+        index = self._player_indices([player_name])[0]
+        if index < 0 or surface not in SURFACE_CODES:
+            return pd.DataFrame(columns=['date', 'elo_geral', 'forma'])
+        group = index * len(SURFACES) + SURFACE_CODES[surface]
+        start, end = np.searchsorted(self._keys, [group << _DAY_BITS, (group + 1) << _DAY_BITS])
+        days = (self._keys[start:end] & ((1 << _DAY_BITS) - 1)) - _DAY_OFFSET
+        return pd.DataFrame({'date': days.astype('datetime64[D]'), 'elo_geral': self._ratings[start:end],
+                             'forma': self._forms[start:end]})
+
+    def save(self, path: str, last_rowid: int):
+        """Grava o histórico em .npz, com o checkpoint (rowid) do modelo Elo que o gerou."""
+        self._consolidate()
+        self.last_rowid = int(last_rowid)
+        temp_path = f"{path}.tmp.npz"
+        np.savez(temp_path, version=HISTORY_VERSION, keys=self._keys, ratings=self._ratings, forms=self._forms,
+                 players=np.array(self.player_names, dtype=str), base_rating=self.base_rating,
+                 decay_days=self.decay_days, last_rowid=self.last_rowid)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'RatingHistory':
+        """Carrega um histórico gravado por `save`."""
+        with np.load(path, allow_pickle=False) as saved:
+            if int(saved['version']) != HISTORY_VERSION:
+                raise ValueError(f"Versão de histórico de ratings incompatível: {int(saved['version'])}")
+            history = cls(base_rating=float(saved['base_rating']), decay_days=float(saved['decay_days']))
+            history._keys, history._ratings, history._forms = saved['keys'], saved['ratings'], saved['forms']
+            history.player_names = saved['players'].tolist()
+            history.last_rowid = int(saved['last_rowid'])
+        return history
+
+    @staticmethod
+    def saved_checkpoint(path: str):
+        """Checkpoint (rowid) de um histórico gravado, lendo só esse campo do arquivo (None se ausente ou inválido)."""
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                if int(saved['version']) != HISTORY_VERSION:
+                    return None
+                return int(saved['last_rowid'])
+        except (OSError, ValueError, KeyError):
+            return None
@@ -0,0 +1,171 @@
+# src/scraper.py
+#
+# Coleta da agenda de jogos do flashscore.mobi. A página móvel é HTML estático, então o modo padrão
+# usa uma requisição HTTP simples; o navegador (Selenium) só é aberto quando a requisição falha ou
+# não traz nenhum jogo, e é reaproveitado entre as páginas de uma mesma execução.
+#
+# O parser não depende da rede: recebe o HTML (ex.: uma página salva em disco) e faz uma única
+# passada pelo documento, guardando o último cabeçalho de torneio (<h4>) visto.
+
+import logging
+import lxml.html
+from src.utils import get_surface_from_tournament
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_COLUMNS = ["Circuit", "Player 1", "Player 2", "Tournament", "Surface"]
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+
+FETCH_MODES = ('auto', 'http', 'browser')
+
+def parse_schedule_html(html_source) -> list:
+    """
+    Extrai os jogos agendados de uma página do flashscore.mobi.
+
+    Cada jogo é um link `a.sched` precedido pelo texto "Jogador 1 - Jogador 2"; o torneio é o
+    último <h4> que apareceu antes dele no documento.
+
+    :param html_source: HTML da página (str ou bytes).
+    :return: Lista de dicionários com as colunas de `SCHEDULE_COLUMNS`.
+    """
+    if not html_source:
+        return []
+    root = lxml.html.fromstring(html_source)
+
+    matches = []
+    tournament_name, circuit, surface = "Desconhecido", 'ATP', get_surface_from_tournament("Desconhecido")
+    for element in root.iter('h4', 'a'):
+        if element.tag == 'h4':
+            # Circuito e superfície são calculados uma vez por torneio, não por jogo
+            tournament_name = element.text_content().strip()
+            circuit = 'WTA' if "wta" in tournament_name.lower() else 'ATP'
+            surface = get_surface_from_tournament(tournament_name)
+            continue
+        if 'sched' not in (element.get('class') or '').split():
+            continue
+
+        # O texto imediatamente antes do link é a "cauda" do irmão anterior (ou o texto do pai)
+        previous = element.getprevious()
+        players_text = previous.tail if previous is not None else element.getparent().text
+        if not players_text or ' - ' not in players_text:
+            continue
+        players = [player.strip() for player in players_text.split(' - ')]
+        if len(players) != 2 or not all(players):
+            continue
+
+        matches.append({
+            "Circuit": circuit,
+            "Player 1": players[0],
+            "Player 2": players[1],
+            "Tournament": tournament_name,
+            "Surface": surface,
+        })
+    return matches
+
+def fetch_page_http(url: str, session=None, timeout=20) -> str:
+    """Baixa a página com uma requisição HTTP simples (sem navegador)."""
+    import requests # Importação tardia: o parser não precisa do cliente HTTP
+    session = session or requests.Session()
+    response = session.get(url, headers={'User-Agent': USER_AGENT}, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+class BrowserPool:
+    """
+    Driver do Chrome (headless) criado sob demanda e reaproveitado por todas as páginas de uma
+    execução. Use como context manager para garantir o `quit()` no final.
+    """
+    def __init__(self, driver_path=None, wait_seconds=15):
+        self.driver_path = driver_path
+        self.wait_seconds = wait_seconds
+        self._driver = None
+
+    def _get_driver(self):
+        if self._driver is None:
+            # Importações tardias: o Selenium só é carregado quando o navegador é realmente necessário
+            from selenium import webdriver
+            from selenium.webdriver.chrome.options import Options
+            from selenium.webdriver.chrome.service import Service as ChromeService
+
+            chrome_options = Options()
+            chrome_options.add_argument("--headless")
+            chrome_options.add_argument("--no-sandbox")
+            chrome_options.add_argument("--disable-dev-shm-usage")
+            chrome_options.add_argument("--disable-gpu")
+            chrome_options.add_argument("log-level=3")
+            chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+            chrome_options.add_argument(f"user-agent={USER_AGENT}")
+
+            driver_path = self.driver_path
+            if not driver_path:
+                from webdriver_manager.chrome import ChromeDriverManager
+                driver_path = ChromeDriverManager().install()
+            logger.info("Iniciando o navegador headless...")
+            self._driver = webdriver.Chrome(service=ChromeService(driver_path), options=chrome_options)
+        return self._driver
+
+    def fetch(self, url: str) -> str:
+        """Navega até a URL e espera até que um link de jogo agendado apareça."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        driver = self._get_driver()
+        logger.info("Acessando %s pelo navegador e aguardando conteúdo...", url)
+        driver.get(url)
+        try:
+            WebDriverWait(driver, self.wait_seconds).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'a.sched')))
+        except Exception as e:
+            logger.warning("Erro ao esperar pelo conteúdo da página: %s", e)
+            return ""
+        return driver.page_source
+
+    def close(self):
+        if self._driver is not None:
+            self._driver.quit()
+            self._driver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def scrape_schedule(urls, mode='auto', browser: BrowserPool = None) -> list:
+    """
+    Coleta os jogos de uma ou mais páginas de agenda.
+
+    :param mode: 'http' (só requisição simples), 'browser' (só Selenium) ou 'auto' (HTTP e, se a
+        requisição falhar ou não trouxer jogos, o navegador).
+    :param browser: `BrowserPool` compartilhado entre as páginas (criado aqui se não for informado).
+    """
+    if mode not in FETCH_MODES:
+        raise ValueError(f"Modo de coleta inválido: '{mode}' (use um de {', '.join(FETCH_MODES)}).")
+
+    own_browser = browser is None
+    browser = browser or BrowserPool()
+    session = None
+    matches = []
+    try:
+        for url in urls:
+            page_matches = []
+            if mode in ('auto', 'http'):
+                import requests
+                session = session or requests.Session()
+                try:
+                    logger.info("Acessando %s via HTTP...", url)
+                    page_matches = parse_schedule_html(fetch_page_http(url, session))
+                except requests.exceptions.RequestException as e:
+                    logger.warning("Falha na requisição HTTP para %s: %s", url, e)
+                if mode == 'auto' and not page_matches:
+                    logger.info("Nenhum jogo encontrado via HTTP; tentando com o navegador.")
+            if mode == 'browser' or (mode == 'auto' and not page_matches):
+                page_matches = parse_schedule_html(browser.fetch(url))
+            logger.info("%d jogos encontrados em %s.", len(page_matches), url)
+            matches.extend(page_matches)
+    finally:
+        if own_browser:
+            browser.close()
+    return matches
@@ -0,0 +1,338 @@
+# src/server.py
+#
+# Servidor HTTP local de previsões. Carrega uma única vez os bundles (preditor + estado Elo), os
+# resolvedores de nomes e um conjunto de conexões somente-leitura ao banco (índice de H2H), e os
+# mantém em memória entre as requisições. Funciona sem internet: nada é sincronizado ou treinado aqui.
+#
+#   GET  /                -> dashboard (templates/index.html) com os jogos de upcoming_matches.csv
+#   GET  /api/health      -> circuitos carregados e versão dos artefatos
+#   GET  /api/predict?circuit=atp&player1=...&player2=...&surface=Hard   (ou &tournament=...)
+#   POST /api/predict     -> {"matches": [{"circuit", "player1", "player2", "surface" | "tournament"}, ...]}
+
+import contextlib
+import json
+import logging
+import os
+import pickle
+import queue
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+from src import metrics
+from src.data_handler import DB_PATH, connect_read_only
+from src.elo_model import SURFACES
+from src.model_bundle import load_model_bundle
+from src.prediction import predict_upcoming_matches
+from src.utils import PlayerNameResolver, get_surface_from_tournament
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_HEADERS = ["Circuito", "Jogador 1", "Jogador 2", "Superfície", "H2H Geral", "Prob. P1 (ML)"]
+
+# Limite do corpo de um POST (um lote de alguns milhares de partidas cabe com folga)
+MAX_BODY_BYTES = 2 * 1024 * 1024
+
+def surface_error(match: dict):
+    """Mensagem de erro se a partida informar uma superfície sem Elo (None se estiver ausente ou for válida)."""
+    surface = match.get('surface')
+    if surface not in (None, '') and str(surface).capitalize() not in SURFACES:
+        return f"superfície inválida '{surface}' (use {', '.join(SURFACES)})"
+    return None
+
+class LoadedCircuit(NamedTuple):
+    predictor: object
+    elo_model: object
+    resolver: PlayerNameResolver
+    mtime_ns: int
+    loaded_at: datetime
+
+class ModelStore:
+    """
+    Artefatos de inferência de cada circuito, recarregados quando o bundle muda no disco.
+
+    A cada recarga o dicionário `circuits` é substituído por inteiro, então as requisições
+    o leem sem lock e sempre enxergam uma versão consistente (preditor, Elo e resolvedor juntos).
+    """
+    def __init__(self, bundle_filenames: dict):
+        self.bundle_filenames = bundle_filenames
+        self.circuits = {}
+        self.generation = 0
+        self._reload_lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Recarrega os bundles cuja data de modificação mudou. Retorna True se algo mudou."""
+        with self._reload_lock:
+            circuits, changed = dict(self.circuits), False
+            for circuit, filename in self.bundle_filenames.items():
+                try:
+                    mtime_ns = os.stat(filename).st_mtime_ns
+                except FileNotFoundError:
+                    if circuits.pop(circuit, None) is not None:
+                        logger.warning("Bundle (%s) '%s' removido; circuito indisponível.", circuit.upper(), filename)
+                        changed = True
+                    continue
+                current = circuits.get(circuit)
+                if current is not None and current.mtime_ns == mtime_ns:
+                    continue
+                try:
+                    with metrics.span('server.load_bundle'):
+                        predictor, elo_model = load_model_bundle(filename)
+                        resolver = PlayerNameResolver(elo_model.known_players())
+                except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+                    logger.warning("Bundle (%s) '%s' não pôde ser carregado; mantendo a versão anterior: %s", circuit.upper(), filename, e)
+                    continue
+                circuits[circuit] = LoadedCircuit(predictor, elo_model, resolver, mtime_ns, datetime.now())
+                changed = True
+                logger.info("Modelo (%s) carregado de '%s'.", circuit.upper(), filename)
+            if changed:
+                self.circuits = circuits
+                self.generation += 1
+            return changed
+
+    def watch(self, interval: float, stop_event: threading.Event):
+        """Laço da thread de recarga: verifica os bundles a cada `interval` segundos."""
+        while not stop_event.wait(interval):
+            self.refresh()
+
+class ConnectionPool:
+    """Conexões SQLite somente-leitura reaproveitadas entre as requisições (consultas de H2H)."""
+    def __init__(self, db_path: str = DB_PATH, size: int = 4):
+        self._pool = queue.Queue()
+        self.available = os.path.exists(db_path)
+        if self.available:
+            for _ in range(size):
+                self._pool.put(connect_read_only(db_path, check_same_thread=False))
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Empresta uma conexão do pool (None se o banco não existir)."""
+        if not self.available:
+            yield None
+            return
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+class PredictionService:
+    """Lógica das rotas: previsões em lote sobre os modelos em memória e renderização do dashboard."""
+    def __init__(self, store: ModelStore, pool: ConnectionPool, upcoming_csv="upcoming_matches.csv", templates_dir="templates"):
+        self.store = store
+        self.pool = pool
+        self.upcoming_csv = upcoming_csv
+        self.templates_dir = templates_dir
+        self._template = None
+        self._dashboard_cache = (None, None)
+        self._dashboard_lock = threading.Lock()
+
+    def predict(self, matches: list) -> list:
+        """
+        Calcula as probabilidades de uma lista de partidas ({"circuit", "player1", "player2",
+        "surface" ou "tournament"}). Retorna um resultado por entrada, na mesma ordem; entradas
+        que não puderam ser avaliadas trazem o campo "error".
+        """
+        circuits = self.store.circuits
+        rows = []
+        for match in matches:
+            tournament = str(match.get('tournament') or '')
+            surface = match.get('surface') or (get_surface_from_tournament(tournament) if tournament else 'Unknown')
+            rows.append({
+                'Circuit': str(match.get('circuit', '')).upper(),
+                'Player 1': str(match.get('player1', '')),
+                'Player 2': str(match.get('player2', '')),
+                'Tournament': tournament,
+                'Surface': str(surface).capitalize(),
+            })
+        if not rows:
+            return []
+
+        upcoming = pd.DataFrame(rows)
+        with self.pool.connection() as conn:
+            predictions = predict_upcoming_matches(
+                upcoming,
+                {circuit: loaded.predictor for circuit, loaded in circuits.items()},
+                {circuit: loaded.elo_model for circuit, loaded in circuits.items()},
+                {circuit: loaded.resolver for circuit, loaded in circuits.items()},
+                conn=conn, keep_index=True,
+            )
+
+        by_position = predictions.to_dict('index')
+        results = []
+        for position, row in enumerate(rows):
+            prediction = by_position.get(position)
+            if prediction is not None:
+                results.append({
+                    'circuit': prediction['Circuit'],
+                    'player1': prediction['Player 1'],
+                    'player2': prediction['Player 2'],
+                    'tournament': prediction['Tournament'],
+                    'surface': prediction['Surface'],
+                    'h2h_p1': int(prediction['H2H P1']),
+                    'h2h_p2': int(prediction['H2H P2']),
+                    'prob_p1': float(prediction['Prob P1']),
+                    'prob_p2': float(1 - prediction['Prob P1']),
+                })
+            else:
+                results.append({'circuit': row['Circuit'], 'player1': row['Player 1'], 'player2': row['Player 2'],
+                                'error': self._explain_failure(circuits, row)})
+        return results
+
+    @staticmethod
+    def _explain_failure(circuits: dict, row: dict) -> str:
+        loaded = circuits.get(row['Circuit'].lower())
+        if loaded is None:
+            return f"circuito '{row['Circuit']}' sem modelo carregado"
+        if row['Surface'] == 'Unknown':
+            return "superfície desconhecida (informe 'surface' ou um 'tournament' conhecido)"
+        if row['Surface'] not in SURFACES:
+            return surface_error({'surface': row['Surface']})
+        missing = [name for name in (row['Player 1'], row['Player 2']) if loaded.resolver.resolve(name) is None]
+        return f"jogador não encontrado: {', '.join(missing)}" if missing else "partida não avaliada"
+
+    def render_dashboard(self) -> str:
+        """Renderiza o dashboard com os jogos do dia (refeito só quando o CSV ou os modelos mudam)."""
+        try:
+            csv_version = os.stat(self.upcoming_csv).st_mtime_ns
+        except FileNotFoundError:
+            csv_version = None
+        version = (csv_version, self.store.generation)
+        with self._dashboard_lock:
+            if self._dashboard_cache[0] == version:
+                return self._dashboard_cache[1]
+
+            results, error_message = [], None
+            if csv_version is None:
+                error_message = f"Arquivo '{self.upcoming_csv}' não encontrado. Execute 'scrape_matches.py' primeiro."
+            else:
+                upcoming = pd.read_csv(self.upcoming_csv)
+                matches = [{'circuit': row['Circuit'], 'player1': row['Player 1'], 'player2': row['Player 2'],
+                            'tournament': row['Tournament'], 'surface': row['Surface']} for _, row in upcoming.iterrows()]
+                results = [
+                    [p['circuit'], p['player1'], p['player2'], p['surface'], f"{p['h2h_p1']} - {p['h2h_p2']}", f"{p['prob_p1']:.2%}"]
+                    for p in self.predict(matches) if 'error' not in p
+                ]
+            html = self._get_template().render(headers=DASHBOARD_HEADERS, results=results, error_message=error_message)
+            self._dashboard_cache = (version, html)
+            return html
+
+    def _get_template(self):
+        if self._template is None:
+            from jinja2 import Environment, FileSystemLoader, select_autoescape # Importação tardia: só o dashboard usa o Jinja
+            environment = Environment(loader=FileSystemLoader(self.templates_dir), autoescape=select_autoescape(['html']))
+            self._template = environment.get_template('index.html')
+        return self._template
+
+    def health(self) -> dict:
+        return {
+            'status': 'ok',
+            'generation': self.store.generation,
+            'database': self.pool.available,
+            'circuits': {
+                circuit: {'players': len(loaded.resolver.known_players), 'loaded_at': loaded.loaded_at.isoformat(timespec='seconds')}
+                for circuit, loaded in self.store.circuits.items()
+            },
+        }
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    server_version = "777stats"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        service = self.server.service
+        metrics.increment('server_requests')
+        with metrics.span('server.request'):
+            if url.path in ('/', '/index.html'):
+                self._send(200, service.render_dashboard().encode('utf-8'), 'text/html; charset=utf-8')
+            elif url.path == '/api/health':
+                self._send_json(200, service.health())
+            elif url.path == '/api/predict':
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                if not params.get('player1') or not params.get('player2') or not params.get('circuit'):
+                    self._send_json(400, {'error': "parâmetros obrigatórios: circuit, player1, player2 (e surface ou tournament)"})
+                    return
+                error = surface_error(params)
+                if error:
+                    self._send_json(400, {'error': error})
+                    return
+                self._send_json(200, service.predict([params])[0])
+            else:
+                self._send_json(404, {'error': 'rota não encontrada'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        metrics.increment('server_requests')
+        if url.path != '/api/predict':
+            self._send_json(404, {'error': 'rota não encontrada'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {'error': f'corpo da requisição maior que {MAX_BODY_BYTES} bytes'})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'JSON inválido'})
+            return
+        matches = payload.get('matches', [payload]) if isinstance(payload, dict) else payload
+        if not isinstance(matches, list) or not all(isinstance(match, dict) for match in matches):
+            self._send_json(400, {'error': "envie {\"matches\": [{...}, ...]} ou uma única partida"})
+            return
+        errors = [f"partida {position}: {error}" for position, error in enumerate(map(surface_error, matches)) if error]
+        if errors:
+            self._send_json(400, {'error': "; ".join(errors)})
+            return
+        with metrics.span('server.request'):
+            self._send_json(200, {'predictions': self.server.service.predict(matches)})
+
+    def _send_json(self, status: int, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: PredictionService):
+        super().__init__(address, PredictionRequestHandler)
+        self.service = service
+
+def serve(bundle_filenames: dict, host="127.0.0.1", port=8777, reload_interval=2.0, db_connections=4,
+          upcoming_csv="upcoming_matches.csv", templates_dir="templates"):
+    """Carrega os modelos e atende requisições até ser interrompido (Ctrl+C)."""
+    store = ModelStore(bundle_filenames)
+    if not store.circuits:
+        logger.warning("Nenhum bundle de modelo encontrado. Execute 'python main.py train' para gerá-los.")
+    pool = ConnectionPool(DB_PATH, size=db_connections)
+    service = PredictionService(store, pool, upcoming_csv=upcoming_csv, templates_dir=templates_dir)
+
+    stop_event = threading.Event()
+    watcher = threading.Thread(target=store.watch, args=(reload_interval, stop_event), daemon=True)
+    watcher.start()
+    server = PredictionServer((host, port), service)
+    logger.info("Servidor do 777stats ouvindo em http://%s:%d (Ctrl+C para encerrar).", host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Encerrando o servidor...")
+    finally:
+        stop_event.set()
+        server.server_close()
+        pool.close()
@@ -0,0 +1,162 @@
+# src/sync.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src import metrics
+from src.data_handler import DATA_DIR, DEFAULT_BASE_URL, parse_matches_csv, insert_matches
+
+CACHE_INDEX_PATH = os.path.join(DATA_DIR, "http_cache.json")
+
+logger = logging.getLogger(__name__)
+
+_thread_local = threading.local()
+
+def _get_session() -> requests.Session:
+    """Uma sessão HTTP por thread, para reaproveitar conexões sem compartilhar estado entre threads."""
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = _thread_local.session = requests.Session()
+    return session
+
+class HttpCache:
+    """
+    Cache HTTP em disco: para cada URL guarda ETag, Last-Modified, hash SHA-256 e tamanho do
+    último conteúdo ingerido. O conteúdo em si não é guardado; as partidas já estão no banco.
+    """
+    def __init__(self, path=CACHE_INDEX_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, url: str) -> dict:
+        return self.entries.get(url, {})
+
+    def update(self, url: str, response: requests.Response, content: bytes):
+        self.entries[url] = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'sha256': hashlib.sha256(content).hexdigest(),
+            'size': len(content),
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+def fetch_file(url: str, cache_entry: dict):
+    """
+    Baixa um arquivo com requisição condicional. Retorna (status, resposta, conteúdo), onde status é
+    'unchanged' (304 ou mesmo hash), 'not_found' (404) ou 'changed'.
+    """
+    headers = {}
+    if cache_entry.get('etag'):
+        headers['If-None-Match'] = cache_entry['etag']
+    if cache_entry.get('last_modified'):
+        headers['If-Modified-Since'] = cache_entry['last_modified']
+
+    response = _get_session().get(url, headers=headers, timeout=60)
+    if response.status_code == 304:
+        return 'unchanged', response, None
+    if response.status_code == 404:
+        return 'not_found', response, None
+    response.raise_for_status()
+
+    content = response.content
+    if cache_entry.get('sha256') == hashlib.sha256(content).hexdigest():
+        return 'unchanged', response, content
+    return 'changed', response, content
+
+def delta_content(content: bytes, cache_entry: dict) -> bytes:
+    """
+    Se o arquivo novo apenas acrescentou linhas ao final do conteúdo já ingerido, retorna
+    cabeçalho + linhas novas; caso contrário retorna o conteúdo completo.
+    """
+    size = cache_entry.get('size')
+    if not size or size >= len(content) or content[size - 1:size] != b'\n':
+        return content
+    if hashlib.sha256(content[:size]).hexdigest() != cache_entry.get('sha256'):
+        return content
+    header = content[:content.index(b'\n') + 1]
+    return header + content[size:]
+
+def sync_circuits(conn, years_by_circuit: dict, base_url=DEFAULT_BASE_URL, max_workers=8, ignore_cache_for=()) -> dict:
+    """
+    Baixa em paralelo todos os arquivos (circuito, ano) pendentes e insere os novos dados
+    pela thread principal, que é a única a escrever no SQLite.
+
+    :param years_by_circuit: Dicionário {circuito: lista de anos}.
+    :param ignore_cache_for: Circuitos cujo cache HTTP deve ser ignorado (ex.: tabela recriada do zero).
+    :return: Contagens agregadas por circuito: arquivos baixados/inalterados/com falha e linhas inseridas/ignoradas.
+    """
+    cache = HttpCache()
+    jobs, cache_entries = {}, {}
+    for circuit, years in years_by_circuit.items():
+        for year in years:
+            url = f"{base_url.format(circuit=circuit)}{circuit}_matches_{year}.csv"
+            jobs[(circuit, year)] = url
+            cache_entries[url] = {} if circuit in ignore_cache_for else cache.get(url)
+
+    totals = {circuit: {'downloaded': 0, 'unchanged': 0, 'failed': 0, 'inserted': 0, 'ignored': 0} for circuit in years_by_circuit}
+    with metrics.span('sync.circuits'), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_file, url, cache_entries[url]): (circuit, year)
+            for (circuit, year), url in jobs.items()
+        }
+        for future in as_completed(futures):
+            circuit, year = futures[future]
+            url = jobs[(circuit, year)]
+            label = f"{year} ({circuit.upper()})"
+            try:
+                status, response, content = future.result()
+            except requests.exceptions.RequestException as e:
+                logger.error("Erro HTTP ao baixar dados de %s: %s", label, e)
+                totals[circuit]['failed'] += 1
+                metrics.increment('files_failed')
+                continue
+
+            if status == 'not_found':
+                logger.info("Dados para o ano %s ainda não disponíveis (404 Not Found).", label)
+                continue
+            if status == 'unchanged':
+                if content is not None:
+                    # 200 com o mesmo conteúdo: guarda o novo ETag/Last-Modified para a próxima requisição ser condicional
+                    cache.update(url, response, content)
+                totals[circuit]['unchanged'] += 1
+                metrics.increment('files_unchanged')
+                logger.info("Dados de %s inalterados desde a última sincronização.", label)
+                continue
+
+            metrics.increment('files_downloaded')
+            metrics.increment('bytes_downloaded', len(content))
+            try:
+                with metrics.span('sync.insert'):
+                    payload = delta_content(content, cache_entries[url])
+                    counts = insert_matches(circuit, parse_matches_csv(payload), conn)
+            except Exception as e:
+                logger.error("Erro inesperado ao processar dados de %s: %s", label, e)
+                totals[circuit]['failed'] += 1
+                metrics.increment('files_failed')
+                continue
+
+            cache.update(url, response, content)
+            totals[circuit]['downloaded'] += 1
+            totals[circuit]['inserted'] += counts['inserted']
+            totals[circuit]['ignored'] += counts['ignored']
+            logger.info("Dados de %s sincronizados com o banco: %d partidas inseridas, %d ignoradas.",
+                        label, counts['inserted'], counts['ignored'])
+
+    cache.save()
+    return totals
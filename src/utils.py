@@ -1,8 +1,13 @@
 # src/utils.py
 
+import re
 import sqlite3
 import os
+import threading
+import unicodedata
 from typing import Tuple
+from src import metrics
+from src.data_handler import connect_read_only
 
 DATA_DIR = "data"
 DB_PATH = os.path.join(DATA_DIR, "777stats.db")
@@ -20,39 +25,175 @@ def get_surface_from_tournament(tournament_name: str) -> str:
             return surface
     return 'Unknown'
 
-def normalize_player_name(scraped_name: str, known_players: set) -> str | None:
-    if scraped_name in known_players: return scraped_name
-    parts = scraped_name.split(' ')
-    if len(parts) > 1 and len(parts[-1]) == 2 and parts[-1].endswith('.'):
-        last_name = parts[0]
-        initial = parts[-1][0]
-        matches = [name for name in known_players if last_name in name and name.startswith(initial)]
-        if len(matches) == 1: return matches[0]
-    last_name_only = parts[0]
-    matches = [name for name in known_players if last_name_only in name]
-    if len(matches) == 1: return matches[0]
-    return None
+_COUNTRY_SUFFIX = re.compile(r'\s*\([^)]*\)\s*$')
+
+def _normalize_text(text: str) -> str:
+    """Remove acentos, pontuação de nomes (hífens, apóstrofos, pontos) e padroniza para minúsculas."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[-'`.]", ' ', text.lower())
+    return ' '.join(text.split())
+
+class PlayerNameResolver:
+    """
+    Resolve nomes no formato do site de jogos ("Sobrenome I. (Pai)", "De Minaur A.",
+    "Tsonga J-W.") para o nome completo usado no banco ("Alex De Minaur").
+
+    Construído uma vez por circuito: indexa cada jogador conhecido por todas as divisões
+    possíveis entre prenome e sobrenome (sobrenomes compostos) e pela inicial do prenome.
+    Os nomes resolvidos são memorizados.
+    """
+    def __init__(self, known_players):
+        self.known_players = set(known_players)
+        self._by_surname = {}
+        self._by_surname_initial = {}
+        self._first_names = {}
+        self._cache = {}
+        for player in self.known_players:
+            tokens = _normalize_text(player).split()
+            for split in range(1, len(tokens)):
+                surname = ' '.join(tokens[split:])
+                self._by_surname.setdefault(surname, set()).add(player)
+                self._by_surname_initial.setdefault((surname, tokens[0][0]), set()).add(player)
+                self._first_names[(player, surname)] = tokens[:split]
+            if len(tokens) == 1:
+                self._by_surname.setdefault(tokens[0], set()).add(player)
+
+    @staticmethod
+    def _split_scraped(scraped_name: str):
+        """Separa um nome raspado em (sobrenome normalizado, lista de iniciais/prefixos do prenome)."""
+        name = _COUNTRY_SUFFIX.sub('', scraped_name).strip()
+        parts = name.split()
+        initials = []
+        while len(parts) > 1 and parts[-1].endswith('.'):
+            initials[:0] = _normalize_text(parts.pop()).split()
+        return _normalize_text(' '.join(parts)), initials
+
+    def _match_initials(self, candidates: set, surname: str, initials: list) -> set:
+        """Mantém os candidatos cujos prenomes começam pelos prefixos informados, na ordem."""
+        matched = set()
+        for player in candidates:
+            first_names = self._first_names.get((player, surname), [])
+            if all(i < len(first_names) and first_names[i].startswith(prefix) for i, prefix in enumerate(initials[:len(first_names)])):
+                matched.add(player)
+        return matched
+
+    def resolve(self, scraped_name: str) -> str | None:
+        """Retorna o nome completo do jogador, ou None se não houver correspondência única."""
+        if scraped_name in self._cache:
+            metrics.increment('name_cache_hits')
+            return self._cache[scraped_name]
+        self._cache[scraped_name] = resolved = self._resolve(scraped_name)
+        return resolved
+
+    def _resolve(self, scraped_name: str) -> str | None:
+        if scraped_name in self.known_players: return scraped_name
+        if '/' in scraped_name: return None # Partidas de duplas não têm rating individual
+        surname, initials = self._split_scraped(scraped_name)
+        if not surname: return None
+
+        if initials:
+            candidates = self._by_surname_initial.get((surname, initials[0][0]), set())
+            matches = self._match_initials(candidates, surname, initials)
+            if len(matches) == 1: return next(iter(matches))
+            if len(candidates) == 1: return next(iter(candidates))
+            if candidates: return None
+
+        matches = self._by_surname.get(surname, set())
+        if len(matches) == 1: return next(iter(matches))
+        return None
+
+    def resolve_many(self, scraped_names) -> list:
+        """Resolve uma lista de nomes de uma vez (ex.: as colunas do CSV de jogos do dia)."""
+        return [self.resolve(name) for name in scraped_names]
+
+# Último (conjunto de nomes, resolvedor) usado por normalize_player_name. Uma única entrada, comparada
+# por identidade: chamadas repetidas com o mesmo conjunto reaproveitam o resolvedor, e um conjunto
+# novo o substitui (a memória não cresce em processos longos como o servidor e a GUI).
+_last_resolver = (None, None)
+
+def normalize_player_name(scraped_name: str, known_players) -> str | None:
+    """
+    Converte um nome raspado para o nome completo conhecido. Aceita um `PlayerNameResolver`
+    ou um conjunto de nomes (nesse caso o resolvedor do último conjunto usado é reaproveitado).
+    """
+    global _last_resolver
+    if not isinstance(known_players, PlayerNameResolver):
+        cached_players, resolver = _last_resolver
+        if cached_players is not known_players:
+            resolver = PlayerNameResolver(known_players)
+            _last_resolver = (known_players, resolver)
+        known_players = resolver
+    return known_players.resolve(scraped_name)
+
+H2H_SURFACES = ('Hard', 'Clay', 'Grass')
+H2H_COLUMNS = "a_wins, b_wins, a_wins_hard, b_wins_hard, a_wins_clay, b_wins_clay, a_wins_grass, b_wins_grass"
+
+def _empty_h2h_record() -> dict:
+    return {'overall': {'p1_wins': 0, 'p2_wins': 0}, 'Hard': {'p1_wins': 0, 'p2_wins': 0}, 'Clay': {'p1_wins': 0, 'p2_wins': 0}, 'Grass': {'p1_wins': 0, 'p2_wins': 0}}
+
+def _h2h_record_from_counts(counts, p1_is_a: bool) -> dict:
+    """Converte uma linha da tabela de H2H (jogador A/B) para o formato do Jogador 1/Jogador 2."""
+    p1, p2 = (0, 1) if p1_is_a else (1, 0)
+    h2h_results = {'overall': {'p1_wins': counts[p1], 'p2_wins': counts[p2]}}
+    for position, surface in enumerate(H2H_SURFACES, start=1):
+        h2h_results[surface] = {'p1_wins': counts[2 * position + p1], 'p2_wins': counts[2 * position + p2]}
+    return h2h_results
+
+# Conexões somente-leitura reaproveitadas pelas consultas de H2H, uma por thread e caminho do banco
+_thread_local = threading.local()
+
+def _h2h_connection():
+    """
+    Conexão somente-leitura ao banco, aberta uma vez por thread e reaproveitada (None se o banco
+    ainda não existir). Em WAL ela enxerga as partidas gravadas depois pela sincronização.
+    """
+    connections = getattr(_thread_local, 'connections', None)
+    if connections is None:
+        connections = _thread_local.connections = {}
+    db_path = os.path.abspath(DB_PATH)
+    conn = connections.get(db_path)
+    if conn is None and os.path.exists(db_path):
+        conn = connections[db_path] = connect_read_only(db_path)
+    return conn
 
 def get_h2h_record(circuit: str, player1_name: str, player2_name: str) -> dict:
-    h2h_results = {'overall': {'p1_wins': 0, 'p2_wins': 0}, 'Hard': {'p1_wins': 0, 'p2_wins': 0}, 'Clay': {'p1_wins': 0, 'p2_wins': 0}, 'Grass': {'p1_wins': 0, 'p2_wins': 0}}
-    if not os.path.exists(DB_PATH): return h2h_results
+    """Consulta o resumo de H2H materializado (uma busca pela chave primária do par)."""
+    return get_h2h_records(circuit, [(player1_name, player2_name)])[0]
 
-    table_name = f"{circuit}_matches"
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def get_h2h_records(circuit: str, pairs: list, conn=None) -> list:
+    """
+    Retorna os registros de H2H de vários pares (Jogador 1, Jogador 2) em uma consulta por bloco.
+    Se `conn` for informada (ex.: conexão mantida aberta pelo servidor), ela é usada; senão, a
+    conexão somente-leitura da thread é reaproveitada entre chamadas.
+    """
+    results = [_empty_h2h_record() for _ in pairs]
+    if not pairs: return results
+    if conn is None:
+        conn = _h2h_connection()
+        if conn is None: return results
+
+    ordered_pairs = sorted({tuple(sorted(pair)) for pair in pairs})
+    found = {}
     try:
-        query = f"SELECT winner_name, loser_name, surface FROM {table_name} WHERE (winner_name = ? AND loser_name = ?) OR (winner_name = ? AND loser_name = ?)"
-        cursor.execute(query, (player1_name, player2_name, player2_name, player1_name))
-        matches = cursor.fetchall()
+        # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+        for start in range(0, len(ordered_pairs), 400):
+            chunk = ordered_pairs[start:start + 400]
+            placeholders = ", ".join("(?, ?)" for _ in chunk)
+            params = [name for pair in chunk for name in pair]
+            query = f"SELECT player_a, player_b, {H2H_COLUMNS} FROM {circuit}_h2h WHERE (player_a, player_b) IN (VALUES {placeholders})"
+            for row in conn.execute(query, params):
+                found[(row[0], row[1])] = row[2:]
     except sqlite3.OperationalError: # Se a tabela não existir, não falha
-        matches = []
-    finally:
-        conn.close()
-
-    for winner, loser, surface in matches:
-        if winner == player1_name: h2h_results['overall']['p1_wins'] += 1
-        else: h2h_results['overall']['p2_wins'] += 1
-        if surface in h2h_results:
-            if winner == player1_name: h2h_results[surface]['p1_wins'] += 1
-            else: h2h_results[surface]['p2_wins'] += 1
-    return h2h_results
\ No newline at end of file
+        pass
+
+    hits = 0
+    for position, (player1_name, player2_name) in enumerate(pairs):
+        p1_is_a = player1_name < player2_name
+        counts = found.get((player1_name, player2_name) if p1_is_a else (player2_name, player1_name))
+        if counts is not None:
+            results[position] = _h2h_record_from_counts(counts, p1_is_a)
+            hits += 1
+    metrics.increment('h2h_lookups', len(pairs))
+    metrics.increment('h2h_hits', hits)
+    return results
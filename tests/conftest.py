@@ -0,0 +1,45 @@
+# tests/conftest.py
+#
+# Permite importar os módulos de src/ ao rodar os testes a partir de qualquer diretório.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+import pytest
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Banco vazio do ATP em um diretório temporário (os caminhos de src/data_handler.py são relativos)."""
+    from src import data_handler
+    monkeypatch.chdir(tmp_path)
+    data_handler.init_db(('atp',))
+    conn = sqlite3.connect(data_handler.DB_PATH)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def trained_models(tmp_path, monkeypatch):
+    """
+    ({'atp': MLModel}, {'atp': TennisEloModel}, {'atp': PlayerNameResolver}) treinados com o CSV de
+    fixture, em um diretório sem banco (o H2H vem vazio).
+    """
+    import pandas as pd
+    from src.data_handler import parse_matches_csv
+    from src.elo_model import TennisEloModel
+    from src.feature_engineering import create_dataset_for_ml
+    from src.ml_model import MLModel
+    from src.utils import PlayerNameResolver
+    monkeypatch.chdir(tmp_path)
+    matches = parse_matches_csv(os.path.join(FIXTURES_DIR, 'atp_matches_2024.csv'))
+    matches = pd.concat([matches] * 20, ignore_index=True)
+    elo_model = TennisEloModel()
+    elo_model.train_general(matches)
+    X, y = create_dataset_for_ml('atp', matches, elo_model)
+    ml_model = MLModel()
+    ml_model.train(X, y)
+    return {'atp': ml_model}, {'atp': elo_model}, {'atp': PlayerNameResolver(elo_model.known_players())}
@@ -0,0 +1,54 @@
+# tests/test_data_handler.py
+#
+# Ingestão em lote (parse_matches_csv, insert_matches, ingest_csv_file) sobre um CSV local no
+# formato de Jeff Sackmann, em um banco temporário.
+
+import os
+import pandas as pd
+import pytest
+import sqlite3
+from conftest import FIXTURES_DIR
+from src.data_handler import ingest_csv_file, insert_matches, parse_matches_csv
+from src.match_history import MATCH_COLUMNS
+
+FIXTURE = os.path.join(FIXTURES_DIR, 'atp_matches_2024.csv')
+
+def count_rows(conn, table: str) -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def test_parse_matches_csv_keeps_db_columns_and_drops_incomplete_rows():
+    df = parse_matches_csv(FIXTURE)
+    assert list(df.columns) == MATCH_COLUMNS
+    # A partida sem superfície é descartada
+    assert len(df) == 6
+    assert df['tourney_date'].iloc[0] == '2024-01-01'
+    with open(FIXTURE, 'rb') as f:
+        assert parse_matches_csv(f.read()).equals(df)
+
+def test_ingest_csv_file_counts_inserted_and_ignored_rows(db):
+    assert ingest_csv_file(FIXTURE, 'atp', db) == {'inserted': 6, 'ignored': 0}
+    assert count_rows(db, 'atp_matches') == 6
+    # O H2H é atualizado na mesma transação
+    assert db.execute("SELECT a_wins, b_wins, a_wins_hard, a_wins_clay FROM atp_h2h WHERE player_a = 'Andrey Rublev' AND player_b = 'Rafael Nadal'").fetchone() == (1, 1, 1, 0)
+
+    # Segunda ingestão do mesmo arquivo: tudo já existe
+    assert ingest_csv_file(FIXTURE, 'atp', db) == {'inserted': 0, 'ignored': 6}
+    assert count_rows(db, 'atp_matches') == 6
+    assert db.execute("SELECT SUM(a_wins + b_wins) FROM atp_h2h").fetchone()[0] == 6
+
+def test_insert_matches_rolls_back_a_bad_batch(db):
+    df = parse_matches_csv(FIXTURE)
+    ingest_csv_file(FIXTURE, 'atp', db)
+    h2h_before = db.execute("SELECT * FROM atp_h2h ORDER BY 1, 2").fetchall()
+
+    new_rows = df.head(2).copy()
+    new_rows['tourney_id'] = ['2024-9999', '2024-9999']
+    # Valor que o SQLite não consegue gravar: a falha acontece depois da primeira linha do lote
+    new_rows['winner_name'] = new_rows['winner_name'].astype(object)
+    new_rows.iat[1, MATCH_COLUMNS.index('winner_name')] = ['nome', 'inválido']
+    with pytest.raises(sqlite3.ProgrammingError):
+        insert_matches('atp', new_rows, db)
+
+    assert count_rows(db, 'atp_matches') == 6
+    assert db.execute("SELECT * FROM atp_h2h ORDER BY 1, 2").fetchall() == h2h_before
+    assert insert_matches('atp', pd.DataFrame(df.head(1)), db) == {'inserted': 0, 'ignored': 1}
@@ -0,0 +1,74 @@
+# tests/test_elo_model.py
+#
+# Regressão do núcleo em arrays do Elo (`_run_elo_updates`): o Elo Geral por superfície deve ser
+# idêntico ao do algoritmo original baseado em dicionários, que é reproduzido aqui como referência.
+
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from src.elo_model import SURFACES, TennisEloModel
+from src.match_history import MatchHistory
+
+def baseline_ratings(matches: pd.DataFrame, base_rating=1500, k_factor=32) -> dict:
+    """Elo Geral do `TennisEloModel` original: um dicionário nome -> rating por superfície, partida a partida."""
+    ratings = {surface: {} for surface in SURFACES}
+    for match in matches.itertuples():
+        surface_ratings = ratings.get(match.surface)
+        if surface_ratings is None:
+            continue
+        winner_rating = surface_ratings.get(match.winner_name, base_rating)
+        loser_rating = surface_ratings.get(match.loser_name, base_rating)
+        prob_winner = 1 / (1 + math.pow(10, (loser_rating - winner_rating) / 400))
+        rating_change = k_factor * (1 - prob_winner)
+        surface_ratings[match.winner_name] = winner_rating + rating_change
+        surface_ratings[match.loser_name] = loser_rating - rating_change
+    return ratings
+
+def make_matches(num_matches=3000, num_players=60, seed=7) -> pd.DataFrame:
+    """Histórico fixo e cronológico, com partidas em Carpet (sem Elo) no meio."""
+    rng = np.random.default_rng(seed)
+    winners = rng.integers(0, num_players, num_matches)
+    losers = (winners + rng.integers(1, num_players, num_matches)) % num_players
+    dates = pd.Timestamp('2015-01-05') + pd.to_timedelta(np.sort(rng.integers(0, 3000, num_matches)), unit='D')
+    return pd.DataFrame({
+        'tourney_id': [f"{date.year}-{i // 31:04d}" for i, date in enumerate(dates)],
+        'tourney_name': 'Tournament',
+        'surface': rng.choice(['Hard', 'Clay', 'Grass', 'Carpet'], num_matches, p=[0.5, 0.3, 0.15, 0.05]),
+        'tourney_date': dates.strftime('%Y-%m-%d'),
+        'winner_id': 100001 + winners,
+        'winner_name': [f"Player {i}" for i in winners],
+        'loser_id': 100001 + losers,
+        'loser_name': [f"Player {i}" for i in losers],
+    })
+
+def assert_matches_baseline(elo_model: TennisEloModel, expected: dict):
+    for surface in SURFACES:
+        actual = elo_model._ratings_dict(surface)
+        assert actual.keys() == expected[surface].keys()
+        for player, rating in expected[surface].items():
+            assert actual[player] == pytest.approx(rating, abs=1e-9)
+
+@pytest.mark.parametrize('k_factor', [32, 24])
+def test_array_engine_matches_baseline_ratings(k_factor):
+    matches = make_matches()
+    elo_model = TennisEloModel(k_factor=k_factor)
+    elo_model.train_general(matches)
+    assert_matches_baseline(elo_model, baseline_ratings(matches, k_factor=k_factor))
+
+def test_chunked_and_incremental_training_match_baseline():
+    matches = make_matches()
+    expected = baseline_ratings(matches)
+
+    # MatchHistory percorrido em blocos pequenos
+    chunked = TennisEloModel()
+    chunked.train_general(MatchHistory.from_dataframe(matches), chunk_size=257)
+    assert_matches_baseline(chunked, expected)
+
+    # Estado salvo e retomado só com as partidas novas
+    first, rest = matches.iloc[:1800], matches.iloc[1800:]
+    partial = TennisEloModel()
+    partial.train_general(first)
+    resumed = TennisEloModel.from_state(partial.get_state())
+    resumed.train_general(rest)
+    assert_matches_baseline(resumed, expected)
@@ -0,0 +1,51 @@
+# tests/test_h2h.py
+#
+# Resumo de H2H materializado: a atualização incremental (`update_h2h_index` a cada lote inserido)
+# coincide com a reconstrução completa, e as consultas reaproveitam uma conexão somente-leitura.
+
+import os
+import sqlite3
+import pytest
+from conftest import FIXTURES_DIR
+from src import utils
+from src.data_handler import insert_matches, parse_matches_csv, update_h2h_index
+from src.utils import get_h2h_record, get_h2h_records
+
+FIXTURE = os.path.join(FIXTURES_DIR, 'atp_matches_2024.csv')
+
+def h2h_table(conn) -> list:
+    return conn.execute("SELECT * FROM atp_h2h ORDER BY player_a, player_b").fetchall()
+
+def test_incremental_h2h_matches_full_rebuild(db):
+    df = parse_matches_csv(FIXTURE)
+    # Lotes que repetem pares já existentes (upsert) e trazem pares novos
+    for batch in (df.iloc[:2], df.iloc[2:4], df.iloc[4:]):
+        insert_matches('atp', batch, db)
+    incremental = h2h_table(db)
+
+    db.execute("DELETE FROM atp_h2h")
+    update_h2h_index('atp', db, after_rowid=0)
+    db.commit()
+    assert h2h_table(db) == incremental
+    assert sum(row[2] + row[3] for row in incremental) == len(df)
+
+def test_h2h_lookup_reuses_read_only_connection(db):
+    insert_matches('atp', parse_matches_csv(FIXTURE), db)
+
+    record = get_h2h_record('atp', 'Rafael Nadal', 'Andrey Rublev')
+    assert record['overall'] == {'p1_wins': 1, 'p2_wins': 1}
+    assert record['Hard'] == {'p1_wins': 0, 'p2_wins': 1}
+    assert record['Clay'] == {'p1_wins': 1, 'p2_wins': 0}
+    assert get_h2h_record('atp', 'Andrey Rublev', 'Rafael Nadal')['Hard'] == {'p1_wins': 1, 'p2_wins': 0}
+    assert get_h2h_record('atp', 'Rafael Nadal', 'Desconhecido')['overall'] == {'p1_wins': 0, 'p2_wins': 0}
+
+    conn = utils._h2h_connection()
+    assert utils._h2h_connection() is conn
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM atp_h2h")
+
+    # Partidas gravadas depois pela sincronização aparecem na mesma conexão
+    new_match = parse_matches_csv(FIXTURE).iloc[:1].copy()
+    new_match['tourney_id'] = '2024-9999'
+    insert_matches('atp', new_match, db)
+    assert get_h2h_records('atp', [('Andrey Rublev', 'Rafael Nadal')])[0]['overall'] == {'p1_wins': 2, 'p2_wins': 1}
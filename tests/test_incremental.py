@@ -0,0 +1,122 @@
+# tests/test_incremental.py
+#
+# Atualização incremental (Elo e checkpoint de treinamento do modelo de ML): aplicar só as partidas
+# novas sobre o estado salvo deve dar o mesmo estado que reprocessar todo o histórico, inclusive
+# quando a sincronização insere partidas com data anterior ao checkpoint. Um bundle treinado com
+# outros parâmetros do Elo (ex.: após "sweep --write-config") não é reaproveitado.
+
+import configparser
+import logging
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import main
+from conftest import FIXTURES_DIR
+from src.data_handler import insert_matches, load_match_history, parse_matches_csv
+from src.elo_model import SURFACES, TennisEloModel
+from src.feature_engineering import PointInTimeFeatureBuilder
+from src.model_bundle import load_model_bundle
+
+def make_history(num_years=10, first_year=2014) -> pd.DataFrame:
+    """O CSV de fixture repetido em vários torneios por ano, com ids e datas distintos."""
+    base = parse_matches_csv(os.path.join(FIXTURES_DIR, 'atp_matches_2024.csv'))
+    copies = []
+    for year in range(first_year, first_year + num_years):
+        for week in range(0, 40, 8):
+            copy = base.copy()
+            dates = pd.to_datetime(copy['tourney_date']) - pd.DateOffset(years=2024 - year) + pd.Timedelta(weeks=week)
+            copy['tourney_date'] = dates.dt.strftime('%Y-%m-%d')
+            copy['tourney_id'] = copy['tourney_id'] + f"-{year}-{week}"
+            copies.append(copy)
+    return pd.concat(copies, ignore_index=True).sort_values('tourney_date', kind='stable', ignore_index=True)
+
+def assert_same_elo(actual: TennisEloModel, expected: TennisEloModel):
+    """Compara ratings (Geral e Forma Recente) e features de forma por nome de jogador."""
+    for surface in SURFACES:
+        for recent in (False, True):
+            actual_ratings, expected_ratings = actual._ratings_dict(surface, recent), expected._ratings_dict(surface, recent)
+            assert actual_ratings.keys() == expected_ratings.keys()
+            for player, rating in expected_ratings.items():
+                assert actual_ratings[player] == pytest.approx(rating, abs=1e-9)
+    players = sorted(expected.known_players())
+    np.testing.assert_allclose(actual.get_form_features(players), expected.get_form_features(players))
+    assert actual.last_date == expected.last_date
+
+def full_replay() -> TennisEloModel:
+    elo_model = TennisEloModel()
+    elo_model.train_general(load_match_history('atp'))
+    elo_model.set_checkpoint(0, load_match_history('atp').last_date)
+    return elo_model
+
+def h2h_by_name(builder: PointInTimeFeatureBuilder) -> dict:
+    names = builder.elo_model.player_names
+    return {(names[a], names[b]): counts for (a, b), counts in builder._h2h.items()}
+
+@pytest.fixture
+def config():
+    config = configparser.ConfigParser()
+    config.read_dict({'Model': {'ml_training': 'incremental'}})
+    return config
+
+@pytest.mark.parametrize('late_rows', ['newer', 'older'])
+def test_incremental_state_equals_full_replay(db, config, caplog, late_rows):
+    history = make_history()
+    if late_rows == 'newer':
+        # Caso normal: as partidas novas são posteriores (ou do mesmo dia) ao checkpoint
+        first, late = history.iloc[:200], history.iloc[200:]
+    else:
+        # Atualização do CSV do ano corrente com linhas antigas: datas anteriores ao checkpoint
+        first, late = history.iloc[50:], history.iloc[:50]
+    insert_matches('atp', first, db)
+    main.train_and_save_model(config, 'atp')
+
+    insert_matches('atp', late, db)
+    with caplog.at_level(logging.INFO):
+        main.update_ml_model(config, 'atp')
+        elo_model = main.load_elo_model(config, 'atp')
+    replayed = any('anterior(es) ao checkpoint' in record.getMessage() for record in caplog.records)
+    assert replayed == (late_rows == 'older')
+
+    expected = full_replay()
+    assert_same_elo(elo_model, expected)
+    builder = PointInTimeFeatureBuilder.load(main.circuit_filename(config, 'training_state_filename', 'atp'))
+    assert_same_elo(builder.elo_model, expected)
+    full_builder = PointInTimeFeatureBuilder()
+    full_builder.transform(load_match_history('atp'))
+    assert h2h_by_name(builder) == h2h_by_name(full_builder)
+
+def test_load_elo_model_replays_history_for_older_rows(db, config):
+    history = make_history()
+    insert_matches('atp', history.iloc[50:], db)
+    main.load_elo_model(config, 'atp')
+    insert_matches('atp', history.iloc[:50], db)
+
+    # Sem a verificação, aplicar as linhas antigas depois do checkpoint daria outro estado
+    naive = TennisEloModel.load(main.circuit_filename(config, 'elo_state_filename', 'atp'))
+    naive.train_general(history.iloc[:50])
+    with pytest.raises(AssertionError):
+        assert_same_elo(naive, full_replay())
+
+    assert_same_elo(main.load_elo_model(config, 'atp'), full_replay())
+
+def test_bundle_with_other_elo_params_is_retrained(db, config):
+    insert_matches('atp', make_history(), db)
+    main.train_and_save_model(config, 'atp')
+    bundle_filename = main.circuit_filename(config, 'bundle_filename', 'atp')
+
+    # Novos parâmetros gravados em [Model]: o Elo é recriado, mas o bundle antigo não recebe esse estado
+    config['Model']['k_factor'] = '24'
+    main.load_elo_model(config, 'atp')
+    assert load_model_bundle(bundle_filename)[1].k_factor == 32
+
+    # predict (sem atualização): o bundle é treinado de novo com os parâmetros de [Model]
+    predictor = main.load_predictor(config, 'atp')
+    assert load_model_bundle(bundle_filename)[1].k_factor == 24
+    assert predictor.predict_proba([[0.0] * len(predictor.feature_schema)]).shape == (1, 2)
+
+    # train com [Model] ml_training = full: idem
+    config['Model']['k_factor'] = '40'
+    config['Model']['ml_training'] = 'full'
+    main.load_predictor(config, 'atp', update=True)
+    assert load_model_bundle(bundle_filename)[1].k_factor == 40
@@ -0,0 +1,85 @@
+# tests/test_model_bundle.py
+#
+# Bundle de modelo: o `LogisticPredictor` exportado reproduz o `MLModel` (sklearn) de origem, e
+# bundles com versão, esquema de features ou formatos de parâmetros incompatíveis são rejeitados.
+
+import pickle
+import numpy as np
+import pytest
+from src import model_bundle
+from src.elo_model import TennisEloModel
+from src.feature_engineering import FEATURE_NAMES
+from src.ml_model import MLModel
+from src.model_bundle import export_model_bundle, load_model_bundle
+
+def make_dataset(num_rows=600, num_features=len(FEATURE_NAMES), seed=3):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(0, 1, (num_rows, num_features)) * rng.uniform(1, 200, num_features)
+    y = (X @ rng.normal(0, 1, num_features) / 100 + rng.normal(0, 1, num_rows) > 0).astype(int)
+    return X, y
+
+@pytest.fixture
+def bundle_path(tmp_path):
+    X, y = make_dataset()
+    ml_model = MLModel()
+    ml_model.train(X, y)
+    path = str(tmp_path / 'atp_model.pkl')
+    export_model_bundle(path, ml_model, TennisEloModel(), 'atp')
+    return path
+
+def rewrite_bundle(path: str, **changes):
+    with open(path, 'rb') as f:
+        bundle = pickle.load(f)
+    bundle.update(changes)
+    with open(path, 'wb') as f:
+        pickle.dump(bundle, f)
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_predictor_matches_sklearn_model(tmp_path, incremental):
+    X, y = make_dataset()
+    ml_model = MLModel(incremental=incremental)
+    ml_model.train(X[:500], y[:500])
+    if incremental:
+        ml_model.update(X[500:], y[500:])
+    path = str(tmp_path / 'model.pkl')
+    export_model_bundle(path, ml_model, TennisEloModel(), 'atp')
+
+    predictor, elo_model = load_model_bundle(path)
+    np.testing.assert_allclose(predictor.predict_proba(X), ml_model.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(predictor.predict_proba(X[0]), ml_model.predict_proba(X[:1]), rtol=0, atol=1e-12)
+    assert predictor.feature_schema == FEATURE_NAMES
+    assert isinstance(elo_model, TennisEloModel)
+
+def test_rejects_wrong_version(bundle_path):
+    rewrite_bundle(bundle_path, version=model_bundle.BUNDLE_VERSION + 1)
+    with pytest.raises(ValueError, match='Versão de bundle'):
+        load_model_bundle(bundle_path)
+
+def test_rejects_wrong_format(bundle_path):
+    rewrite_bundle(bundle_path, format='outro-formato')
+    with pytest.raises(ValueError, match='não é um bundle'):
+        load_model_bundle(bundle_path)
+
+def test_rejects_wrong_feature_names(bundle_path):
+    renamed = list(FEATURE_NAMES)
+    renamed[0], renamed[1] = renamed[1], renamed[0]
+    rewrite_bundle(bundle_path, feature_schema=renamed)
+    with pytest.raises(ValueError, match='Esquema de features'):
+        load_model_bundle(bundle_path)
+
+@pytest.mark.parametrize('field', ['scaler_mean', 'scaler_scale', 'coef'])
+def test_rejects_mismatched_parameter_shapes(bundle_path, field):
+    with open(bundle_path, 'rb') as f:
+        values = pickle.load(f)[field]
+    rewrite_bundle(bundle_path, **{field: values[:6]})
+    with pytest.raises(ValueError, match='incompatíveis com o esquema'):
+        load_model_bundle(bundle_path)
+
+def test_export_rejects_model_trained_on_other_features(tmp_path):
+    X, y = make_dataset(num_features=6)
+    ml_model = MLModel()
+    ml_model.train(X, y)
+    path = tmp_path / 'model.pkl'
+    with pytest.raises(ValueError, match='incompatíveis com o esquema'):
+        export_model_bundle(str(path), ml_model, TennisEloModel(), 'atp')
+    assert not path.exists()
@@ -0,0 +1,26 @@
+# tests/test_prediction.py
+#
+# Previsão em lote: só partidas em superfícies com Elo (`SURFACES`) recebem probabilidade.
+
+import logging
+import pandas as pd
+from src.prediction import predict_upcoming_matches
+
+def test_invalid_surfaces_are_reported_and_not_scored(trained_models, caplog):
+    upcoming = pd.DataFrame({
+        'Circuit': 'ATP',
+        'Player 1': ['Nadal R. (Esp)', 'Nadal R. (Esp)', 'Nadal R. (Esp)', 'Nadal R. (Esp)'],
+        'Player 2': ['Rublev A. (Rus)', 'Rublev A. (Rus)', 'Rublev A. (Rus)', 'Rublev A. (Rus)'],
+        'Tournament': ['Roland Garros', 'Torneio', 'Torneio', 'Torneio'],
+        'Surface': ['Clay', '5', 'Unknown', 'Carpet'],
+    })
+    with caplog.at_level(logging.ERROR, logger='src.prediction'):
+        predictions = predict_upcoming_matches(upcoming, *trained_models, keep_index=True)
+
+    assert predictions.index.tolist() == [0]
+    assert predictions.loc[0, 'Player 1'] == 'Rafael Nadal' and 0 < predictions.loc[0, 'Prob P1'] < 1
+    # 'Unknown' é o marcador do scraper para torneios sem superfície conhecida: descartado sem erro
+    assert [record.getMessage() for record in caplog.records] == [
+        "Superfície inválida '5' em Nadal R. (Esp) x Rublev A. (Rus) (ATP): partida não avaliada.",
+        "Superfície inválida 'Carpet' em Nadal R. (Esp) x Rublev A. (Rus) (ATP): partida não avaliada.",
+    ]
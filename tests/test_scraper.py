@@ -0,0 +1,31 @@
+# tests/test_scraper.py
+#
+# O parser da agenda roda sobre uma página salva do flashscore.mobi (tests/fixtures), sem acessar a rede.
+
+import os
+from src.scraper import SCHEDULE_COLUMNS, parse_schedule_html
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'flashscore_schedule.html')
+
+def load_fixture() -> bytes:
+    with open(FIXTURE, 'rb') as f:
+        return f.read()
+
+def test_parse_schedule_html_extracts_scheduled_matches():
+    wimbledon = "ATP - SINGLES: Wimbledon (United Kingdom), grass"
+    roland_garros = "WTA - SINGLES: Roland Garros (France), clay"
+    miami = "ATP - SINGLES: Miami (USA), hard"
+    expected = [
+        ('ATP', 'Sinner J. (Ita)', 'Alcaraz C. (Esp)', wimbledon, 'Grass'),
+        ('ATP', 'Zverev A. (Ger)', 'De Minaur A. (Aus)', wimbledon, 'Grass'),
+        ('WTA', 'Swiatek I. (Pol)', 'Sabalenka A. (Blr)', roland_garros, 'Clay'),
+        # Jogo sem irmão anterior: o texto dos jogadores é o texto do elemento pai
+        ('ATP', 'Medvedev D. (Rus)', 'Rublev A. (Rus)', miami, 'Hard'),
+    ]
+    matches = parse_schedule_html(load_fixture())
+    assert [tuple(match[column] for column in SCHEDULE_COLUMNS) for match in matches] == expected
+
+def test_parse_schedule_html_accepts_text_and_empty_pages():
+    assert parse_schedule_html(load_fixture().decode('utf-8')) == parse_schedule_html(load_fixture())
+    assert parse_schedule_html('') == []
+    assert parse_schedule_html(None) == []
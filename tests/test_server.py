@@ -0,0 +1,52 @@
+# tests/test_server.py
+#
+# API de previsões (/api/predict) servida a partir de um bundle exportado, em uma porta local.
+
+import json
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+import pytest
+from src.model_bundle import export_model_bundle
+from src.server import ConnectionPool, ModelStore, PredictionServer, PredictionService
+
+@pytest.fixture
+def server_url(trained_models, tmp_path):
+    ml_models, elo_models, _ = trained_models
+    bundle = str(tmp_path / 'atp_model.pkl')
+    export_model_bundle(bundle, ml_models['atp'], elo_models['atp'], 'atp')
+    pool = ConnectionPool(str(tmp_path / 'sem_banco.db'))
+    server = PredictionServer(('127.0.0.1', 0), PredictionService(ModelStore({'atp': bundle}), pool))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/api/predict"
+    server.shutdown()
+    server.server_close()
+
+def request(url: str, payload=None):
+    """Retorna (status, JSON da resposta); com `payload`, faz um POST."""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data)) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+MATCH = {'circuit': 'atp', 'player1': 'Nadal R. (Esp)', 'player2': 'Rublev A. (Rus)'}
+
+def test_predict_accepts_known_surfaces(server_url):
+    status, result = request(f"{server_url}?{urlencode({**MATCH, 'surface': 'clay'})}")
+    assert status == 200
+    assert result['surface'] == 'Clay' and 0 < result['prob_p1'] < 1
+
+    status, result = request(server_url, {'matches': [{**MATCH, 'tournament': 'Roland Garros'}]})
+    assert status == 200 and result['predictions'][0]['surface'] == 'Clay'
+
+@pytest.mark.parametrize('surface', ['5', 'Carpet', 'Unknown', 5])
+def test_predict_rejects_unknown_surfaces(server_url, surface):
+    status, result = request(f"{server_url}?{urlencode({**MATCH, 'surface': surface})}")
+    assert status == 400 and 'superfície inválida' in result['error']
+
+    status, result = request(server_url, {'matches': [{**MATCH, 'surface': 'Hard'}, {**MATCH, 'surface': surface}]})
+    assert status == 400 and result['error'].startswith('partida 1: superfície inválida')
@@ -0,0 +1,108 @@
+# tests/test_sync.py
+#
+# Sincronização contra um servidor HTTP local (http.server) no lugar do repositório de Jeff
+# Sackmann: requisições condicionais (304), 200 com o mesmo conteúdo e ingestão só das linhas
+# acrescentadas ao arquivo do ano corrente.
+
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from conftest import FIXTURES_DIR
+from src.sync import HttpCache, delta_content, sync_circuits
+
+class FakeRepository(BaseHTTPRequestHandler):
+    """Serve `files` ({caminho: bytes}) com ETag; `honor_etag = False` simula um servidor que ignora If-None-Match."""
+    files = {}
+    honor_etag = True
+    requests_seen = []
+
+    def do_GET(self):
+        type(self).requests_seen.append((self.path, self.headers.get('If-None-Match')))
+        content = self.files.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = hashlib.sha256(content).hexdigest()[:16]
+        # Servidor que ignora o ETag: gera um novo a cada resposta, mesmo com o conteúdo igual
+        etag = f'"{etag}"' if self.honor_etag else f'"{etag}-{len(self.requests_seen)}"'
+        if self.honor_etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def repository():
+    FakeRepository.files, FakeRepository.honor_etag, FakeRepository.requests_seen = {}, True, []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeRepository)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield FakeRepository, f"http://127.0.0.1:{server.server_address[1]}/{{circuit}}/"
+    server.shutdown()
+    server.server_close()
+
+def load_fixture() -> bytes:
+    with open(os.path.join(FIXTURES_DIR, 'atp_matches_2024.csv'), 'rb') as f:
+        return f.read()
+
+def split_fixture(num_lines: int) -> bytes:
+    """Cabeçalho + as primeiras `num_lines` partidas do CSV de fixture."""
+    return b''.join(load_fixture().splitlines(keepends=True)[:num_lines + 1])
+
+def test_sync_skips_unchanged_files_with_304(db, repository):
+    server, base_url = repository
+    server.files = {'/atp/atp_matches_2024.csv': load_fixture()}
+
+    first = sync_circuits(db, {'atp': [2024, 2025]}, base_url=base_url)
+    assert first['atp'] == {'downloaded': 1, 'unchanged': 0, 'failed': 0, 'inserted': 6, 'ignored': 0}
+
+    second = sync_circuits(db, {'atp': [2024]}, base_url=base_url)
+    assert second['atp'] == {'downloaded': 0, 'unchanged': 1, 'failed': 0, 'inserted': 0, 'ignored': 0}
+    assert server.requests_seen[-1] == ('/atp/atp_matches_2024.csv', HttpCache().get(f"{base_url.format(circuit='atp')}atp_matches_2024.csv")['etag'])
+
+def test_sync_refreshes_validators_on_200_with_same_hash(db, repository):
+    server, base_url = repository
+    server.files = {'/atp/atp_matches_2024.csv': load_fixture()}
+    server.honor_etag = False
+    url = f"{base_url.format(circuit='atp')}atp_matches_2024.csv"
+
+    sync_circuits(db, {'atp': [2024]}, base_url=base_url)
+    first_etag = HttpCache().get(url)['etag']
+    totals = sync_circuits(db, {'atp': [2024]}, base_url=base_url)
+    assert totals['atp']['unchanged'] == 1 and totals['atp']['inserted'] == 0
+
+    # O servidor mandou um ETag novo com o mesmo conteúdo: ele passa a ser o validador guardado
+    second_etag = HttpCache().get(url)['etag']
+    assert second_etag != first_etag
+    sync_circuits(db, {'atp': [2024]}, base_url=base_url)
+    assert [etag for _, etag in server.requests_seen] == [None, first_etag, second_etag]
+
+def test_sync_ingests_only_appended_rows_of_current_year(db, repository):
+    server, base_url = repository
+    server.files = {'/atp/atp_matches_2024.csv': split_fixture(3)}
+    assert sync_circuits(db, {'atp': [2024]}, base_url=base_url)['atp']['inserted'] == 3
+
+    # O arquivo do ano corrente ganhou linhas no final: só elas são lidas e inseridas
+    server.files = {'/atp/atp_matches_2024.csv': split_fixture(6)}
+    totals = sync_circuits(db, {'atp': [2024]}, base_url=base_url)
+    assert totals['atp'] == {'downloaded': 1, 'unchanged': 0, 'failed': 0, 'inserted': 3, 'ignored': 0}
+    assert db.execute("SELECT COUNT(*) FROM atp_matches").fetchone()[0] == 6
+
+def test_delta_content_returns_header_and_new_rows_only():
+    old, new = split_fixture(3), split_fixture(6)
+    entry = {'sha256': hashlib.sha256(old).hexdigest(), 'size': len(old)}
+    header = new[:new.index(b'\n') + 1]
+    assert delta_content(new, entry) == header + new[len(old):]
+    # Conteúdo anterior alterado (não é só um acréscimo): arquivo completo
+    assert delta_content(new.replace(b'Brisbane', b'Brisbana'), entry) == new.replace(b'Brisbane', b'Brisbana')
+    assert delta_content(new, {}) == new